@@ -0,0 +1,160 @@
+import click
+import json
+import os
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import (contextmanager, redirect_stdout)
+from tempfile import TemporaryDirectory
+from time import monotonic
+from uuid import uuid4
+import indyperf.config as config
+import indyperf.runner as runner
+import indyperf.updown as updown
+from indyperf.results import (Results, percentile)
+from indyperf.standin import (StandinConfig, StandinServer)
+
+HARNESS_HEADERS = ['Workers', 'Downloads', 'Builds/s', 'p50 (ms)', 'p90 (ms)', 'Max (ms)', 'Failures']
+
+
+def parse_ints(value):
+    return [int(v) for v in value.split(',') if v.strip() != '']
+
+
+def _serve_standin(standin_config, conn):
+    server = StandinServer(standin_config)
+    conn.send(server.url)
+    server.httpd.serve_forever()
+
+
+def start_standin_process(standin_config):
+    """ Run a stand-in server in a child process, so its request handling doesn't compete with the harness
+        for this process's GIL. Returns (process, url); terminate the process when done.
+    """
+    (parent_conn, child_conn) = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve_standin, args=(standin_config, child_conn), daemon=True)
+    process.start()
+    return (process, parent_conn.recv())
+
+
+def bench_suite(indy_url, pool_size, suite_spec=None):
+    """A Suite pointed at the given (stand-in) Indy URL, with the shared stores created"""
+
+    env = config.Environment({config.ENV_INDY_URL: indy_url, config.ENV_HTTP_POOL_SIZE: pool_size})
+    suite = config.Suite(suite_spec or {}, env, config.SingleSignOn(None))
+    updown.StoreRegistry(suite).ensure(suite.stores)
+    return suite
+
+
+@contextmanager
+def quiet(verbose):
+    """Swallow the harness's per-call console output (which it would otherwise print for every simulated build)"""
+    if verbose is True:
+        yield
+        return
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        yield
+
+
+@click.group()
+def bench():
+    """ Benchmarks for the tester itself, run against a local Indy stand-in (see indyperf-standin),
+        to show that the harness is not the bottleneck in a perf run.
+    """
+
+
+@bench.command()
+@click.option('-w', '--workers', default='1,2,4,8', show_default=True, help='Comma-separated worker counts to sweep')
+@click.option('-d', '--folo-downloads', default='100,1000,10000', show_default=True, help='Comma-separated folo record sizes (downloads per build) to sweep')
+@click.option('-n', '--builds', type=int, default=40, show_default=True, help='Simulated builds per sweep point')
+@click.option('-l', '--latency', type=float, default=0.0, show_default=True, help='Stand-in latency per request, in seconds')
+@click.option('-o', '--output', help='Write the benchmark results to this JSON file')
+@click.option('-v', '--verbose', is_flag=True, help="Show the harness's own console output during the benchmark")
+def harness(workers, folo_downloads, builds, latency, output, verbose):
+    """ Measure the harness's own per-build overhead and throughput.
+
+        Each simulated build runs every Indy-facing step of a real build (store creation, settings.xml,
+        folo seal and pull, dependency and output promotion, group cleanup) against the stand-in, with
+        no git, PME or Maven. The sweep shows how that overhead scales with worker count and folo
+        record size.
+    """
+    rows = []
+    for downloads in parse_ints(folo_downloads):
+        (process, url) = start_standin_process(StandinConfig(latency=latency, folo_downloads=downloads))
+        try:
+            for worker_count in parse_ints(workers):
+                print(f"Benchmarking {builds} simulated builds with {worker_count} workers, {downloads} downloads per folo record")
+                with quiet(verbose):
+                    row = run_harness_point(url, worker_count, builds)
+                row['downloads'] = downloads
+                rows.append(row)
+        finally:
+            process.terminate()
+
+    row_format = "{:>12}" * len(HARNESS_HEADERS)
+    print(row_format.format(*HARNESS_HEADERS))
+    for row in rows:
+        print(row_format.format(row['workers'], row['downloads'], f"{row['throughput']:.2f}",
+            f"{row['p50'] * 1000:.1f}", f"{row['p90'] * 1000:.1f}", f"{row['max'] * 1000:.1f}", row['failures']))
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+def run_harness_point(url, workers, builds):
+    suite = bench_suite(url, workers * 2)
+
+    with TemporaryDirectory() as tmp:
+        results = Results(os.path.join(tmp, 'results.jsonl'), 0)
+
+        def simulated_build(idx):
+            tid = f"bench-{uuid4().hex[:12]}"
+            builddir = os.path.join(tmp, tid)
+            os.makedirs(builddir)
+
+            timings = results.new_build('harness')
+            timings.tid = tid
+            try:
+                with timings.phase('create_repos'):
+                    if suite.env.do_promote is True:
+                        updown.create_missing_stores(tid, suite)
+
+                with timings.phase('write_settings'):
+                    updown.write_settings(builddir, tid, suite)
+
+                success = runner.promote_build(tid, suite, timings)
+
+                with timings.phase('cleanup_build_group'):
+                    updown.cleanup_build_group(tid, suite)
+            except Exception as e:
+                print(f"Simulated build {tid} failed: {e}")
+                success = False
+
+            timings.finish(success)
+            results.add_build(timings)
+
+        start = monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(simulated_build, range(builds)))
+        elapsed = monotonic() - start
+
+        results.close()
+
+    durations = [timings.duration for timings in results.builds]
+    phases = {}
+    for timings in results.builds:
+        for name,phase in timings.phases.items():
+            phases.setdefault(name, []).append(phase['duration'])
+
+    return {
+        'workers': workers,
+        'builds': builds,
+        'elapsed': elapsed,
+        'throughput': builds / elapsed,
+        'p50': percentile(durations, 50),
+        'p90': percentile(durations, 90),
+        'max': percentile(durations, 100),
+        'failures': len([timings for timings in results.builds if timings.success is False]),
+        'phases_p50': {name: percentile(values, 50) for name,values in phases.items()}
+    }
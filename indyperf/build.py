@@ -1,6 +1,9 @@
+import glob
 import os
-from indyperf.updown import (setup_builddir, create_repos_and_settings, cleanup_build_group)
-from indyperf.promote import (seal_folo_report, pull_folo_report, promote_deps_by_path, promote_output_by_path, promote_output_by_group)
+from contextlib import contextmanager
+from threading import Lock
+import indyperf.config as config
+import indyperf.updown as updown
 from indyperf.utils import run_cmd
 
 DEFAULT_PME_ARGS = [
@@ -15,14 +18,21 @@ DEFAULT_PME_ARGS = [
     "-DversionSuffixStrip="
 ]
 
-def do_pme(builddir, build, suite):
+# mvnd daemon slots in use: each mvnd build takes the lowest free one, so N builds at a time only ever use
+# slots 0..N-1, and a slot's daemon stays warm from one build to the next, whichever runner thread runs it
+_busy_slots = set()
+_slots_lock = Lock()
+
+def do_pme(builddir, build, suite, log_file=None, transfers=None, usage=None):
     ctx_dir = build.git_context_dir or '.'
 
     print(f"Raw PME args: '{build.pme_args}'")
     args = build.pme_args or " ".join(DEFAULT_PME_ARGS)
     args = args.format(da_url=suite.env.da_url, pme_version_suffix=suite.env.pme_version_suffix)
 
-    ret = run_cmd(f"java -jar /usr/share/pme/pme.jar -f {ctx_dir}/pom.xml -s ./settings.xml {args}", builddir, fail=False)
+    ret = run_cmd(f"java -jar /usr/share/pme/pme.jar -f {ctx_dir}/pom.xml -s ./settings.xml {resolver_args(suite)}{args}", builddir, fail=False, 
+                  log_file=log_file, line_handler=transfers.feed if transfers is not None else None,
+                  timeout=suite.command_timeouts[config.TIMEOUT_PME], usage=usage)
     print(f"PME return code is {ret}")
     if ret == 0:
         return True
@@ -30,15 +40,36 @@ def do_pme(builddir, build, suite):
         return False
 
 
-def do_build(builddir, build, suite):
+def do_build(builddir, build, suite, log_file=None, transfers=None, usage=None, builds_dir=None):
+    """ Run Maven for the build, with the executor chosen in the suite: a fresh mvn JVM, or a warm mvnd daemon from
+        the lowest free daemon slot (a registry of its own under builds_dir). Either way the build gets its own
+        settings.xml and local repo.
+
+        With mvnd, the timeout and resource usage apply to the mvnd client; the build itself runs in the daemon.
+        The daemon may share the client's process group, and is stopped through mvnd before that group is killed
+        on a timeout. As no other build uses the slot meanwhile, that never disturbs another build.
+    """
     ctx_dir = build.git_context_dir or '.'
 
     print(f"Raw maven args: '{build.mvn_args}'")
     args = build.mvn_args or ''
     args = args.format(indy_url=suite.env.indy_url)
 
+    if suite.mvn_executor != config.MVN_EXECUTOR_MVND or builds_dir is None:
+        return run_maven(builddir, ctx_dir, args, suite, log_file, transfers, usage)
+
+    with daemon_slot() as slot:
+        daemon_dir = updown.maven_daemon_dir(builds_dir, slot)
+        return run_maven(builddir, ctx_dir, args, suite, log_file, transfers, usage, daemon_dir)
+
+
+def run_maven(builddir, ctx_dir, args, suite, log_file, transfers, usage, daemon_dir=None):
+    on_timeout = (lambda: stop_maven_daemon(daemon_dir)) if daemon_dir is not None else None
+
     print(f"Run maven with goals: {suite.env.mvn_goals}")
-    ret = run_cmd(f"mvn -f {ctx_dir}/pom.xml -s ./settings.xml {args} {suite.env.mvn_goals}", builddir, fail=False)
+    ret = run_cmd(f"{maven_command(suite, daemon_dir)} -f {ctx_dir}/pom.xml -s ./settings.xml {resolver_args(suite)}{args} {suite.env.mvn_goals}", builddir, fail=False, 
+                  log_file=log_file, line_handler=transfers.feed if transfers is not None else None,
+                  timeout=suite.command_timeouts[config.TIMEOUT_MVN], usage=usage, on_timeout=on_timeout)
     print(f"Maven return code is {ret}")
     if ret == 0:
         return True
@@ -46,3 +77,46 @@ def do_build(builddir, build, suite):
         return False
 
 
+@contextmanager
+def daemon_slot():
+    """Hold the lowest free mvnd daemon slot for the duration of one build"""
+
+    with _slots_lock:
+        slot = 0
+        while slot in _busy_slots:
+            slot += 1
+        _busy_slots.add(slot)
+
+    try:
+        yield slot
+    finally:
+        with _slots_lock:
+            _busy_slots.discard(slot)
+
+
+def maven_command(suite, daemon_dir=None):
+    if suite.mvn_executor != config.MVN_EXECUTOR_MVND:
+        return 'mvn'
+
+    # batch mode keeps mvnd's output plain, so the log and transfer parser see the same lines mvn prints
+    cmd = 'mvnd -B'
+    if daemon_dir is not None:
+        cmd += f" -Dmvnd.daemonStorage={daemon_dir}"
+    return cmd
+
+
+def resolver_args(suite):
+    """The suite's resolver knobs as -D options, for Maven and PME"""
+    return "".join([f"-D{name}={value} " for name,value in updown.resolver_properties(suite).items()])
+
+
+def stop_maven_daemon(daemon_dir):
+    run_cmd(f"mvnd --stop -Dmvnd.daemonStorage={daemon_dir}", fail=False)
+
+
+def stop_maven_daemons(builds_dir, suite):
+    """Stop the warm Maven daemon of every slot used in this run, if the suite uses the mvnd executor"""
+
+    if suite.mvn_executor == config.MVN_EXECUTOR_MVND:
+        for daemon_dir in sorted(glob.glob(os.path.join(updown.maven_daemon_dir(builds_dir), 'slot-*'))):
+            stop_maven_daemon(daemon_dir)
@@ -0,0 +1,63 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from shutil import rmtree
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+
+DEFAULT_CLEANUP_WORKERS = 2
+
+class CleanupWorker:
+    """ Background teardown for finished builds, so deleting multi-GB local repositories and Indy groups
+        doesn't sit between one build and the next.
+
+        Failures are collected rather than printed inline, and reported via failures() at the end of the run.
+        Durations of each background task are handed to the run's Results as cleanup timings.
+    """
+
+    def __init__(self, results, workers=DEFAULT_CLEANUP_WORKERS):
+        self.results = results
+        self._failures = []
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cleanup')
+
+    def submit(self, phase, description, fn, *args):
+        """Run fn(*args) in the background, recording its duration under the given phase name"""
+        self._executor.submit(self._run, phase, description, fn, *args)
+
+    def remove_tree(self, phase, path):
+        """ Rename the directory out of the way (so it disappears from its original path at once),
+            then delete the renamed directory in the background. Missing directories are ignored.
+        """
+        if not os.path.exists(path):
+            return
+
+        doomed = f"{path}.deleting-{uuid4().hex[:6]}"
+        try:
+            os.rename(path, doomed)
+        except Exception as e:
+            self._fail(f"rename {path}: {e}")
+            return
+
+        self.submit(phase, f"remove {path}", rmtree, doomed)
+
+    def _run(self, phase, description, fn, *args):
+        start = monotonic()
+        try:
+            fn(*args)
+        except Exception as e:
+            self._fail(f"{description}: {e}")
+        finally:
+            self.results.add_cleanup(phase, monotonic() - start)
+
+    def _fail(self, message):
+        with self._lock:
+            self._failures.append(message)
+
+    def close(self):
+        """Wait for all pending cleanup to finish"""
+        self._executor.shutdown(wait=True)
+
+    def failures(self):
+        with self._lock:
+            return list(self._failures)
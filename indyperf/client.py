@@ -0,0 +1,114 @@
+import json
+import requests
+from requests.adapters import HTTPAdapter
+from time import monotonic
+from urllib3.util.retry import Retry
+from indyperf.metrics import (EndpointMetrics, ERROR_STATUS)
+
+DEFAULT_HEADERS = {'accept': 'application/json'}
+JSON_HEADERS = {'content-type': 'application/json'}
+
+RETRY_BACKOFF_FACTOR = 0.5
+
+class HttpClient:
+    """ Shared HTTP client for all Indy and SSO calls made during a run.
+
+        Wraps a single requests.Session, so connections are kept alive and pooled per host instead of
+        paying a new TCP / TLS handshake for every admin, folo and promotion call. Default headers
+        (including the SSO Authorization header, once we have a token) and SSL verification are
+        configured once here. Requests that fail to connect are retried with backoff; requests that
+        reached the server are never retried, since promotion and store creation are not idempotent.
+
+        Calls made with an endpoint name (store_create, folo_pull, path_promote, ...) have their latency,
+        status code and response size recorded in self.metrics.
+
+        If on_unauthorized is set (see sso.TokenManager), a 401 response calls it with the token that was
+        rejected and the request is sent once more with the refreshed token.
+
+        If tracer is set (see trace.TraceRecorder), every Indy call is also recorded to the run's trace.
+    """
+
+    def __init__(self, ssl_verify=True, pool_size=10, retries=3):
+        self.session = requests.Session()
+        self.session.verify = ssl_verify
+        self.session.headers.update(DEFAULT_HEADERS)
+
+        retry = Retry(total=retries, connect=retries, read=False, redirect=False, backoff_factor=RETRY_BACKOFF_FACTOR)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.metrics = EndpointMetrics()
+        self.token = None
+        self.on_unauthorized = None
+        self.tracer = None
+
+    def set_token(self, token):
+        self.token = token
+        self.session.headers['Authorization'] = f"Bearer {token}"
+
+    def request(self, method, url, endpoint=None, **kwargs):
+        token = self.token
+        resp = self._send(method, url, endpoint, **kwargs)
+
+        if resp.status_code == 401 and self.on_unauthorized is not None and 'Authorization' not in (kwargs.get('headers') or {}):
+            resp.close()
+            self.on_unauthorized(token)
+            resp = self._send(method, url, endpoint, **kwargs)
+
+        return resp
+
+    def _send(self, method, url, endpoint, **kwargs):
+        if endpoint is None and self.tracer is None:
+            return self.session.request(method, url, **kwargs)
+
+        start = monotonic()
+        try:
+            resp = self.session.request(method, url, **kwargs)
+        except Exception:
+            self._record(method, url, endpoint, kwargs, ERROR_STATUS, start)
+            raise
+
+        self._record(method, url, endpoint, kwargs, resp.status_code, start, response_size(resp, kwargs.get('stream')))
+        return resp
+
+    def _record(self, method, url, endpoint, kwargs, status, start, size=None):
+        duration = monotonic() - start
+        if endpoint is not None:
+            self.metrics.record(endpoint, status, duration, size)
+
+        if self.tracer is not None:
+            body = json.dumps(kwargs['json']) if kwargs.get('json') is not None else None
+            self.tracer.request(method, url, endpoint, body, status, start, duration)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """POST with a JSON content-type, unless the caller supplies its own headers."""
+        kwargs.setdefault('headers', JSON_HEADERS)
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def response_size(resp, stream=None):
+    """Response payload size, without forcing a streamed body to be read"""
+    length = resp.headers.get('content-length')
+    if length is not None:
+        return int(length)
+
+    if stream is True:
+        return None
+
+    return len(resp.content)
@@ -1,13 +1,18 @@
 import click
 import os
 import sys
-from time import sleep
-from traceback import format_exc
-import indyperf.updown as updown
 import indyperf.build as builds
-import indyperf.promote as promote
+import indyperf.cleanup as cleanup
 import indyperf.config as config
+import indyperf.makespan as makespan
+import indyperf.metrics as metrics
+import indyperf.prewarm as prewarm
+import indyperf.results as results
+import indyperf.runner as runner
+import indyperf.sampler as sampler
 import indyperf.sso as sso
+import indyperf.updown as updown
+import indyperf.workqueue as workqueue
 
 @click.command()
 @click.argument('env_yml') #, help='Target environment, including Indy/DA URLs and Indy proxy port')
@@ -15,7 +20,19 @@ import indyperf.sso as sso
 @click.argument('builder_idx') #, help='The zero-based index of this builder')
 @click.argument('total_builders') #, help='The total number of builders in this test')
 @click.option('-B', '--builds-dir', help='Base directory where builds should be cloned and run (defaults to $PWD)')
-def run(env_yml, suite_yml, builder_idx, total_builders, builds_dir):
+@click.option('-w', '--workers', type=click.IntRange(min=1), default=1, show_default=True, help='Number of builds to run concurrently in this process')
+@click.option('-r', '--results-file', help='JSON-lines file to append per-build phase timings to (defaults to $BUILDS_DIR/indyperf-results-$BUILDER_IDX.jsonl)')
+@click.option('-m', '--metrics-port', type=int, help='Serve per-endpoint Indy latency histograms on this port at /metrics while the test runs')
+@click.option('-q', '--queue', help='SQLite work queue file on a volume shared by all builders; builders pull builds from it instead of taking a fixed share')
+@click.option('--queue-lease', type=float, help='Seconds before a build claimed from the work queue, and not finished, is handed out again (default: the suite\'s command timeouts plus an hour)')
+@click.option('-p', '--prefetch', type=click.IntRange(min=0), default=0, show_default=True, help='Pipeline builds: clone and create Indy stores for up to this many builds ahead, and promote each build while the next one runs')
+@click.option('-H', '--history', multiple=True, help='Results file(s) from previous runs (glob patterns allowed); balance builds across builders by their historical durations')
+@click.option('--prewarm', 'prewarm_records', multiple=True, help='Saved folo tracking record(s) (glob patterns allowed) whose downloads are fetched through Indy before the timed run')
+@click.option('--prewarm-seed', is_flag=True, help='Before the timed run, run one untimed seed iteration of each build in this builder\'s order')
+@click.option('--prewarm-concurrency', type=click.IntRange(min=1), default=10, show_default=True, help='Pre-warm downloads in flight at once')
+@click.option('--prewarm-rate', type=float, help='Maximum pre-warm downloads started per second (default: no limit)')
+@click.option('--trace', 'trace_file', help='Record every Indy interaction of the run to this compressed trace file, for replay with indyperf-trace')
+def run(env_yml, suite_yml, builder_idx, total_builders, builds_dir, workers, results_file, metrics_port, queue, queue_lease, prefetch, history, prewarm_records, prewarm_seed, prewarm_concurrency, prewarm_rate, trace_file):
     """ Execute a test run from start to end.
 
         This will read a YAML file containing variables for the target environment, and
@@ -23,10 +40,36 @@ def run(env_yml, suite_yml, builder_idx, total_builders, builds_dir):
         number of rebuilds, along with the total number of concurrent builder clients and this
         client's builder index, it will then construct an ordered list of builds to execute.
 
+        With --queue, builders instead share one work queue (an SQLite file on a shared volume)
+        seeded with the whole suite, and each pulls the next build from it whenever it has a
+        free slot, so faster builders take on more work. A build claimed by a builder that then
+        dies is handed out again once its claim is older than --queue-lease.
+
+        With --history, each builder instead computes the same static plan from the build
+        durations in previous results files: builds are dealt longest first to whichever
+        builder has the least predicted work, so all builders finish at about the same time.
+        The predicted makespan of every builder is printed before the run starts.
+
         When it has the ordered list of builds, it iterates through, building each one in turn.
         The order of builds will likely contain duplicates if any builds are specified to run 
         more than once. Otherwise, builds should be in the order specified in the suite YAML. 
 
+        With --workers N, up to N builds from the ordered list run at the same time, each in
+        its own builddir with its own tracking ID, settings.xml and local repository.
+
+        With --prefetch N, builds are pipelined: the builddirs and Indy stores of up to N
+        upcoming builds are prepared while Maven runs, and each build's folo seal / pull and
+        promotion overlap with the next build's Maven run.
+
+        With --trace, the run's Indy calls, and the content requests in each build's folo
+        record, are recorded with their timing, so indyperf-trace can replay the same load
+        against another Indy later.
+
+        If the suite YAML has a load-profile section, builds instead start on its open-loop
+        timeline (constant or Poisson arrivals, in ramping stages), or with closed arrivals, as
+        needed to hold a target number of builds in flight. --workers and pause-between-builds
+        are then ignored.
+
         Steps for each build include:
         
         * Setup all relevant repositories and groups in Indy
@@ -37,7 +80,8 @@ def run(env_yml, suite_yml, builder_idx, total_builders, builds_dir):
 
         * Setup a Maven settings.xml for the build
 
-        * Execute Maven with the given settings.xml
+        * Execute Maven with the given settings.xml (a fresh mvn, or a warm mvnd daemon if
+          the suite's maven-executor is mvnd; the daemons are stopped at the end of the run)
 
         * Pull the resulting tracking record
 
@@ -47,80 +91,106 @@ def run(env_yml, suite_yml, builder_idx, total_builders, builds_dir):
 
         * Cleanup relevant repos / groups from Indy
 
+        Every step above is timed for every build. The timings are appended to a JSON-lines
+        results file as each build finishes, and summarized (p50/p90/p99/max per phase, and
+        per build name) at the end of the run, along with tester-side latency histograms for
+        each Indy endpoint called. Use --metrics-port to expose those histograms for Prometheus
+        while the run is in progress.
+
+        If the suite YAML has a server-metrics section, the configured Indy endpoints (health,
+        metrics, stats...) are polled at a fixed interval for the whole run, and the samples are
+        written to the results file on the same timeline as the build phases, so indyperf-report
+        can show what the server was doing during each phase.
+
+        With --prewarm, the downloads in the given tracking records are fetched through Indy
+        (concurrently, and rate-limited with --prewarm-rate) before the timed run; with
+        --prewarm-seed, one untimed iteration of each build runs first instead. Every build
+        iteration is tagged cold or warm in the results (warm once the run was pre-warmed, or
+        an earlier iteration of the same build got through Maven), and indyperf-report compares
+        the two, separating Indy's remote-proxy path from its hosted / cached path.
+
         NOTE: This process should mimic the calls and sequence executed by PNC as closely as possible!
     """
     suite = config.read_config(suite_yml, env_yml)
-    order = config.create_build_order(suite, builder_idx, total_builders)
+    work_queue = None
+    if queue is not None:
+        work_queue = workqueue.WorkQueue(queue, suite, builder_idx, queue_lease)
+        order = workqueue.QueueBuildOrder(suite.builds, work_queue)
+    elif len(history) > 0:
+        order = makespan.create_build_order(suite, builder_idx, total_builders, history)
+    else:
+        order = config.create_build_order(suite, builder_idx, total_builders)
     if builds_dir is None:
         builds_dir = os.getcwd()
 
-    print(f"SSL verification enabled? {suite.env.ssl_verify}")
-    sso.get_sso_token(suite)
-
-    build_results = {}
-    fails = 0
-    for build in order.iter():
-        print(f"Running build: {build.name}")
-        result = build_results.get(build.name, [0,0])
-
-        tid_base = f"build_perftest-{build.name}"
+    os.makedirs(builds_dir, exist_ok=True)
+    if results_file is None:
+        results_file = os.path.join(builds_dir, f"indyperf-results-{builder_idx}.jsonl")
 
-        try:
-            (builddir, tid) = updown.setup_builddir(builds_dir, build, tid_base)
+    if metrics_port is not None:
+        metrics.serve_metrics(suite.client.metrics, metrics_port)
 
-            updown.create_repos_and_settings(builddir, tid, suite);
-
-            print(f"Running test with:\n\nDA URL: {suite.env.da_url}\nIndy URL: {suite.env.indy_url}")
-
-            success = True
-
-            if suite.env.da_url is not None:
-                success = builds.do_pme(builddir, build, suite)
-
-            if success is True:
-                success = builds.do_build(builddir, build, suite)
-
-            if suite.env.do_promote is True:
-                if success is True:
-                    promote.seal_folo_report(tid, suite)
-
-                    folo_report = promote.pull_folo_report(tid, suite)
-                    success = promote.promote_deps_by_path(folo_report, tid, suite)
-
-                if success is True:
-                    if suite.promote_by_path is True:
-                        success = promote.promote_output_by_path(tid, suite)
-                    else:
-                        success = promote.promote_output_by_group(tid, suite)
-
-            if success is True:
-                result[0]+=1
-            else:
-                result[1]+=1
-                fails+=1
-
-        except Exception as e:
-            print(f"Build: {build.name} had an error:\n\n{format_exc()}\n\n")
-            result[1]+=1
-        finally:
-            build_results[build.name] = result
-
-            try:
-                updown.clean_local_repo(tid)
-                
-                if suite.env.do_promote is True:
-                    updown.cleanup_build_group(tid, suite)
-            except Exception as cleanError:
-                print(f"Build cleanup failed: {cleanError}")
-
-        print(f"Pausing {suite.pause} before next build")
-        sleep(suite.pause)
+    print(f"SSL verification enabled? {suite.env.ssl_verify}")
+    tokens = sso.TokenManager(suite).start()
+
+    if suite.env.do_promote is True:
+        updown.StoreRegistry(suite).ensure(suite.stores)
+
+    # attached after the shared stores exist: indyperf-trace replay ensures those itself
+    if trace_file is not None:
+        # only tracing needs the trace module (and its aiohttp dependency)
+        import indyperf.trace as trace
+        suite.client.tracer = trace.TraceRecorder(trace_file, suite.env.indy_url)
+
+    run_results = results.Results(results_file, builder_idx)
+    cleaner = cleanup.CleanupWorker(run_results)
+    server_sampler = sampler.ServerSampler(suite, run_results).start()
+    suite.cache = prewarm.CacheState(prewarmed=len(prewarm_records) > 0)
+    try:
+        if len(prewarm_records) > 0:
+            prewarm.prewarm_paths(prewarm.record_paths(prewarm_records), suite, prewarm_concurrency, prewarm_rate)
+
+        if prewarm_seed is True:
+            # a work queue can't be peeked at without claiming builds, so seed the whole suite then
+            names = getattr(order, 'ordered_build_names', None) or list(suite.builds.keys())
+            seeds = [suite.builds[name] for name in dict.fromkeys(names)]
+            failed = prewarm.seed_builds(seeds, builds_dir, suite, run_results, cleaner, workers)
+            if len(failed) > 0:
+                print(f"Seed builds failed (their first timed iterations count as cold): {', '.join(failed)}")
+
+        if suite.load_profile is not None:
+            build_results = runner.run_builds_on_schedule(order, builds_dir, suite, run_results, cleaner, suite.load_profile)
+        elif prefetch > 0:
+            build_results = runner.run_builds_pipelined(order, builds_dir, suite, run_results, cleaner, workers, prefetch)
+        else:
+            build_results = runner.run_builds(order, builds_dir, suite, run_results, cleaner, workers)
+    finally:
+        print("Waiting for background cleanup to finish")
+        cleaner.close()
+        builds.stop_maven_daemons(builds_dir, suite)
+        server_sampler.stop()
+        tokens.stop()
+        if suite.client.tracer is not None:
+            suite.client.tracer.close()
+        if work_queue is not None:
+            work_queue.close()
+        run_results.add_endpoint_metrics(suite.client.metrics)
+        run_results.close()
+
+    fails = sum([counts[1] for counts in build_results.values()])
 
     result_headers = ['Successes', 'Failures']
     row_format = "{:>15}" * (len(result_headers) + 1)
     print(row_format.format("", *result_headers))
-    for name,results in build_results.items():
-        print(row_format.format(name, *results))
+    for name,counts in build_results.items():
+        print(row_format.format(name, *counts))
+
+    run_results.print_summary()
+    suite.client.metrics.print_summary()
+
+    cleanup_failures = cleaner.failures()
+    if len(cleanup_failures) > 0:
+        print(f"\n{len(cleanup_failures)} background cleanup tasks failed:\n- " + "\n- ".join(cleanup_failures))
 
     if fails > 0:
         sys.exit(1)
@@ -1,5 +1,7 @@
 from ruamel.yaml import YAML
 import os
+from indyperf.client import HttpClient
+from indyperf.schedule import (ARRIVAL_MODES, ARRIVALS_CLOSED, ARRIVALS_CONSTANT)
 
 ENV_INDY_URL = 'indy-url'
 ENV_DA_URL = 'DA-url'
@@ -12,6 +14,8 @@ ENV_MVN_GOALS = 'mvn-goals'
 ENV_DO_PROMOTE = 'do-promote'
 ENV_MIRROR_TARGET = 'mirror-target'
 ENV_PROMOTION_TARGET = 'promotion-target'
+ENV_HTTP_POOL_SIZE = 'http-pool-size'
+ENV_HTTP_RETRIES = 'http-retries'
 
 SSO_ENABLE='enabled'
 SSO_GRANT_TYPE = 'grant-type'
@@ -21,11 +25,45 @@ SSO_CLIENT_ID = 'client-id'
 SSO_CLIENT_SECRET = 'client-secret'
 SSO_USERNAME = 'username'
 SSO_PASSWORD = 'password'
+SSO_REFRESH_MARGIN = 'refresh-margin'
 
 TEST_BUILDS_SECTION = 'builds'
 TEST_PROMOTE_BY_PATH_FLAG = 'promote-by-path'
 TEST_STORES = 'stores'
 TEST_PAUSE = 'pause-between-builds'
+TEST_PROMOTE_CHUNK_SIZE = 'promote-chunk-size'
+TEST_PROMOTE_CONCURRENCY = 'promote-concurrency'
+TEST_KEEP_BUILDDIRS = 'keep-builddirs'
+TEST_LOAD_PROFILE = 'load-profile'
+TEST_COMMAND_TIMEOUTS = 'command-timeouts'
+TEST_SERVER_METRICS = 'server-metrics'
+TEST_MVN_EXECUTOR = 'maven-executor'
+TEST_RESOLVER_THREADS = 'resolver-threads'
+TEST_RESOLVER_CONNECTIONS = 'resolver-connections'
+
+MVN_EXECUTOR_MVN = 'mvn'
+MVN_EXECUTOR_MVND = 'mvnd'
+MVN_EXECUTORS = [MVN_EXECUTOR_MVN, MVN_EXECUTOR_MVND]
+
+PROFILE_ARRIVALS = 'arrivals'
+PROFILE_MAX_CONCURRENT = 'max-concurrent'
+PROFILE_SEED = 'seed'
+PROFILE_STAGES = 'stages'
+
+TIMEOUT_GIT = 'git'
+TIMEOUT_PME = 'pme'
+TIMEOUT_MVN = 'mvn'
+
+SAMPLER_INTERVAL = 'interval'
+SAMPLER_ENDPOINTS = 'endpoints'
+SAMPLER_PATH = 'path'
+SAMPLER_METRICS = 'metrics'
+
+STAGE_DURATION = 'duration'
+STAGE_RATE = 'rate'
+STAGE_START_RATE = 'start-rate'
+STAGE_CONCURRENT = 'concurrent'
+STAGE_START_CONCURRENT = 'start-concurrent'
 
 BUILD_MVN_ARGS = 'mvn-args'
 BUILD_PME_ARGS = 'pme-args'
@@ -38,15 +76,31 @@ CLIENT_CREDENTIALS_GRANT_TYPE = 'client_credentials'
 PASSWORD_GRANT_TYPE = 'password'
 
 DEFAULT_SSO_GRANT_TYPE = CLIENT_CREDENTIALS_GRANT_TYPE
+DEFAULT_SSO_REFRESH_MARGIN = 60
 
 DEFAULT_MIRROR_TARGET = 'maven:group:public'
 DEFAULT_MVN_GOALS = 'deploy'
 DEFAULT_PROMOTION_TARGET = 'maven:group:builds'
 DEFAULT_PME_VERSION_SUFFIX='build'
 DEFAULT_PAUSE = 5
+DEFAULT_PROMOTE_CHUNK_SIZE = 500
+DEFAULT_PROMOTE_CONCURRENCY = 4
+DEFAULT_PROFILE_ARRIVALS = ARRIVALS_CONSTANT
+DEFAULT_PROFILE_MAX_CONCURRENT = 10
+DEFAULT_SAMPLER_INTERVAL = 15
+DEFAULT_MVN_EXECUTOR = MVN_EXECUTOR_MVN
+
+# Wall-clock limits (seconds) for each kind of command a build runs
+DEFAULT_COMMAND_TIMEOUTS = {
+    TIMEOUT_GIT: 900,
+    TIMEOUT_PME: 1800,
+    TIMEOUT_MVN: 7200
+}
 DEFAULT_PROXY_ENABLED = False
 DEFAULT_DO_PROMOTE = True
 DEFAULT_PROXY_PORT = 8081
+DEFAULT_HTTP_POOL_SIZE = 20
+DEFAULT_HTTP_RETRIES = 3
 DEFAULT_STORES = [
     {          
         'type': 'hosted', 
@@ -104,6 +158,11 @@ class Environment:
 
         self.mvn_goals = env_spec.get(ENV_MVN_GOALS) or DEFAULT_MVN_GOALS
 
+        self.http_pool_size = env_spec.get(ENV_HTTP_POOL_SIZE) or DEFAULT_HTTP_POOL_SIZE
+        self.http_retries = env_spec.get(ENV_HTTP_RETRIES)
+        if self.http_retries is None:
+            self.http_retries = DEFAULT_HTTP_RETRIES
+
 class SingleSignOn:
     def __init__(self, sso_spec):
         if sso_spec is None or sso_spec.get(SSO_ENABLE) is False:
@@ -111,6 +170,7 @@ class SingleSignOn:
         else:
             self.enabled = sso_spec[SSO_ENABLE]
             self.grant_type = sso_spec.get(SSO_GRANT_TYPE) or DEFAULT_SSO_GRANT_TYPE
+            self.refresh_margin = sso_spec.get(SSO_REFRESH_MARGIN) or DEFAULT_SSO_REFRESH_MARGIN
 
             if self.grant_type == DEFAULT_SSO_GRANT_TYPE:
                 self.form = {
@@ -133,6 +193,64 @@ class SingleSignOn:
 
             self.url = f"{base_url}/auth/realms/{sso_spec[SSO_REALM]}/protocol/openid-connect/token"
 
+class LoadStage:
+    def __init__(self, stage_spec, arrivals=ARRIVALS_CONSTANT):
+        self.duration = stage_spec[STAGE_DURATION]
+        if self.duration <= 0:
+            raise Exception(f"Invalid {TEST_LOAD_PROFILE} stage {STAGE_DURATION}: {self.duration} (expected a positive number of seconds)")
+
+        # open-loop stages set an arrival rate; closed-loop stages a number of builds to keep in flight
+        if arrivals == ARRIVALS_CLOSED:
+            self.rate = None
+            self.start_rate = None
+            self.concurrent = stage_spec[STAGE_CONCURRENT]
+            self.start_concurrent = stage_spec.get(STAGE_START_CONCURRENT)
+        else:
+            self.rate = stage_spec[STAGE_RATE]
+            self.start_rate = stage_spec.get(STAGE_START_RATE)
+            self.concurrent = None
+            self.start_concurrent = None
+
+class LoadProfile:
+    """ Schedule for starting builds: a list of stages, each with a duration (seconds).
+
+        With 'constant' or 'poisson' arrivals the schedule is open-loop: each stage has an arrival rate (builds
+        per minute, ramping linearly from the stage's start-rate, which defaults to the previous stage's rate),
+        and builds start on this timeline regardless of whether earlier builds have finished, with at most
+        max-concurrent running at once.
+
+        With 'closed' arrivals, each stage instead has a target number of builds in flight (concurrent, ramping
+        the same way from start-concurrent), and a new build starts whenever fewer than that are running.
+    """
+    def __init__(self, profile_spec):
+        self.arrivals = profile_spec.get(PROFILE_ARRIVALS) or DEFAULT_PROFILE_ARRIVALS
+        if self.arrivals not in ARRIVAL_MODES:
+            raise Exception(f"Invalid {TEST_LOAD_PROFILE} {PROFILE_ARRIVALS}: '{self.arrivals}' (expected one of: {ARRIVAL_MODES})")
+
+        self.max_concurrent = profile_spec.get(PROFILE_MAX_CONCURRENT) or DEFAULT_PROFILE_MAX_CONCURRENT
+        self.seed = profile_spec.get(PROFILE_SEED)
+        self.stages = [LoadStage(stage_spec, self.arrivals) for stage_spec in profile_spec.get(PROFILE_STAGES) or []]
+
+class SampledEndpoint:
+    """ One Indy endpoint polled by the server-metrics sampler: either just a path, or a path plus the names
+        (or name prefixes) of the metrics to keep from its response, when the response is large.
+    """
+    def __init__(self, name, endpoint_spec):
+        self.name = name
+        if isinstance(endpoint_spec, str):
+            endpoint_spec = {SAMPLER_PATH: endpoint_spec}
+
+        self.path = endpoint_spec[SAMPLER_PATH]
+        self.metrics = endpoint_spec.get(SAMPLER_METRICS)
+
+class ServerMetrics:
+    """Indy endpoints to poll every interval seconds while the run is in progress"""
+    def __init__(self, sampler_spec):
+        self.interval = sampler_spec.get(SAMPLER_INTERVAL) or DEFAULT_SAMPLER_INTERVAL
+        self.endpoints = [SampledEndpoint(name, spec) for (name, spec) in (sampler_spec.get(SAMPLER_ENDPOINTS) or {}).items()]
+        if len(self.endpoints) < 1:
+            raise Exception(f"{TEST_SERVER_METRICS} has no {SAMPLER_ENDPOINTS} to sample")
+
 class Suite:
     def __init__(self, suite_spec, env, sso):
         self.suite_spec = suite_spec
@@ -141,9 +259,40 @@ class Suite:
 
         self.headers = {}
         self.token = None
+        self.tokens = None
+        self.cache = None
+
+        self.client = HttpClient(env.ssl_verify, env.http_pool_size, env.http_retries)
 
         self.promote_by_path = suite_spec.get(TEST_PROMOTE_BY_PATH_FLAG) or True
         self.pause = suite_spec.get(TEST_PAUSE) or DEFAULT_PAUSE
+        self.promote_chunk_size = suite_spec.get(TEST_PROMOTE_CHUNK_SIZE)
+        if self.promote_chunk_size is None:
+            self.promote_chunk_size = DEFAULT_PROMOTE_CHUNK_SIZE
+        self.promote_concurrency = suite_spec.get(TEST_PROMOTE_CONCURRENCY)
+        if self.promote_concurrency is None:
+            self.promote_concurrency = DEFAULT_PROMOTE_CONCURRENCY
+        for (name, value) in ((TEST_PROMOTE_CHUNK_SIZE, self.promote_chunk_size), (TEST_PROMOTE_CONCURRENCY, self.promote_concurrency)):
+            if not isinstance(value, int) or value < 1:
+                raise Exception(f"Invalid {name}: {value} (expected a whole number, at least 1)")
+        self.keep_builddirs = suite_spec.get(TEST_KEEP_BUILDDIRS) or False
+
+        self.mvn_executor = suite_spec.get(TEST_MVN_EXECUTOR) or DEFAULT_MVN_EXECUTOR
+        if self.mvn_executor not in MVN_EXECUTORS:
+            raise Exception(f"Invalid {TEST_MVN_EXECUTOR}: '{self.mvn_executor}' (expected one of: {MVN_EXECUTORS})")
+
+        # None leaves Maven's own defaults in place
+        self.resolver_threads = suite_spec.get(TEST_RESOLVER_THREADS)
+        self.resolver_connections = suite_spec.get(TEST_RESOLVER_CONNECTIONS)
+
+        self.command_timeouts = DEFAULT_COMMAND_TIMEOUTS.copy()
+        self.command_timeouts.update(suite_spec.get(TEST_COMMAND_TIMEOUTS) or {})
+
+        profile_spec = suite_spec.get(TEST_LOAD_PROFILE)
+        self.load_profile = LoadProfile(profile_spec) if profile_spec is not None else None
+
+        sampler_spec = suite_spec.get(TEST_SERVER_METRICS)
+        self.server_metrics = ServerMetrics(sampler_spec) if sampler_spec is not None else None
         self.stores = suite_spec.get(TEST_STORES) or DEFAULT_STORES.copy()
 
         build_specs = suite_spec.get(TEST_BUILDS_SECTION) or {}
@@ -157,6 +306,7 @@ class Suite:
         self.headers = {
             'Authorization': f"Bearer {token}"
         }
+        self.client.set_token(token)
 
 class BuildOrder:
     def __init__(self, builds, ordered_build_names):
@@ -166,6 +316,10 @@ class BuildOrder:
     def iter(self):
         return iter([self.builds[name] for name in self.ordered_build_names])
 
+    def done(self, build):
+        """Called by the runners when a build from iter() has finished (a static order has nothing to track)"""
+        pass
+
 
 def read_config(suite_yml, env_yml):
     """ Read the suite configuration that this worker should run, from a config.yml file 
@@ -240,17 +394,28 @@ def create_build_order(suite, builder_idx, total_builders):
     included_builds = []
 
     counter=0
-    passes = 0
     for name, build in suite.builds.items():
         # print(f"Checking build: {name} ({counter} % {total_builders} == {builder_idx})")
         if counter % int(total_builders) == int(builder_idx):
             # print(f"Including build: {name}")
             included_builds.append(name)
-            build_passes = build.build_count or 1
-            if build_passes > passes:
-                passes = build_passes
         counter+=1
 
+    ordered_builds = interleave_builds(suite, included_builds)
+
+    order_str = '- ' + "\n- ".join(ordered_builds)
+    print(f"My build order:\n{order_str}")
+
+    return BuildOrder(suite.builds, ordered_builds)
+
+
+
+def interleave_builds(suite, included_builds):
+    """ Expand the included build names into passes: every build appears once per pass, until its build-count
+    (defaulting to 1) is used up. Returns the interleaved list of build names.
+    """
+    passes = max([suite.builds[name].build_count or 1 for name in included_builds] or [0])
+
     ordered_builds = []
     for passidx in range(passes):
         for name in included_builds:
@@ -259,9 +424,5 @@ def create_build_order(suite, builder_idx, total_builders):
             if passidx < build_passes:
                 ordered_builds.append(name)
 
-    order_str = '- ' + "\n- ".join(ordered_builds)
-    print(f"My build order:\n{order_str}")
-
-    return BuildOrder(suite.builds, ordered_builds)
-
+    return ordered_builds
 
@@ -0,0 +1,224 @@
+import codecs
+import gzip
+import json
+import os
+
+UPLOADS = 'uploads'
+DOWNLOADS = 'downloads'
+
+WHITESPACE = ' \t\r\n'
+
+# Parsed text already consumed is dropped from the buffer once it grows past this
+COMPACT_THRESHOLD = 65536
+
+READ_CHUNK_SIZE = 65536
+
+
+class _TextStream:
+    """Incremental text buffer over an iterator of byte chunks, for pulling JSON values off a stream"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+
+        if self.pos > COMPACT_THRESHOLD:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            self.buf += self.decoder.decode(b'', final=True)
+        else:
+            self.buf += self.decoder.decode(chunk)
+
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, without consuming it"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+
+            if not self.fill():
+                raise ValueError("Truncated folo tracking record")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Malformed folo tracking record: expected '{char}' at: {self.buf[self.pos:self.pos+40]!r}")
+        self.pos += 1
+
+    def value(self, decoder):
+        """Decode the next complete JSON value, reading more of the stream as needed"""
+        self.peek()
+        while True:
+            try:
+                (value, end) = decoder.raw_decode(self.buf, self.pos)
+                # a number running to the end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+
+            self.fill()
+
+
+def iter_record_entries(chunks, sections=(UPLOADS, DOWNLOADS)):
+    """ Stream (section, entry) pairs out of a folo tracking record, given its JSON as an iterator of byte chunks.
+
+        Only one entry of the 'uploads' / 'downloads' arrays is held in memory at a time; other top-level values
+        are decoded and discarded.
+    """
+    decoder = json.JSONDecoder()
+    stream = _TextStream(chunks)
+
+    stream.expect('{')
+    while True:
+        char = stream.peek()
+        if char == '}':
+            return
+        if char == ',':
+            stream.pos += 1
+            continue
+
+        key = stream.value(decoder)
+        stream.expect(':')
+
+        if key in sections and stream.peek() == '[':
+            stream.pos += 1
+            while True:
+                char = stream.peek()
+                if char == ']':
+                    stream.pos += 1
+                    break
+                if char == ',':
+                    stream.pos += 1
+                    continue
+
+                yield (key, stream.value(decoder))
+        else:
+            stream.value(decoder)
+
+
+def store_type(key):
+    """'remote' for both maven:remote:central and the older remote:central key formats"""
+    parts = key.split(':')
+    return parts[-2] if len(parts) > 2 else parts[0]
+
+
+class FoloSummary:
+    """ Compact summary of a folo tracking record: counts and bytes per section, store key, store type and access
+        channel, plus the paths downloaded from remote repositories (which is all dependency promotion needs).
+    """
+
+    def __init__(self, id):
+        self.id = id
+        self.sections = {UPLOADS: _counter(), DOWNLOADS: _counter()}
+        self.stores = {}
+        self.store_types = {}
+        self.channels = {}
+        self.to_promote = {}
+
+    def add(self, section, entry):
+        key = entry.get('storeKey') or ''
+        channel = entry.get('accessChannel') or 'UNKNOWN'
+        size = entry.get('size') or 0
+
+        _count(self.sections[section], size)
+        _count(self.stores.setdefault(key, {UPLOADS: _counter(), DOWNLOADS: _counter()})[section], size)
+        _count(self.channels.setdefault(f"{section}:{channel}", _counter()), size)
+
+        if section == DOWNLOADS:
+            _count(self.store_types.setdefault(store_type(key), _counter()), size)
+
+            if channel == 'MAVEN_REPO' and store_type(key) == 'remote':
+                # dict used as an ordered set, since the same path can be downloaded more than once
+                self.to_promote.setdefault(key, {})[entry['path']] = True
+
+    def remote_share(self):
+        """Fraction of downloaded bytes served from remote repositories (as opposed to hosted content)"""
+        total = self.sections[DOWNLOADS]['bytes']
+        if total < 1:
+            return None
+        return self.store_types.get('remote', _counter())['bytes'] / total
+
+    def describe(self):
+        share = self.remote_share()
+        share = f"{share * 100:.1f}%" if share is not None else 'n/a'
+        return (f"{self.sections[DOWNLOADS]['count']} downloads ({self.sections[DOWNLOADS]['bytes'] / 1000000.0:.1f} MB, "
+                f"{share} of bytes from remote repositories), {self.sections[UPLOADS]['count']} uploads "
+                f"({self.sections[UPLOADS]['bytes'] / 1000000.0:.1f} MB)")
+
+    def to_dict(self):
+        return {
+            UPLOADS: self.sections[UPLOADS],
+            DOWNLOADS: self.sections[DOWNLOADS],
+            'stores': self.stores,
+            'store_types': self.store_types,
+            'channels': self.channels,
+            'remote_share': self.remote_share(),
+            'promotable_paths': sum([len(paths) for paths in self.to_promote.values()])
+        }
+
+
+class ContentPlan:
+    """ The content requests a build made, taken from its folo tracking record: (path, size) for each download
+        through the tracked group (Maven repository traffic only), and for each upload to its hosted repo.
+    """
+
+    def __init__(self):
+        self.downloads = []
+        self.uploads = []
+
+    def add(self, section, entry):
+        size = entry.get('size') or 0
+        if section == UPLOADS:
+            self.uploads.append((entry['path'], size))
+        elif (entry.get('accessChannel') or 'MAVEN_REPO') == 'MAVEN_REPO':
+            self.downloads.append((entry['path'], size))
+
+    def describe(self):
+        return (f"{len(self.downloads)} downloads ({sum([size for (_, size) in self.downloads]) / 1000000.0:.1f} MB), "
+                f"{len(self.uploads)} uploads ({sum([size for (_, size) in self.uploads]) / 1000000.0:.1f} MB)")
+
+    @classmethod
+    def from_file(cls, path):
+        """Read a tracking record saved to disk (plain or gzipped JSON)"""
+
+        plan = cls()
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            summarize_record(os.path.basename(path), iter(lambda: f.read(READ_CHUNK_SIZE), b''), [plan])
+        return plan
+
+
+def summarize_record(id, chunks, observers=()):
+    """Summarize a streamed folo record, also passing each entry to the add(section, entry) of any observers"""
+
+    summary = FoloSummary(id)
+    for (section, entry) in iter_record_entries(chunks):
+        summary.add(section, entry)
+        for observer in observers:
+            observer.add(section, entry)
+    return summary
+
+
+def _counter():
+    return {'count': 0, 'bytes': 0}
+
+
+def _count(counter, size):
+    counter['count'] += 1
+    counter['bytes'] += size
@@ -0,0 +1,77 @@
+import heapq
+import indyperf.config as config
+from indyperf.report import load_results
+from indyperf.results import (percentile, RECORD_TYPE_BUILD)
+
+
+def historical_durations(paths):
+    """Median duration (seconds) of each build name's successful iterations in previous results files"""
+
+    durations = {}
+    for record in load_results(paths):
+        if record.get('type') == RECORD_TYPE_BUILD and record.get('success') and record.get('duration') is not None:
+            durations.setdefault(record['build'], []).append(record['duration'])
+
+    return {name: percentile(values, 50) for name,values in durations.items()}
+
+
+def assign_builds(suite, total_builders, durations):
+    """ Assign every (build, iteration) of the suite to one of total_builders slots with the longest processing
+        time heuristic: items are taken longest first, each going to the slot with the least predicted work so
+        far. Builds with no history are assumed to take the median of the known durations.
+
+        The assignment is deterministic for the same suite and history, so independently launched builders each
+        compute the same plan and just take their own slot. Returns (per-slot lists of build names, in the order
+        to run them, and per-slot predicted durations).
+    """
+    known = list(durations.values())
+    fallback = percentile(known, 50) if len(known) > 0 else 1.0
+
+    items = []
+    iterations = {}
+    for name in config.interleave_builds(suite, list(suite.builds.keys())):
+        iterations[name] = iterations.get(name, -1) + 1
+        items.append((durations.get(name, fallback), iterations[name], name))
+
+    # longest first; ties in suite order, then by iteration
+    order = {name: idx for (idx, name) in enumerate(suite.builds.keys())}
+    items.sort(key=lambda item: (-item[0], order[item[2]], item[1]))
+
+    slots = [[] for _ in range(total_builders)]
+    loads = [0.0] * total_builders
+    heap = [(0.0, idx) for idx in range(total_builders)]
+    for (duration, _, name) in items:
+        (load, idx) = heapq.heappop(heap)
+        slots[idx].append(name)
+        loads[idx] = load + duration
+        heapq.heappush(heap, (loads[idx], idx))
+
+    return (slots, loads)
+
+
+def create_build_order(suite, builder_idx, total_builders, history):
+    """BuildOrder for this builder's slot of the makespan-balanced plan, after printing the predicted makespans"""
+
+    builder_idx = int(builder_idx)
+    total_builders = int(total_builders)
+
+    durations = historical_durations(history)
+    missing = [name for name in suite.builds.keys() if name not in durations]
+    if len(missing) > 0:
+        print(f"No successful history for: {', '.join(missing)}; assuming the median build duration for them")
+
+    (slots, loads) = assign_builds(suite, total_builders, durations)
+
+    print(f"Predicted makespan per builder, from the history in: {', '.join(history)}")
+    for (idx, load) in enumerate(loads):
+        marker = '  <- this builder' if idx == builder_idx else ''
+        print(f"{idx:>8} {load:>10.0f}s {len(slots[idx]):>6} builds{marker}")
+
+    spread = max(loads) - min(loads) if len(loads) > 0 else 0
+    print(f"Predicted suite wall-clock: {max(loads):.0f}s (spread between builders: {spread:.0f}s, plus pauses between builds)")
+
+    ordered_builds = slots[builder_idx]
+    order_str = '- ' + "\n- ".join(ordered_builds)
+    print(f"My build order:\n{order_str}")
+
+    return config.BuildOrder(suite.builds, ordered_builds)
@@ -0,0 +1,232 @@
+from http.server import (BaseHTTPRequestHandler, HTTPServer)
+from socketserver import ThreadingMixIn
+from threading import (Lock, Thread)
+
+# Histogram precision: values below 2 * SUB_BUCKETS are counted exactly; above that, each power of two is
+# split into SUB_BUCKETS linear buckets, for a worst-case relative error of 1 / SUB_BUCKETS (~3%).
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+# Latencies are recorded in integer microseconds
+MICROS = 1000000
+
+# Upper bounds (seconds) of the cumulative buckets exported to Prometheus
+EXPORT_LATENCY_BOUNDS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0]
+
+ERROR_STATUS = 'error'
+
+
+class Histogram:
+    """ HDR-style log-linear histogram of non-negative integers. Memory is bounded by the value range
+        (at most SUB_BUCKETS buckets per power of two), not by the number of values recorded, and two
+        histograms merge by adding their bucket counts.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        value = max(0, int(value))
+        idx = bucket_index(value)
+        self.counts[idx] = self.counts.get(idx, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for idx,count in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + count
+
+        self.count += other.count
+        self.total += other.total
+        if other.count > 0:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+        return self
+
+    def percentile(self, pct):
+        """The value at the given percentile, accurate to the histogram's precision (never above the max recorded)"""
+        if self.count < 1:
+            return None
+
+        rank = max(1, int(-(-pct * self.count // 100)))
+        seen = 0
+        for idx in sorted(self.counts.keys()):
+            seen += self.counts[idx]
+            if seen >= rank:
+                return min(bucket_high(idx), self.max)
+
+        return self.max
+
+    def count_at_or_below(self, value):
+        """Approximate number of recorded values <= value (whole buckets are counted by their upper bound)"""
+        return sum([count for idx,count in self.counts.items() if bucket_high(idx) <= value])
+
+    def to_dict(self):
+        return {
+            'counts': {str(idx): count for idx,count in self.counts.items()},
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls()
+        hist.counts = {int(idx): count for idx,count in data['counts'].items()}
+        hist.count = data['count']
+        hist.total = data['total']
+        hist.min = data['min']
+        hist.max = data['max']
+        return hist
+
+
+def bucket_index(value):
+    if value < 2 * SUB_BUCKETS:
+        return value
+
+    shift = value.bit_length() - 1 - SUB_BUCKET_BITS
+    return shift * SUB_BUCKETS + (value >> shift)
+
+
+def bucket_high(idx):
+    """Largest value that lands in the given bucket"""
+    if idx < 2 * SUB_BUCKETS:
+        return idx
+
+    shift = idx // SUB_BUCKETS - 1
+    sub = idx - shift * SUB_BUCKETS
+    return ((sub + 1) << shift) - 1
+
+
+class EndpointStats:
+    """Latency and response-size histograms, plus status code counts, for one logical endpoint"""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.size = Histogram()
+        self.statuses = {}
+
+    def record(self, status, latency, size):
+        self.latency.record(latency * MICROS)
+        if size is not None:
+            self.size.record(size)
+
+        status = str(status)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.size.merge(other.size)
+        for status,count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+        return self
+
+    def errors(self):
+        return sum([count for status,count in self.statuses.items() if status == ERROR_STATUS or int(status) >= 400])
+
+    def to_dict(self):
+        return {'latency': self.latency.to_dict(), 'size': self.size.to_dict(), 'statuses': dict(self.statuses)}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.latency = Histogram.from_dict(data['latency'])
+        stats.size = Histogram.from_dict(data['size'])
+        stats.statuses = dict(data['statuses'])
+        return stats
+
+
+class EndpointMetrics:
+    """Thread-safe registry of EndpointStats, keyed by logical endpoint name (store_create, folo_pull, ...)"""
+
+    def __init__(self):
+        self.endpoints = {}
+        self._lock = Lock()
+
+    def record(self, endpoint, status, latency, size=None):
+        with self._lock:
+            self.endpoints.setdefault(endpoint, EndpointStats()).record(status, latency, size)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: EndpointStats().merge(stats) for name,stats in self.endpoints.items()}
+
+    def to_dict(self):
+        return {name: stats.to_dict() for name,stats in self.snapshot().items()}
+
+    def print_summary(self):
+        headers = ['Count', 'Errors', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'Max (ms)']
+        row_format = "{:>20}" + "{:>12}" * len(headers)
+
+        print("\nIndy endpoint latencies (tester side)")
+        print(row_format.format("", *headers))
+        for name,stats in sorted(self.snapshot().items()):
+            latencies = [f"{stats.latency.percentile(pct) / 1000.0:.1f}" for pct in (50, 90, 99, 100)]
+            print(row_format.format(name, stats.latency.count, stats.errors(), *latencies))
+
+    def openmetrics(self):
+        """Render the current state in the Prometheus text exposition format"""
+
+        lines = [
+            '# HELP indyperf_http_request_duration_seconds Tester-side latency of Indy calls, per logical endpoint',
+            '# TYPE indyperf_http_request_duration_seconds histogram'
+        ]
+        snapshot = sorted(self.snapshot().items())
+        for name,stats in snapshot:
+            for bound in EXPORT_LATENCY_BOUNDS:
+                count = stats.latency.count_at_or_below(bound * MICROS)
+                lines.append(f'indyperf_http_request_duration_seconds_bucket{{endpoint="{name}",le="{bound}"}} {count}')
+            lines.append(f'indyperf_http_request_duration_seconds_bucket{{endpoint="{name}",le="+Inf"}} {stats.latency.count}')
+            lines.append(f'indyperf_http_request_duration_seconds_sum{{endpoint="{name}"}} {stats.latency.total / MICROS}')
+            lines.append(f'indyperf_http_request_duration_seconds_count{{endpoint="{name}"}} {stats.latency.count}')
+
+        lines.append('# HELP indyperf_http_responses_total Indy responses, per logical endpoint and status code')
+        lines.append('# TYPE indyperf_http_responses_total counter')
+        for name,stats in snapshot:
+            for status,count in sorted(stats.statuses.items()):
+                lines.append(f'indyperf_http_responses_total{{endpoint="{name}",code="{status}"}} {count}')
+
+        lines.append('# HELP indyperf_http_response_bytes_total Indy response payload bytes, per logical endpoint')
+        lines.append('# TYPE indyperf_http_response_bytes_total counter')
+        for name,stats in snapshot:
+            lines.append(f'indyperf_http_response_bytes_total{{endpoint="{name}"}} {stats.size.total}')
+
+        return "\n".join(lines) + "\n"
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def serve_metrics(metrics, port, host='0.0.0.0'):
+    """Expose the given EndpointMetrics on http://host:port/metrics from a background thread. Returns the server."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+
+            data = metrics.openmetrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    httpd = _ThreadingHTTPServer((host, port), MetricsHandler)
+    Thread(target=httpd.serve_forever, name='metrics', daemon=True).start()
+    print(f"Serving tester metrics on: http://{host}:{port}/metrics")
+    return httpd
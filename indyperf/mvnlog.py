@@ -0,0 +1,103 @@
+import json
+import re
+from time import monotonic
+from indyperf.metrics import (Histogram, MICROS)
+
+DOWNLOAD = 'download'
+UPLOAD = 'upload'
+
+# Maven 3.3.x:  "Downloading: <url>" / "Downloaded: <url> (3 KB at 10.5 KB/sec)"
+# Maven 3.5+:   "Downloading from indy: <url>" / "Downloaded from indy: <url> (3.2 kB at 10 kB/s)"
+TRANSFER_START = re.compile(r'(Downloading|Uploading)(?: (?:from|to) [^:\s]+)?: (\S+)')
+TRANSFER_END = re.compile(r'(Downloaded|Uploaded)(?: (?:from|to) [^:\s]+)?: (\S+) \(([\d.,]+) ([kKMG]?B)(?: at ([\d.,]+) ([kKMG]?B)/s(?:ec)?)?\)')
+
+# Maven 3.3.x uses binary KB; 3.5+ uses SI kB / MB
+UNITS = {'B': 1, 'kB': 1000, 'KB': 1024, 'MB': 1000000, 'GB': 1000000000}
+
+# Transfers that never complete (failed downloads Maven moves on from) are forgotten, oldest first, past this
+MAX_PENDING = 1000
+
+
+def to_bytes(value, unit):
+    return float(value.replace(',', '')) * UNITS[unit]
+
+
+class TransferStats:
+    """Count, bytes, and duration / throughput histograms for one transfer direction"""
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.duration = Histogram()
+        self.throughput = Histogram()
+
+    def record(self, size, duration, throughput):
+        self.count += 1
+        self.bytes += size
+        if duration is not None:
+            self.duration.record(duration * MICROS)
+        if throughput is not None:
+            self.throughput.record(throughput)
+
+    def merge(self, other):
+        self.count += other.count
+        self.bytes += other.bytes
+        self.duration.merge(other.duration)
+        self.throughput.merge(other.throughput)
+        return self
+
+    def to_dict(self):
+        return {'count': self.count, 'bytes': self.bytes, 'duration': self.duration.to_dict(), 'throughput': self.throughput.to_dict()}
+
+
+class TransferParser:
+    """ Streaming parser for Maven / PME console output, turning artifact transfer lines into per-artifact records.
+
+        Each completed transfer is written as one JSON line to records_file (if given) and folded into fixed-size
+        per-direction statistics, so memory stays constant however much output a build produces. Only transfers
+        still in flight (started but not finished) are held in memory.
+
+        Duration is measured from the 'Downloading'/'Uploading' line to the matching 'Downloaded'/'Uploaded' line
+        as they arrive on the pipe; throughput (bytes/s) is Maven's own figure, falling back to size / duration.
+    """
+
+    def __init__(self, records_file=None):
+        self.stats = {DOWNLOAD: TransferStats(), UPLOAD: TransferStats()}
+        self._pending = {}
+        self._out = open(records_file, 'a') if records_file is not None else None
+
+    def feed(self, line):
+        match = TRANSFER_END.search(line)
+        if match:
+            (verb, url, size, size_unit, rate, rate_unit) = match.groups()
+            direction = DOWNLOAD if verb == 'Downloaded' else UPLOAD
+
+            size = to_bytes(size, size_unit)
+            started = self._pending.pop((direction, url), None)
+            duration = monotonic() - started if started is not None else None
+
+            throughput = to_bytes(rate, rate_unit) if rate is not None else None
+            if throughput is None and duration:
+                throughput = size / duration
+            if duration is None and throughput:
+                duration = size / throughput
+
+            self.stats[direction].record(size, duration, throughput)
+            if self._out is not None:
+                self._out.write(json.dumps({'direction': direction, 'url': url, 'size': size, 'duration': duration, 'throughput': throughput}) + '\n')
+            return
+
+        match = TRANSFER_START.search(line)
+        if match:
+            direction = DOWNLOAD if match.group(1) == 'Downloading' else UPLOAD
+            self._pending[(direction, match.group(2))] = monotonic()
+            if len(self._pending) > MAX_PENDING:
+                del self._pending[next(iter(self._pending))]
+
+    def close(self):
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+    def to_dict(self):
+        return {direction: stats.to_dict() for direction,stats in self.stats.items()}
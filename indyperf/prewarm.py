@@ -0,0 +1,101 @@
+import glob
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+import indyperf.folo as folo
+import indyperf.runner as runner
+import indyperf.updown as updown
+from indyperf.schedule import RateLimiter
+
+CACHE_COLD = 'cold'
+CACHE_WARM = 'warm'
+
+PREWARM_CHUNK_SIZE = 65536
+
+
+class CacheState:
+    """ Tags each build iteration of a run as 'cold' or 'warm' (in its results, as 'cache').
+
+        An iteration is warm if the run was pre-warmed from tracking records (which are assumed to cover the
+        whole suite), or if an earlier iteration of the same build in this process (a seed build included) got
+        through Maven, so its content had already been fetched through Indy. Anything else is cold: the first
+        iteration of each build, and iterations whose PME / Maven run started while the first was still running.
+    """
+
+    def __init__(self, prewarmed=False):
+        self.prewarmed = prewarmed
+        self.warmed = set()
+        self._lock = Lock()
+
+    def classify(self, build_name):
+        with self._lock:
+            return CACHE_WARM if self.prewarmed or build_name in self.warmed else CACHE_COLD
+
+    def mark_warm(self, build_name):
+        with self._lock:
+            self.warmed.add(build_name)
+
+
+def record_paths(patterns):
+    """Distinct paths downloaded in the given saved folo tracking records (glob patterns allowed), in first-seen order"""
+
+    paths = {}
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            plan = folo.ContentPlan.from_file(path)
+            for (content_path, _) in plan.downloads:
+                paths[content_path] = True
+
+    return list(paths.keys())
+
+
+def prewarm_paths(paths, suite, concurrency, rate):
+    """ Fetch every path once, through a throwaway build group created just like the timed builds' groups, so the
+        same remote repositories end up caching the content. Up to 'concurrency' downloads run at once, started at
+        no more than 'rate' per second. Returns the number of paths that could not be fetched.
+    """
+    tid = f"build_perftest-prewarm-{uuid4().hex[:12]}"
+    if suite.env.do_promote is True:
+        updown.create_missing_stores(tid, suite)
+
+    base_url = updown.mirror_url(tid, suite)
+    limiter = RateLimiter(rate)
+
+    def fetch(path):
+        limiter.wait()
+        try:
+            with suite.client.get(f"{base_url}{path}", endpoint='prewarm_download', stream=True) as resp:
+                for _ in resp.iter_content(chunk_size=PREWARM_CHUNK_SIZE):
+                    pass
+                # Maven records probes for missing content too; only server errors count as failures
+                return resp.status_code < 500
+        except Exception as e:
+            print(f"Pre-warm of: {path} failed: {e}")
+            return False
+
+    start = monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='prewarm') as executor:
+            fetched = list(executor.map(fetch, paths))
+    finally:
+        if suite.env.do_promote is True:
+            updown.cleanup_build_group(tid, suite)
+
+    failed = fetched.count(False)
+    print(f"Pre-warmed {len(paths)} paths in {monotonic() - start:.1f}s ({failed} failed)")
+    return failed
+
+
+def seed_builds(builds, builds_dir, suite, results, cleaner, workers=1):
+    """ Run one untimed iteration of each of the given builds (up to 'workers' at once), so their content is cached
+        before the timed run starts. Seed iterations are not added to the results. Returns the names that failed.
+    """
+    def seed(build):
+        print(f"Running untimed seed build: {build.name}")
+        return runner.run_build(build, builds_dir, suite, results.new_build(build.name), cleaner)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='seed') as executor:
+        outcomes = list(executor.map(seed, builds))
+
+    return [build.name for (build, success) in zip(builds, outcomes) if success is not True]
@@ -0,0 +1,192 @@
+import click
+import json
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from uuid import uuid4
+import indyperf.config as config
+import indyperf.sso as sso
+import indyperf.updown as updown
+from indyperf.bench import (parse_ints, quiet)
+from indyperf.client import HttpClient
+from indyperf.results import percentile
+
+MODE_PATH = 'path'
+MODE_GROUP = 'group'
+MODES = [MODE_PATH, MODE_GROUP]
+
+ARTIFACT_PATH = "/org/commonjava/indyperf/promobench/artifact-{idx}/1.0/artifact-{idx}-1.0.jar"
+
+PROMOTION_HEADERS = ['Mode', 'Paths', 'Parallel', 'Promotions', 'p50 s', 'p90 s', 'Max s', 'Promotions/s', 'Paths/s', 'Failures']
+
+
+class PromotionBench:
+    """ Drives Indy's promotion endpoints directly, with no builds: hosted source repos are filled with synthetic
+        artifacts, then promoted by path into fresh hosted repos, or by group into fresh groups, many at once.
+
+        Store creation, uploads and cleanup are untimed; only the promotion requests themselves are measured.
+        Every store created is remembered, so cleanup() can remove them all at the end.
+    """
+
+    def __init__(self, suite, artifact_size, upload_concurrency):
+        self.suite = suite
+        self.artifact_size = artifact_size
+        self.upload_concurrency = upload_concurrency
+        self.prefix = f"promobench-{uuid4().hex[:8]}"
+        self.created = []
+
+    def create(self, store_type, label, **spec):
+        store = updown.normalize_store({'type': store_type, 'name': f"{self.prefix}-{label}-{uuid4().hex[:6]}", **spec})
+        updown.create_store(store, self.suite)
+        self.created.append(store['key'])
+        return store['key']
+
+    def upload_source(self, paths):
+        """A new hosted repo holding 'paths' synthetic artifacts of artifact_size bytes"""
+
+        key = self.create('hosted', f"src{paths}", allow_releases=True)
+        base_url = f"{self.suite.env.indy_url}/api/content/{key.replace(':', '/')}"
+        body = bytes(self.artifact_size)
+
+        def upload(idx):
+            resp = self.suite.client.put(base_url + ARTIFACT_PATH.format(idx=idx), data=body, endpoint='content_upload')
+            resp.raise_for_status()
+
+        with ThreadPoolExecutor(max_workers=self.upload_concurrency) as executor:
+            list(executor.map(upload, range(paths)))
+
+        return key
+
+    def create_target(self, mode):
+        if mode == MODE_PATH:
+            return self.create('hosted', 'tgt', allow_releases=True)
+        return self.create('group', 'tgt', constituents=[])
+
+    def promote(self, mode, source, target):
+        """Run one promotion, returning (duration, succeeded)"""
+
+        if mode == MODE_PATH:
+            (kind, endpoint, req) = ('paths', 'path_promote', {'source': source, 'target': target})
+        else:
+            (kind, endpoint, req) = ('groups', 'group_promote', {'source': source, 'targetGroup': target})
+
+        start = monotonic()
+        try:
+            resp = self.suite.client.post(f"{self.suite.env.indy_url}/api/promotion/{kind}/promote", json=req, endpoint=endpoint)
+            duration = monotonic() - start
+            resp.raise_for_status()
+            error = resp.json().get('error')
+        except Exception as e:
+            print(f"Promotion from: {source} to: {target} failed: {e}")
+            return (monotonic() - start, False)
+
+        if error:
+            print(f"Promotion from: {source} to: {target} failed: {error}")
+        return (duration, not error)
+
+    def run_point(self, mode, source, paths, concurrency, promotions, keep=False):
+        """Time 'promotions' promotions of the source repo (holding 'paths' artifacts), 'concurrency' at a time"""
+
+        targets = [self.create_target(mode) for _ in range(promotions)]
+
+        start = monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(lambda target: self.promote(mode, source, target), targets))
+        elapsed = monotonic() - start
+
+        if keep is False:
+            self.delete(targets)
+
+        durations = [duration for (duration, _) in outcomes]
+        succeeded = len([ok for (_, ok) in outcomes if ok])
+        return {
+            'mode': mode,
+            'paths': paths,
+            'concurrency': concurrency,
+            'promotions': promotions,
+            'elapsed': elapsed,
+            'p50': percentile(durations, 50),
+            'p90': percentile(durations, 90),
+            'max': percentile(durations, 100),
+            'throughput': succeeded / elapsed,
+            'paths_per_second': succeeded * paths / elapsed,
+            'failures': promotions - succeeded
+        }
+
+    def delete(self, keys):
+        for key in keys:
+            try:
+                updown.delete_store(key, self.suite)
+            except Exception as e:
+                print(f"Failed to delete: {key}: {e}")
+            self.created.remove(key)
+
+    def cleanup(self):
+        self.delete(list(self.created))
+
+
+@click.command()
+@click.argument('env_yml')
+@click.argument('suite_yml')
+@click.option('-p', '--paths', default='10,100,1000', show_default=True, help='Comma-separated artifact counts per source repo to sweep')
+@click.option('-c', '--concurrency', default='1,4,16', show_default=True, help='Comma-separated numbers of promotions in flight to sweep')
+@click.option('-m', '--mode', type=click.Choice(MODES), multiple=True, default=MODES, show_default=True, help='Promotion kinds to benchmark (repeatable)')
+@click.option('-n', '--promotions', type=click.IntRange(min=1), default=20, show_default=True, help='Promotions per sweep point')
+@click.option('-s', '--artifact-size', type=click.IntRange(min=0), default=4096, show_default=True, help='Size in bytes of each synthetic artifact')
+@click.option('-u', '--upload-concurrency', type=click.IntRange(min=1), default=20, show_default=True, help='Synthetic artifact uploads in flight while filling source repos')
+@click.option('-k', '--keep', is_flag=True, help='Leave the benchmark\'s repos and groups in Indy afterwards')
+@click.option('-o', '--output', help='Write the benchmark results to this JSON file')
+@click.option('-v', '--verbose', is_flag=True, help="Show the harness's own console output during the benchmark")
+def promobench(env_yml, suite_yml, paths, concurrency, mode, promotions, artifact_size, upload_concurrency, keep, output, verbose):
+    """ Stress Indy's promotion endpoints in minutes, without running any Maven builds.
+
+        For each path count, a hosted repo is filled with that many synthetic artifacts. Then, for each
+        concurrency, that repo is promoted --promotions times, by path into fresh hosted repos and / or by group
+        into fresh groups, with up to that many promotions in flight. The sweep shows how promotion latency grows
+        with path count, and where throughput stops scaling with parallelism.
+    """
+    suite = config.read_config(suite_yml, env_yml)
+    concurrencies = parse_ints(concurrency)
+
+    # enough pooled connections for every promotion (or upload) in flight
+    pool_size = max(concurrencies + [upload_concurrency, suite.env.http_pool_size])
+    suite.client = HttpClient(suite.env.ssl_verify, pool_size, suite.env.http_retries)
+    tokens = sso.TokenManager(suite).start()
+
+    bench = PromotionBench(suite, artifact_size, upload_concurrency)
+    rows = []
+    try:
+        for path_count in parse_ints(paths):
+            print(f"Uploading {path_count} synthetic artifacts of {artifact_size} bytes")
+            with quiet(verbose):
+                source = bench.upload_source(path_count)
+
+            for promotion_mode in mode:
+                for parallel in concurrencies:
+                    print(f"Benchmarking {promotions} {promotion_mode} promotions of {path_count} paths, {parallel} at a time")
+                    with quiet(verbose):
+                        rows.append(bench.run_point(promotion_mode, source, path_count, parallel, promotions, keep))
+    finally:
+        if keep is False:
+            with quiet(verbose):
+                bench.cleanup()
+        tokens.stop()
+
+    row_format = "{:>8}" + "{:>12}" * (len(PROMOTION_HEADERS) - 1)
+    print(row_format.format(*PROMOTION_HEADERS))
+    for row in rows:
+        print(row_format.format(row['mode'], row['paths'], row['concurrency'], row['promotions'], f"{row['p50']:.3f}",
+                                f"{row['p90']:.3f}", f"{row['max']:.3f}", f"{row['throughput']:.2f}", f"{row['paths_per_second']:.0f}",
+                                row['failures']))
+
+    print("\nThroughput ceiling (best sweep point)")
+    for promotion_mode in mode:
+        for path_count in parse_ints(paths):
+            points = [row for row in rows if row['mode'] == promotion_mode and row['paths'] == path_count]
+            if len(points) > 0:
+                best = max(points, key=lambda row: row['throughput'])
+                print(f"{promotion_mode:>8} promotion of {path_count} paths: {best['throughput']:.2f} promotions/s "
+                      f"({best['paths_per_second']:.0f} paths/s) at {best['concurrency']} in flight")
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(rows, f, indent=2)
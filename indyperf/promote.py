@@ -1,59 +1,79 @@
-import requests
-from indyperf.utils import POST_HEADERS
+from concurrent.futures import ThreadPoolExecutor
+import indyperf.folo as folo
+
+FOLO_CHUNK_SIZE = 65536
+
+DEPS_TARGET = 'maven:hosted:shared-imports'
 
 def seal_folo_report(id, suite):
     """Seal the Folo tracking report after the build completes"""
 
-    post_headers = {**POST_HEADERS, **suite.headers}
     print(f"Sealing folo tracking report for: {id}")
-    resp = requests.post(f"{suite.env.indy_url}/api/folo/admin/{id}/record", data={}, headers=post_headers, verify=suite.env.ssl_verify)
+    resp = suite.client.post(f"{suite.env.indy_url}/api/folo/admin/{id}/record", data={}, endpoint='folo_seal')
     resp.raise_for_status()
 
 
-def pull_folo_report(id, suite):
-    """Pull the Folo tracking report associated with the current build"""
+def pull_folo_report(id, suite, observers=()):
+    """Pull the Folo tracking report associated with the current build, returning a FoloSummary of it.
+
+       The record is parsed as it streams in, so even very large records never sit in memory whole.
+       Each entry is also passed to any observers (see folo.summarize_record).
+    """
 
-    post_headers = {**POST_HEADERS, **suite.headers}
     print(f"Retrieving folo tracking report for: {id}")
-    resp = requests.get(f"{suite.env.indy_url}/api/folo/admin/{id}/record", headers=post_headers, verify=suite.env.ssl_verify)
-    resp.raise_for_status()
+    with suite.client.get(f"{suite.env.indy_url}/api/folo/admin/{id}/record", endpoint='folo_pull', stream=True) as resp:
+        resp.raise_for_status()
+        summary = folo.summarize_record(id, resp.iter_content(chunk_size=FOLO_CHUNK_SIZE), observers)
 
-    return resp.json()
+    print(f"Folo tracking report for {id}: {summary.describe()}")
+    return summary
 
 
-def promote_deps_by_path(folo_report, id, suite):
-    """Run by-path promotion of downloaded content"""
-    to_promote = {}
+def promote_deps_by_path(folo_summary, id, suite):
+    """Run by-path promotion of downloaded content.
 
-    downloads = folo_report.get('downloads')
-    if downloads is not None:
-        for download in downloads:
-            key = download['storeKey']
-            mode = download['accessChannel']
-            if mode == 'MAVEN_REPO' and key.startswith('remote:'):
-                path = download['path']
+       Every path downloaded from a remote repository is grouped by its source store, then
+       promoted in chunks of suite.promote_chunk_size paths, with up to suite.promote_concurrency
+       promotion requests in flight at once. Returns True only if every chunk promoted cleanly.
+    """
+    to_promote = folo_summary.to_promote
+    target = DEPS_TARGET
+    chunks = dependency_chunks(folo_summary, suite.promote_chunk_size)
 
-                paths = to_promote.get(key)
-                if paths is None:
-                    paths = []
-                    to_promote[key]=paths
+    print(f"Promoting dependencies from {len(to_promote.keys())} sources into {target} ({len(chunks)} requests)")
 
-                    paths.append(path)
+    def promote_chunk(key, paths):
+        req = {'source': key, 'target': target, 'paths': paths}
+        try:
+            resp = suite.client.post(f"{suite.env.indy_url}/api/promotion/paths/promote", json=req, endpoint='path_promote')
+            resp.raise_for_status()
 
-    post_headers = {**POST_HEADERS, **suite.headers}
-    print(f"Promoting dependencies from {len(to_promote.keys())} sources into hosted:shared-imports")
+            # a response that isn't promotion JSON (e.g. a proxy's HTML error page) fails just this chunk
+            return check_promote_status( resp, key, target )
+        except Exception as e:
+            print(f"Failed to promote {len(paths)} paths from: {key} to: {target}. Error: {e}")
+            return False
 
-    target = 'maven:hosted:shared-imports'
+    with ThreadPoolExecutor(max_workers=suite.promote_concurrency) as executor:
+        results = list(executor.map(lambda chunk: promote_chunk(*chunk), chunks))
 
-    success = True
-    for key in to_promote:
-        req = {'source': key, 'target': target, 'paths': to_promote[key]}
-        resp = requests.post(f"{suite.env.indy_url}/api/promotion/paths/promote", json=req, headers=post_headers, verify=suite.env.ssl_verify)
-        resp.raise_for_status()
+    failed = results.count(False)
+    if failed > 0:
+        print(f"{failed} of {len(chunks)} dependency promotion requests failed for: {id}")
+        return False
+
+    return True
+
+def dependency_chunks(folo_summary, chunk_size):
+    """(source store key, paths) for each by-path dependency promotion request, at most chunk_size paths each"""
 
-        success = check_promote_status( resp, key, target )
+    chunks = []
+    for key,paths in folo_summary.to_promote.items():
+        paths = list(paths)
+        for idx in range(0, len(paths), chunk_size):
+            chunks.append((key, paths[idx:idx+chunk_size]))
 
-    return success
+    return chunks
 
 def check_promote_status( resp, key, target ):
     print(f"Promotion result:\n\n{resp.text}")
@@ -72,10 +92,9 @@ def promote_output_by_path(id, suite):
     key = f"maven:hosted:{id}"
     target = suite.env.promotion_target
 
-    post_headers = {**POST_HEADERS, **suite.headers}
     print(f"Promoting build output in hosted:{id} to {suite.env.promotion_target}")
     req = {'source': key, 'target': target}
-    resp = requests.post(f"{suite.env.indy_url}/api/promotion/paths/promote", json=req, headers=post_headers, verify=suite.env.ssl_verify)
+    resp = suite.client.post(f"{suite.env.indy_url}/api/promotion/paths/promote", json=req, endpoint='path_promote')
     resp.raise_for_status()
 
     return check_promote_status( resp, key, target )
@@ -86,10 +105,9 @@ def promote_output_by_group(id, suite):
     key = f"maven:hosted:{id}"
     target = suite.env.promotion_target
 
-    post_headers = {**POST_HEADERS, **suite.headers}
     print(f"Promoting build output in hosted:{id} to membership of {suite.env.promotion_target}")
     req = {'source': key, 'targetGroup': target}
-    resp = requests.post(f"{suite.env.indy_url}/api/promotion/groups/promote", json=req, headers=post_headers, verify=suite.env.ssl_verify)
+    resp = suite.client.post(f"{suite.env.indy_url}/api/promotion/groups/promote", json=req, endpoint='group_promote')
     resp.raise_for_status()
 
     return check_promote_status( resp, key, target )
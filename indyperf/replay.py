@@ -0,0 +1,296 @@
+import aiohttp
+import asyncio
+import click
+import json
+from time import monotonic
+from uuid import uuid4
+import indyperf.config as config
+import indyperf.folo as folo
+import indyperf.promote as promote
+import indyperf.sso as sso
+import indyperf.updown as updown
+from indyperf.metrics import (EndpointMetrics, ERROR_STATUS)
+from indyperf.results import (Results, percentile)
+
+READ_CHUNK_SIZE = folo.READ_CHUNK_SIZE
+
+# Maven resolves with 5 download threads by default
+DEFAULT_BUILD_THREADS = 5
+
+
+def pull_plan(tid, suite):
+    """The ContentPlan of a (sealed) tracking record pulled from Indy"""
+
+    plan = folo.ContentPlan()
+    promote.pull_folo_report(tid, suite, [plan])
+    return plan
+
+
+class ReplayFailure(Exception):
+    pass
+
+
+class ReplayEngine:
+    """ Replays a folo.ContentPlan as many concurrent simulated builds, with asyncio and no Maven.
+
+        Each simulated build makes the Indy calls a real build of the recorded project would, in the same order:
+        create its hosted repo and group, download every recorded path through its folo-tracked group URL (with
+        build_threads downloads in flight, like Maven's resolver), upload its output to the hosted repo, then seal
+        and pull its tracking record, promote dependencies and output, and delete its group.
+
+        Up to 'concurrency' simulated builds run at once, sharing at most 'connections' HTTP connections. Build
+        phases go to the given Results; per-endpoint latencies to self.metrics.
+    """
+
+    def __init__(self, suite, plan, results, build_name, concurrency, connections, build_threads=DEFAULT_BUILD_THREADS):
+        self.suite = suite
+        self.plan = plan
+        self.results = results
+        self.build_name = build_name
+        self.concurrency = concurrency
+        self.connections = connections
+        self.build_threads = build_threads
+        self.metrics = EndpointMetrics()
+        self.bytes = {folo.DOWNLOADS: 0, folo.UPLOADS: 0}
+        self.tally = [0, 0]
+
+    async def call(self, session, method, url, endpoint, drain=False, **kwargs):
+        """Make one request, returning (status, body). With drain, the body is read and counted but not kept."""
+
+        # read the suite's headers per call, so a refreshed SSO token is picked up
+        headers = dict(self.suite.headers)
+        headers.update(kwargs.pop('headers', {}))
+
+        start = monotonic()
+        try:
+            async with session.request(method, url, headers=headers, **kwargs) as resp:
+                if drain:
+                    size = 0
+                    async for chunk in resp.content.iter_chunked(READ_CHUNK_SIZE):
+                        size += len(chunk)
+                    body = None
+                else:
+                    body = await resp.read()
+                    size = len(body)
+        except Exception:
+            self.metrics.record(endpoint, ERROR_STATUS, monotonic() - start)
+            raise
+
+        self.metrics.record(endpoint, resp.status, monotonic() - start, size)
+        return (resp.status, body if not drain else size)
+
+    async def expect_ok(self, session, method, url, endpoint, **kwargs):
+        (status, body) = await self.call(session, method, url, endpoint, **kwargs)
+        if status >= 400:
+            raise ReplayFailure(f"{method} {url} failed with HTTP {status}")
+        return body
+
+    async def downloads(self, session, tid):
+        base_url = updown.mirror_url(tid, self.suite)
+        paths = iter(self.plan.downloads)
+        failures = []
+
+        async def lane():
+            for (path, _) in paths:
+                (status, size) = await self.call(session, 'GET', f"{base_url}{path}", 'content_download', drain=True)
+                self.bytes[folo.DOWNLOADS] += size
+                # Maven routinely probes for content that isn't there; only server errors fail the build
+                if status >= 500:
+                    failures.append(f"GET {path}: HTTP {status}")
+
+        await asyncio.gather(*[lane() for _ in range(self.build_threads)])
+        if len(failures) > 0:
+            raise ReplayFailure(f"{len(failures)} downloads failed, first: {failures[0]}")
+
+    async def uploads(self, session, tid):
+        base_url = updown.deploy_url(tid, self.suite)
+        for (path, size) in self.plan.uploads:
+            await self.expect_ok(session, 'PUT', f"{base_url}{path}", 'content_upload', data=bytes(int(size)))
+            self.bytes[folo.UPLOADS] += size
+
+    async def promote(self, session, tid, timings):
+        indy_url = self.suite.env.indy_url
+
+        with timings.phase('seal_folo_report'):
+            await self.expect_ok(session, 'POST', f"{indy_url}/api/folo/admin/{tid}/record", 'folo_seal', data=b'')
+
+        with timings.phase('pull_folo_report'):
+            summary = await self.pull_record(session, tid)
+
+        timings.details['folo'] = summary.to_dict()
+
+        with timings.phase('promote_deps_by_path'):
+            # as many promotion requests in flight as promote.promote_deps_by_path would have
+            slots = asyncio.Semaphore(self.suite.promote_concurrency)
+
+            async def promote_chunk(key, paths):
+                async with slots:
+                    await self.promotion(session, 'paths', {'source': key, 'target': promote.DEPS_TARGET, 'paths': paths})
+
+            chunks = promote.dependency_chunks(summary, self.suite.promote_chunk_size)
+            await asyncio.gather(*[promote_chunk(key, paths) for (key, paths) in chunks])
+
+        key = f"maven:hosted:{tid}"
+        if self.suite.promote_by_path is True:
+            with timings.phase('promote_output_by_path'):
+                await self.promotion(session, 'paths', {'source': key, 'target': self.suite.env.promotion_target})
+        else:
+            with timings.phase('promote_output_by_group'):
+                await self.promotion(session, 'groups', {'source': key, 'targetGroup': self.suite.env.promotion_target})
+
+    async def pull_record(self, session, tid):
+        """ Pull a sealed tracking record, parsing it as it streams in, so no simulated build ever holds a whole record.
+
+            folo's parser pulls chunks synchronously, so it runs in a worker thread, which fetches each chunk from the
+            response on the event loop.
+        """
+        url = f"{self.suite.env.indy_url}/api/folo/admin/{tid}/record"
+        loop = asyncio.get_running_loop()
+        size = [0]
+
+        start = monotonic()
+        try:
+            async with session.request('GET', url, headers=dict(self.suite.headers)) as resp:
+                if resp.status >= 400:
+                    self.metrics.record('folo_pull', resp.status, monotonic() - start, 0)
+                    raise ReplayFailure(f"GET {url} failed with HTTP {resp.status}")
+
+                stream = resp.content.iter_chunked(READ_CHUNK_SIZE)
+
+                def chunks():
+                    while True:
+                        try:
+                            chunk = asyncio.run_coroutine_threadsafe(stream.__anext__(), loop).result()
+                        except StopAsyncIteration:
+                            return
+                        size[0] += len(chunk)
+                        yield chunk
+
+                summary = await loop.run_in_executor(None, folo.summarize_record, tid, chunks())
+        except ReplayFailure:
+            raise
+        except Exception:
+            self.metrics.record('folo_pull', ERROR_STATUS, monotonic() - start)
+            raise
+
+        self.metrics.record('folo_pull', resp.status, monotonic() - start, size[0])
+        return summary
+
+    async def promotion(self, session, kind, req):
+        body = await self.expect_ok(session, 'POST', f"{self.suite.env.indy_url}/api/promotion/{kind}/promote",
+                                    'path_promote' if kind == 'paths' else 'group_promote', json=req)
+        if json.loads(body).get('error'):
+            raise ReplayFailure(f"Promotion from: {req['source']} failed: {body[:200]!r}")
+
+    async def run_build(self, session):
+        timings = self.results.new_build(self.build_name)
+        tid = f"build_perftest-replay-{self.build_name}-{uuid4().hex[:12]}"
+        timings.tid = tid
+        indy_url = self.suite.env.indy_url
+        do_promote = self.suite.env.do_promote is True
+
+        success = False
+        try:
+            if do_promote:
+                with timings.phase('create_repos'):
+                    for store in updown.build_store_specs(tid, self.suite):
+                        await self.expect_ok(session, 'POST', f"{indy_url}/api/admin/stores/{store['package_type']}/{store['type']}", 'store_create', json=store)
+
+            with timings.phase('downloads'):
+                await self.downloads(session, tid)
+
+            if 'deploy' in self.suite.env.mvn_goals and do_promote:
+                with timings.phase('uploads'):
+                    await self.uploads(session, tid)
+
+            if do_promote:
+                await self.promote(session, tid, timings)
+
+            success = True
+
+        except Exception as e:
+            print(f"Replayed build: {tid} failed: {e!r}")
+
+        finally:
+            if do_promote:
+                try:
+                    with timings.phase('cleanup_build_group'):
+                        await self.expect_ok(session, 'DELETE', f"{indy_url}/api/admin/group/{tid}", 'group_delete')
+                except Exception as e:
+                    print(f"Failed to delete group: {tid}: {e!r}")
+
+        timings.finish(success)
+        self.results.add_build(timings)
+        self.tally[0 if success else 1] += 1
+
+    async def run(self, builds):
+        connector_args = {'limit': self.connections}
+        if self.suite.env.ssl_verify is False:
+            connector_args['ssl'] = False
+
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=60, sock_read=300)
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(**connector_args), timeout=timeout) as session:
+            remaining = [builds]
+
+            async def builder():
+                while remaining[0] > 0:
+                    remaining[0] -= 1
+                    await self.run_build(session)
+
+            await asyncio.gather(*[builder() for _ in range(min(self.concurrency, builds))])
+
+
+@click.command()
+@click.argument('env_yml')
+@click.argument('suite_yml')
+@click.option('-f', '--record-file', help='Folo tracking record (JSON, optionally gzipped) saved from a real build')
+@click.option('-t', '--tid', help='Tracking ID of a real build whose sealed folo record should be pulled from Indy')
+@click.option('-N', '--name', default='replay', show_default=True, help='Build name to record the simulated builds under')
+@click.option('-n', '--builds', type=click.IntRange(min=1), default=100, show_default=True, help='Number of simulated builds to run')
+@click.option('-c', '--concurrency', type=click.IntRange(min=1), default=100, show_default=True, help='Simulated builds running at once')
+@click.option('-C', '--connections', type=click.IntRange(min=1), default=200, show_default=True, help='Maximum HTTP connections (requests in flight) across all simulated builds')
+@click.option('-T', '--build-threads', type=click.IntRange(min=1), default=DEFAULT_BUILD_THREADS, show_default=True, help='Concurrent downloads per simulated build')
+@click.option('-r', '--results-file', default='indyperf-replay-results.jsonl', show_default=True, help='JSON-lines file to append per-build phase timings to')
+def replay(env_yml, suite_yml, record_file, tid, name, builds, concurrency, connections, build_threads, results_file):
+    """ Generate PNC-scale load on Indy without Maven, by replaying a real build's folo tracking record.
+
+        The record comes from a file (--record-file) or is pulled from Indy by tracking ID (--tid). Thousands
+        of simulated builds can then run from this one process, each making the same store, content, folo and
+        promotion calls as the recorded build. Results use the same JSON-lines format as run-indyperf-test, so
+        indyperf-report can merge and compare them.
+    """
+    if (record_file is None) == (tid is None):
+        raise click.UsageError("Give exactly one of --record-file or --tid")
+
+    suite = config.read_config(suite_yml, env_yml)
+    tokens = sso.TokenManager(suite).start()
+
+    plan = folo.ContentPlan.from_file(record_file) if record_file is not None else pull_plan(tid, suite)
+    print(f"Replaying {builds} builds of: {plan.describe()}, {concurrency} at a time over at most {connections} connections")
+
+    if suite.env.do_promote is True:
+        updown.StoreRegistry(suite).ensure(suite.stores)
+
+    run_results = Results(results_file, 0)
+    engine = ReplayEngine(suite, plan, run_results, name, concurrency, connections, build_threads)
+
+    start = monotonic()
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(engine.run(builds))
+    finally:
+        loop.close()
+        elapsed = monotonic() - start
+        tokens.stop()
+        run_results.add_endpoint_metrics(engine.metrics)
+        run_results.close()
+
+    durations = [timings.duration for timings in run_results.builds]
+    requests = sum([stats.latency.count for stats in engine.metrics.snapshot().values()])
+    print(f"\n{engine.tally[0]} builds succeeded, {engine.tally[1]} failed in {elapsed:.1f}s: {len(durations) / elapsed:.2f} builds/s, "
+          f"{requests / elapsed:.0f} requests/s, {engine.bytes[folo.DOWNLOADS] / elapsed / 1000000.0:.1f} MB/s down, "
+          f"{engine.bytes[folo.UPLOADS] / elapsed / 1000000.0:.1f} MB/s up")
+    print(f"Build duration p50: {percentile(durations, 50):.3f}s, p90: {percentile(durations, 90):.3f}s, max: {percentile(durations, 100):.3f}s")
+
+    run_results.print_summary()
+    engine.metrics.print_summary()
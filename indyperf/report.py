@@ -0,0 +1,440 @@
+import bisect
+import click
+import glob
+import json
+import os
+import sys
+from datetime import datetime as dt
+from ruamel.yaml import YAML
+from indyperf.metrics import (EndpointStats, Histogram, MICROS)
+from indyperf.mvnlog import TransferStats
+from indyperf.results import (percentile, print_resources_table, summarize_resources, RECORD_TYPE_BUILD, RECORD_TYPE_CLEANUP,
+                              RECORD_TYPE_ENDPOINT_METRICS, RECORD_TYPE_SERVER_SAMPLE, TOTAL_PHASE)
+
+STATS = ['p50', 'p90', 'p99', 'max']
+PERCENTILES = {'p50': 50, 'p90': 90, 'p99': 99, 'max': 100}
+
+DEFAULT_TIMELINE_BUCKET = 60
+
+# Allowed change against the baseline before a run counts as a regression: percent increase for phase and
+# endpoint latency stats, percentage points for the failure rate, and percent decrease for throughput.
+# A phase / endpoint stat must also grow by at least min-delta seconds, so a few ms of jitter in the
+# millisecond-scale phases (write_settings, create_repos, ...) doesn't fail the gate.
+DEFAULT_THRESHOLDS = {
+    'phases': {'default': {'p50': 15, 'p90': 20}},
+    'endpoints': {'default': {'p90': 25}},
+    'min-delta': {'phases': 1.0, 'endpoints': 0.05},
+    'failure-rate': 5,
+    'throughput': 10
+}
+
+
+def load_results(paths):
+    """Read every record from the given results files (glob patterns allowed), tagging each with its source file"""
+
+    records = []
+    for pattern in paths:
+        files = sorted(glob.glob(pattern)) or [pattern]
+        for path in files:
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if line != '':
+                        record = json.loads(line)
+                        record['source'] = os.path.basename(path)
+                        records.append(record)
+
+    return records
+
+
+def parse_started(started):
+    for fmt in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return dt.strptime(started, fmt)
+        except ValueError:
+            pass
+
+    raise ValueError(f"Unparseable build start time: {started}")
+
+
+def summarize(values):
+    values = [v for v in values if v is not None]
+    summary = {'count': len(values)}
+    for name,pct in PERCENTILES.items():
+        summary[name] = percentile(values, pct)
+    return summary
+
+
+def build_report(records, bucket=DEFAULT_TIMELINE_BUCKET):
+    """Merge result records from any number of builders into one report dict"""
+
+    builds = [r for r in records if r.get('type') == RECORD_TYPE_BUILD]
+
+    phases = {}
+    by_build = {}
+    by_cache = {}
+    outcomes = {}
+    for record in builds:
+        if record.get('cache') is not None:
+            per_cache = by_cache.setdefault(record['cache'], {})
+            for name,phase in record['phases'].items():
+                per_cache.setdefault(name, []).append(phase['duration'])
+            per_cache.setdefault(TOTAL_PHASE, []).append(record['duration'])
+
+        per_build = by_build.setdefault(record['build'], {})
+        # a pipelined build's setup phases ran before its clock started, and are kept apart under 'prepare'
+        for name,phase in {**(record.get('prepare') or {}), **record['phases']}.items():
+            phases.setdefault(name, []).append(phase['duration'])
+            per_build.setdefault(name, []).append(phase['duration'])
+
+        phases.setdefault(TOTAL_PHASE, []).append(record['duration'])
+        per_build.setdefault(TOTAL_PHASE, []).append(record['duration'])
+
+        counts = outcomes.setdefault(record['build'], {'successes': 0, 'failures': 0})
+        counts['successes' if record['success'] else 'failures'] += 1
+
+    cleanups = {}
+    for record in records:
+        if record.get('type') == RECORD_TYPE_CLEANUP:
+            cleanups.setdefault(record['phase'], []).append(record['duration'])
+
+    endpoints = {}
+    for record in records:
+        if record.get('type') == RECORD_TYPE_ENDPOINT_METRICS:
+            for name,data in record['endpoints'].items():
+                endpoints.setdefault(name, EndpointStats()).merge(EndpointStats.from_dict(data))
+
+    transfers = {}
+    for record in builds:
+        for direction,data in (record.get('transfers') or {}).items():
+            stats = transfers.setdefault(direction, TransferStats())
+            stats.count += data['count']
+            stats.bytes += data['bytes']
+            stats.throughput.merge(Histogram.from_dict(data['throughput']))
+            stats.duration.merge(Histogram.from_dict(data['duration']))
+
+    failures = sum([counts['failures'] for counts in outcomes.values()])
+    report = {
+        'builders': sorted(set([r['source'] for r in builds])),
+        'builds': len(builds),
+        'failures': failures,
+        'failure_rate': failures * 100.0 / len(builds) if len(builds) > 0 else 0.0,
+        'outcomes': outcomes,
+        'phases': {name: summarize(values) for name,values in phases.items()},
+        'phases_by_build': {build: {name: summarize(values) for name,values in per_build.items()} for build,per_build in by_build.items()},
+        'phases_by_cache': {cache: {name: summarize(values) for name,values in per_cache.items()} for cache,per_cache in by_cache.items()},
+        'cleanup': {name: summarize(values) for name,values in cleanups.items()},
+        'endpoints': {name: endpoint_summary(stats) for name,stats in endpoints.items()},
+        'transfers': {direction: transfer_summary(stats) for direction,stats in transfers.items()},
+        'resources': summarize_resources([record.get('resources') or {} for record in builds]),
+    }
+    report.update(timeline(builds, bucket))
+    report.update(server_phases(builds, records))
+    return report
+
+
+def endpoint_summary(stats):
+    summary = {'count': stats.latency.count, 'errors': stats.errors(), 'statuses': stats.statuses}
+    summary['error_rate'] = stats.errors() * 100.0 / stats.latency.count if stats.latency.count > 0 else 0.0
+    for name,pct in PERCENTILES.items():
+        value = stats.latency.percentile(pct)
+        summary[name] = value / MICROS if value is not None else None
+    return summary
+
+
+def transfer_summary(stats):
+    summary = {'count': stats.count, 'bytes': stats.bytes}
+    for pct in (10, 50, 90):
+        summary[f"throughput_p{pct}"] = stats.throughput.percentile(pct)
+    return summary
+
+
+def sample_indicators(record):
+    indicators = {
+        f"{record['endpoint']}.up": 1 if isinstance(record['status'], int) and record['status'] < 300 else 0,
+        f"{record['endpoint']}.latency": record['latency']
+    }
+    for key,value in record['values'].items():
+        indicators[f"{record['endpoint']}.{key}"] = value
+    return indicators
+
+
+def server_phases(builds, records):
+    """ Server-side indicators sampled while each phase ran. Samples and phases are matched within the results file
+        they came from (one builder process, one monotonic timeline). Each phase instance contributes the mean of
+        the samples taken during it, or the last sample before it ended when it was shorter than the sampling
+        interval; these are then summarized per phase, over all builds and per build name.
+    """
+    samples = {}
+    for record in records:
+        if record.get('type') == RECORD_TYPE_SERVER_SAMPLE:
+            samples.setdefault(record['source'], []).append((record['start'], sample_indicators(record)))
+
+    if len(samples) < 1:
+        return {}
+
+    for timeline_samples in samples.values():
+        timeline_samples.sort(key=lambda sample: sample[0])
+    starts = {source: [sample[0] for sample in timeline_samples] for source,timeline_samples in samples.items()}
+
+    phases = {}
+    by_build = {}
+    for record in builds:
+        source_samples = samples.get(record['source'])
+        if source_samples is None:
+            continue
+
+        spans = [(name, phase['start'], phase['duration']) for name,phase in record['phases'].items()]
+        if record.get('start') is not None and record['duration'] is not None:
+            spans.append((TOTAL_PHASE, record['start'], record['duration']))
+
+        for (name, start, duration) in spans:
+            lo = bisect.bisect_left(starts[record['source']], start)
+            hi = bisect.bisect_right(starts[record['source']], start + duration)
+            during = [sample[1] for sample in source_samples[lo:hi]] if hi > lo else [source_samples[hi-1][1]] if hi > 0 else []
+
+            means = {}
+            for indicators in during:
+                for key,value in indicators.items():
+                    means.setdefault(key, []).append(value)
+
+            for key,values in means.items():
+                mean = sum(values) / len(values)
+                phases.setdefault(name, {}).setdefault(key, []).append(mean)
+                by_build.setdefault(record['build'], {}).setdefault(name, {}).setdefault(key, []).append(mean)
+
+    return {
+        'server_phases': {name: {key: summarize(values) for key,values in indicators.items()} for name,indicators in phases.items()},
+        'server_phases_by_build': {build: {name: {key: summarize(values) for key,values in indicators.items()} for name,indicators in per_build.items()}
+                                   for build,per_build in by_build.items()}
+    }
+
+
+def timeline(builds, bucket):
+    """ Builds completed (and failed) per time bucket, on the wall clock shared by all builders, and the run's
+        throughput in successful builds per hour
+    """
+
+    if len(builds) < 1:
+        return {'elapsed': 0, 'throughput': 0.0, 'timeline': []}
+
+    spans = []
+    for record in builds:
+        start = parse_started(record['started'])
+        spans.append((start, (start - dt.min).total_seconds() + record['duration'], record['success']))
+
+    first = min([span[0] for span in spans])
+    origin = (first - dt.min).total_seconds()
+    elapsed = max([span[1] for span in spans]) - origin
+
+    buckets = {}
+    for (_, end, success) in spans:
+        idx = int((end - origin) // bucket)
+        counts = buckets.setdefault(idx, {'completed': 0, 'failed': 0})
+        counts['completed'] += 1
+        if not success:
+            counts['failed'] += 1
+
+    points = []
+    for idx in range(max(buckets.keys()) + 1):
+        counts = buckets.get(idx, {'completed': 0, 'failed': 0})
+        points.append({'offset': idx * bucket, **counts})
+
+    return {
+        'started': first.isoformat(),
+        'elapsed': elapsed,
+        # successful builds only, so a run whose builds fail fast doesn't look faster
+        'throughput': len([span for span in spans if span[2]]) * 3600.0 / elapsed if elapsed > 0 else 0.0,
+        'timeline_bucket': bucket,
+        'timeline': points
+    }
+
+
+def print_report(report):
+    print(f"Builders: {len(report['builders'])}, builds: {report['builds']}, failures: {report['failures']} ({report['failure_rate']:.1f}%)")
+    print(f"Elapsed: {report['elapsed']:.0f}s, throughput: {report['throughput']:.1f} successful builds/hour")
+
+    print_stats_table("Phase timings in seconds, all builds", report['phases'], 3)
+    for build,phases in report['phases_by_build'].items():
+        outcome = report['outcomes'][build]
+        print_stats_table(f"Phase timings in seconds, build: {build} ({outcome['successes']} ok, {outcome['failures']} failed)", phases, 3)
+
+    by_cache = report.get('phases_by_cache') or {}
+    if len(by_cache) > 1:
+        for cache,phases in by_cache.items():
+            print_stats_table(f"Phase timings in seconds, {cache}-cache iterations", phases, 3)
+        if 'cold' in by_cache and 'warm' in by_cache:
+            print_cache_comparison(by_cache['cold'], by_cache['warm'])
+
+    if len(report['cleanup']) > 0:
+        print_stats_table("Background cleanup timings in seconds", report['cleanup'], 3)
+
+    if len(report['endpoints']) > 0:
+        print_stats_table("Indy endpoint latencies in seconds (tester side)", report['endpoints'], 4, ['errors'])
+
+    if len(report['transfers']) > 0:
+        print("\nArtifact transfers reported by Maven / PME")
+        row_format = "{:>28}" + "{:>14}" * 5
+        print(row_format.format("", 'Count', 'MB', 'p10 kB/s', 'p50 kB/s', 'p90 kB/s'))
+        for direction,stats in report['transfers'].items():
+            rates = [stats[f"throughput_p{pct}"] for pct in (10, 50, 90)]
+            rates = [f"{rate / 1000.0:.1f}" if rate is not None else '-' for rate in rates]
+            print(row_format.format(f"{direction}s", stats['count'], f"{stats['bytes'] / 1000000.0:.1f}", *rates))
+
+    if len(report.get('resources') or {}) > 0:
+        print("\nCommand resource usage (CPU share = user + sys CPU seconds per wall-clock second)")
+        print_resources_table(report['resources'])
+
+    if len(report.get('server_phases') or {}) > 0:
+        print_server_phases("all builds", report['server_phases'])
+        for build,phases in report['server_phases_by_build'].items():
+            print_server_phases(f"build: {build}", phases)
+
+    print(f"\nBuilds completed per {report.get('timeline_bucket', DEFAULT_TIMELINE_BUCKET)}s")
+    for point in report['timeline']:
+        print(f"{point['offset']:>8}s {point['completed']:>6} completed {point['failed']:>6} failed  " + '#' * point['completed'])
+
+
+def print_cache_comparison(cold, warm):
+    print("\nCold versus warm cache, p50 / p90 in seconds")
+    headers = ['cold p50', 'warm p50', 'cold p90', 'warm p90', 'p50 ratio']
+    row_format = "{:>28}" + "{:>14}" * len(headers)
+    print(row_format.format("", *headers))
+    for name,cold_stats in cold.items():
+        warm_stats = warm.get(name)
+        if warm_stats is None:
+            continue
+
+        ratio = cold_stats['p50'] / warm_stats['p50'] if warm_stats['p50'] else None
+        print(row_format.format(name, _fmt(cold_stats['p50'], 3), _fmt(warm_stats['p50'], 3), _fmt(cold_stats['p90'], 3),
+                                _fmt(warm_stats['p90'], 3), _fmt(ratio, 2)))
+
+
+def print_server_phases(title, phases):
+    rows = {}
+    for name,indicators in phases.items():
+        for key,values in indicators.items():
+            rows[f"{name} {key}"] = values
+
+    width = max([len(row) for row in rows.keys()] + [28])
+    print_stats_table(f"Indy server indicators during each phase (mean per phase instance), {title}", rows, 3, width=width)
+
+
+def print_stats_table(title, stats, precision, extra=[], width=28):
+    print(f"\n{title}")
+    headers = ['count'] + extra + STATS
+    row_format = "{:>" + str(width) + "}" + "{:>14}" * len(headers)
+    print(row_format.format("", *headers))
+    for name,values in stats.items():
+        cells = [_fmt(values.get(header), precision) for header in headers]
+        print(row_format.format(name, *cells))
+
+
+def _fmt(value, precision):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.{precision}f}"
+    return str(value)
+
+
+def load_thresholds(thresholds_yml):
+    thresholds = json.loads(json.dumps(DEFAULT_THRESHOLDS))
+    if thresholds_yml is not None:
+        with open(thresholds_yml) as f:
+            spec = YAML(typ='safe').load(f) or {}
+
+        for section in ('phases', 'endpoints', 'min-delta'):
+            thresholds[section].update(spec.get(section) or {})
+        for key in ('failure-rate', 'throughput'):
+            if spec.get(key) is not None:
+                thresholds[key] = spec[key]
+
+    return thresholds
+
+
+def compare(report, baseline, thresholds):
+    """Compare a report against a baseline report. Returns a list of (check, baseline, current, limit, regressed) rows."""
+
+    rows = []
+    for section in ('phases', 'endpoints'):
+        limits = thresholds[section]
+        min_delta = thresholds['min-delta'].get(section) or 0
+        for name,current in report[section].items():
+            base = baseline.get(section, {}).get(name)
+            if base is None:
+                continue
+
+            for stat,pct in (limits.get(name) or limits.get('default') or {}).items():
+                if current.get(stat) is None or base.get(stat) is None:
+                    continue
+                limit = max(base[stat] * (1 + pct / 100.0), base[stat] + min_delta)
+                rows.append((f"{section}.{name}.{stat}", base[stat], current[stat], limit, current[stat] > limit))
+
+    limit = baseline['failure_rate'] + thresholds['failure-rate']
+    rows.append(('failure_rate', baseline['failure_rate'], report['failure_rate'], limit, report['failure_rate'] > limit))
+
+    if baseline.get('throughput'):
+        limit = baseline['throughput'] * (1 - thresholds['throughput'] / 100.0)
+        rows.append(('throughput', baseline['throughput'], report['throughput'], limit, report['throughput'] < limit))
+
+    return rows
+
+
+@click.command()
+@click.argument('results', nargs=-1, required=True)
+@click.option('-o', '--output', help='Write the merged report to this JSON file (usable later as a --baseline)')
+@click.option('-b', '--baseline', help='Baseline report JSON (from a previous --output) to compare this run against')
+@click.option('-t', '--thresholds', 'thresholds_yml', help='YAML file of regression thresholds, overriding the defaults')
+@click.option('--bucket', type=int, default=DEFAULT_TIMELINE_BUCKET, show_default=True, help='Seconds per bucket in the throughput timeline')
+def report(results, output, baseline, thresholds_yml, bucket):
+    """ Merge the results files of every builder in a run into one report, and optionally gate it against a baseline.
+
+        RESULTS are the JSON-lines results files written by run-indyperf-test (glob patterns are expanded). The report
+        covers per-phase and per-endpoint percentiles, artifact transfer throughput, failure rates, and completed
+        builds over time. Iterations tagged cold or warm (see run-indyperf-test --prewarm) are also summarized and compared separately.
+        If the run sampled Indy's own metrics (see server-metrics in the suite YAML), the sampled
+        indicators are shown next to each phase of each build.
+
+        With --baseline, each phase / endpoint statistic, the failure rate and the overall throughput are checked
+        against the baseline run using the configured thresholds, and the command exits non-zero on any regression.
+        Thresholds YAML looks like:
+
+        \b
+        phases:
+          default: {p50: 15, p90: 20}    # allowed % increase
+          do_build: {p90: 10}
+        endpoints:
+          default: {p90: 25}
+        min-delta:                       # and grown by at least this many seconds
+          phases: 1.0
+          endpoints: 0.05
+        failure-rate: 5                  # allowed increase, in percentage points
+        throughput: 10                   # allowed % decrease in successful builds/hour
+    """
+    merged = build_report(load_results(results), bucket)
+    print_report(merged)
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(merged, f, indent=2)
+        print(f"\nReport written to: {output}")
+
+    if baseline is not None:
+        with open(baseline) as f:
+            base = json.load(f)
+
+        rows = compare(merged, base, load_thresholds(thresholds_yml))
+        regressions = [row for row in rows if row[4]]
+
+        print(f"\nComparison against baseline: {baseline}")
+        row_format = "{:>48}" + "{:>14}" * 3 + "{:>12}"
+        print(row_format.format("", 'baseline', 'current', 'limit', ''))
+        for (check, base_value, current, limit, regressed) in rows:
+            print(row_format.format(check, _fmt(float(base_value), 3), _fmt(float(current), 3), _fmt(float(limit), 3), 'REGRESSED' if regressed else 'ok'))
+
+        if len(regressions) > 0:
+            print(f"\n{len(regressions)} of {len(rows)} checks regressed against the baseline")
+            sys.exit(1)
+
+        print(f"\nAll {len(rows)} checks are within thresholds")
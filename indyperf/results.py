@@ -0,0 +1,272 @@
+import json
+import math
+from contextlib import contextmanager
+from datetime import datetime as dt
+from threading import Lock
+from time import monotonic
+from indyperf.mvnlog import (TransferStats, DOWNLOAD, UPLOAD)
+
+RECORD_TYPE_BUILD = 'build'
+RECORD_TYPE_CLEANUP = 'cleanup'
+RECORD_TYPE_ENDPOINT_METRICS = 'endpoint_metrics'
+RECORD_TYPE_SERVER_SAMPLE = 'server_sample'
+
+TOTAL_PHASE = 'total'
+
+SUMMARY_HEADERS = ['Count', 'p50', 'p90', 'p99', 'Max']
+TRANSFER_HEADERS = ['Count', 'MB', 'p10 kB/s', 'p50 kB/s', 'p90 kB/s', 'p99 ms']
+RESOURCE_HEADERS = ['Count', 'Timeouts', 'p50 wall s', 'p50 CPU s', 'p10 share', 'p50 share', 'Max RSS MB', 'p90 invol cs']
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of the given values (which need not be sorted)."""
+    if len(values) < 1:
+        return None
+
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(pct / 100.0 * len(ordered))))
+    return ordered[rank-1]
+
+
+class BuildTimings:
+    """ Timing capture for a single build iteration. Each phase is recorded with its start offset
+        (seconds since the start of the run, on the monotonic clock) and its duration.
+    """
+
+    def __init__(self, results, build_name):
+        self.results = results
+        self.build_name = build_name
+        self.tid = None
+        self.success = False
+        self.started = dt.utcnow().isoformat()
+        self.start = results.offset()
+        self.duration = None
+        self.phases = {}
+        self.prepare = {}
+        self.details = {}
+        self.resources = {}
+        self.transfers = None
+
+    @contextmanager
+    def phase(self, name):
+        start = self.results.offset()
+        try:
+            yield
+        finally:
+            self.phases[name] = {'start': start, 'duration': self.results.offset() - start}
+
+    def begin(self):
+        """ Start the iteration's clock now. Phases already recorded (a pipelined build's setup, done ahead of
+            time) move to self.prepare, so neither they nor the wait for a worker count towards its duration.
+        """
+        self.prepare = self.phases
+        self.phases = {}
+        self.started = dt.utcnow().isoformat()
+        self.start = self.results.offset()
+
+    def usage(self, phase):
+        """A dict for run_cmd to fill with the resource usage of the phase's command"""
+        return self.resources.setdefault(phase, {})
+
+    def finish(self, success):
+        self.success = success is True
+        self.duration = self.results.offset() - self.start
+
+    def to_record(self):
+        record = {
+            **self.details,
+            'type': RECORD_TYPE_BUILD,
+            'builder': self.results.builder_idx,
+            'build': self.build_name,
+            'tid': self.tid,
+            'started': self.started,
+            'start': self.start,
+            'duration': self.duration,
+            'success': self.success,
+            'phases': self.phases
+        }
+
+        if len(self.prepare) > 0:
+            record['prepare'] = self.prepare
+
+        if self.transfers is not None:
+            record['transfers'] = self.transfers.to_dict()
+
+        resources = {phase: usage for phase,usage in self.resources.items() if len(usage) > 0}
+        if len(resources) > 0:
+            record['resources'] = resources
+
+        return record
+
+
+class Results:
+    """ Collects per-iteration build timings for a run, appending each one to a JSON-lines results
+        file as soon as the iteration finishes. Safe to use from concurrent builder threads.
+    """
+
+    def __init__(self, results_file, builder_idx):
+        self.results_file = results_file
+        self.builder_idx = int(builder_idx)
+        self.run_start = monotonic()
+        self.builds = []
+        self.cleanups = {}
+
+        self._lock = Lock()
+        self._out = open(results_file, 'a')
+
+    def offset(self):
+        return monotonic() - self.run_start
+
+    def new_build(self, build_name):
+        return BuildTimings(self, build_name)
+
+    def add_build(self, timings):
+        with self._lock:
+            self.builds.append(timings)
+
+        self.write(timings.to_record())
+
+    def add_cleanup(self, phase, duration):
+        """Record the duration of a teardown task run by the background CleanupWorker"""
+        with self._lock:
+            self.cleanups.setdefault(phase, []).append(duration)
+
+        self.write({'type': RECORD_TYPE_CLEANUP, 'builder': self.builder_idx, 'phase': phase, 'start': self.offset() - duration, 'duration': duration})
+
+    def add_endpoint_metrics(self, metrics):
+        """Dump the run's per-endpoint histograms, so they can be merged with other builders' results later"""
+        self.write({'type': RECORD_TYPE_ENDPOINT_METRICS, 'builder': self.builder_idx, 'end': self.offset(), 'endpoints': metrics.to_dict()})
+
+    def add_server_sample(self, endpoint, start, latency, status, values):
+        """Record one poll of an Indy endpoint by the ServerSampler, on the same timeline as the build phases"""
+        self.write({'type': RECORD_TYPE_SERVER_SAMPLE, 'builder': self.builder_idx, 'endpoint': endpoint, 'start': start,
+                    'latency': latency, 'status': status, 'values': values})
+
+    def write(self, record):
+        with self._lock:
+            self._out.write(json.dumps(record) + '\n')
+            self._out.flush()
+
+    def close(self):
+        with self._lock:
+            self._out.close()
+
+    def print_summary(self):
+        """Print p50/p90/p99/max duration tables per phase, for all builds and then for each build name."""
+
+        by_build = {}
+        for timings in self.builds:
+            by_build.setdefault(timings.build_name, []).append(timings)
+
+        print(f"\nPhase timings in seconds, all builds (results in: {self.results_file})")
+        print_timing_table(self.builds)
+
+        for name,timings in by_build.items():
+            print(f"\nPhase timings in seconds, build: {name}")
+            print_timing_table(timings)
+
+        by_cache = {}
+        for timings in self.builds:
+            if timings.details.get('cache') is not None:
+                by_cache.setdefault(timings.details['cache'], []).append(timings)
+
+        if len(by_cache) > 1:
+            for cache,timings in by_cache.items():
+                print(f"\nPhase timings in seconds, {cache}-cache iterations")
+                print_timing_table(timings)
+
+        transfers = {}
+        for name,timings in by_build.items():
+            for build_timings in timings:
+                if build_timings.transfers is not None:
+                    merged = transfers.setdefault(name, {DOWNLOAD: TransferStats(), UPLOAD: TransferStats()})
+                    for direction,stats in build_timings.transfers.stats.items():
+                        merged[direction].merge(stats)
+
+        if len(transfers) > 0:
+            print(f"\nArtifact transfers reported by Maven / PME")
+            print_transfers_table(transfers)
+
+        resources = summarize_resources([timings.resources for timings in self.builds])
+        if len(resources) > 0:
+            print(f"\nCommand resource usage (CPU share = user + sys CPU seconds per wall-clock second)")
+            print_resources_table(resources)
+
+        if len(self.cleanups) > 0:
+            print(f"\nBackground cleanup timings in seconds")
+            print_durations_table(self.cleanups)
+
+
+def print_timing_table(all_timings):
+    durations = {}
+    totals = []
+    for timings in all_timings:
+        for name,phase in {**timings.prepare, **timings.phases}.items():
+            durations.setdefault(name, []).append(phase['duration'])
+
+        if timings.duration is not None:
+            totals.append(timings.duration)
+
+    if len(totals) > 0:
+        durations[TOTAL_PHASE] = totals
+
+    print_durations_table(durations)
+
+
+def print_durations_table(durations):
+    row_format = "{:>28}" + "{:>12}" * len(SUMMARY_HEADERS)
+    print(row_format.format("", *SUMMARY_HEADERS))
+    for name,values in durations.items():
+        stats = [f"{percentile(values, pct):.3f}" for pct in (50, 90, 99, 100)]
+        print(row_format.format(name, len(values), *stats))
+
+
+def print_transfers_table(transfers):
+    row_format = "{:>28}" + "{:>12}" * len(TRANSFER_HEADERS)
+    print(row_format.format("", *TRANSFER_HEADERS))
+    for name,by_direction in transfers.items():
+        for direction,stats in by_direction.items():
+            if stats.count < 1:
+                continue
+
+            rates = [stats.throughput.percentile(pct) for pct in (10, 50, 90)]
+            rates = [f"{rate / 1000.0:.1f}" if rate is not None else '-' for rate in rates]
+            p99 = stats.duration.percentile(99)
+            print(row_format.format(f"{name} {direction}s", stats.count, f"{stats.bytes / 1000000.0:.1f}", *rates,
+                                    f"{p99 / 1000.0:.1f}" if p99 is not None else '-'))
+
+
+def summarize_resources(all_resources):
+    """Per-phase summary of the run_cmd usage dicts recorded for each build (see utils.command_usage)"""
+
+    by_phase = {}
+    for resources in all_resources:
+        for phase,usage in resources.items():
+            if len(usage) > 0:
+                by_phase.setdefault(phase, []).append(usage)
+
+    summary = {}
+    for phase,usages in by_phase.items():
+        cpu = [usage['user'] + usage['sys'] for usage in usages]
+        share = [c / usage['wall'] for (c, usage) in zip(cpu, usages) if usage['wall'] > 0]
+        summary[phase] = {
+            'count': len(usages),
+            'timeouts': len([usage for usage in usages if usage['timed_out']]),
+            'wall_p50': percentile([usage['wall'] for usage in usages], 50),
+            'cpu_p50': percentile(cpu, 50),
+            'cpu_share_p10': percentile(share, 10),
+            'cpu_share_p50': percentile(share, 50),
+            'max_rss_mb': max([usage['max_rss_kb'] for usage in usages]) / 1024.0,
+            'involuntary_switches_p90': percentile([usage['involuntary_switches'] for usage in usages], 90)
+        }
+
+    return summary
+
+
+def print_resources_table(summary):
+    row_format = "{:>28}" + "{:>14}" * len(RESOURCE_HEADERS)
+    print(row_format.format("", *RESOURCE_HEADERS))
+    for phase,stats in summary.items():
+        shares = [f"{stats[key]:.2f}" if stats[key] is not None else '-' for key in ('cpu_share_p10', 'cpu_share_p50')]
+        print(row_format.format(phase, stats['count'], stats['timeouts'], f"{stats['wall_p50']:.1f}", f"{stats['cpu_p50']:.1f}",
+                                *shares, f"{stats['max_rss_mb']:.0f}", stats['involuntary_switches_p90']))
@@ -0,0 +1,426 @@
+from concurrent.futures import (ThreadPoolExecutor, as_completed)
+from queue import Queue
+from threading import (Condition, Lock, Semaphore)
+from time import sleep
+from traceback import format_exc
+import indyperf.config as config
+import indyperf.folo as folo
+import indyperf.updown as updown
+import indyperf.build as builds
+import indyperf.mvnlog as mvnlog
+import indyperf.promote as promote
+import indyperf.schedule as schedule
+
+# Longest a closed-loop schedule waits before re-checking its target, which moves while a stage ramps
+TARGET_POLL_INTERVAL = 1.0
+
+class BuildIteration:
+    """ One build iteration, split into the stages the runners schedule: setup (clone the builddir, pick the
+        tracking ID), per-build Indy stores, settings.xml, PME + Maven, post-processing (folo seal / pull and
+        promotion) and teardown.
+
+        Everything specific to the iteration (builddir, tracking ID, settings.xml, local repo) is derived here,
+        so several iterations can be in flight at once in separate threads. Each stage is timed as a phase in
+        the given BuildTimings.
+    """
+
+    def __init__(self, build, builds_dir, suite, timings):
+        self.build = build
+        self.builds_dir = builds_dir
+        self.suite = suite
+        self.timings = timings
+        self.builddir = None
+        self.tid = None
+        self.transfers = None
+        self.prepared = None
+
+    def setup(self):
+        print(f"Running build: {self.build.name}")
+
+        tid_base = f"build_perftest-{self.build.name}"
+        with self.timings.phase('setup_builddir'):
+            (self.builddir, self.tid) = updown.setup_builddir(self.builds_dir, self.build, tid_base,
+                                                              self.suite.command_timeouts[config.TIMEOUT_GIT], self.timings.usage('setup_builddir'))
+
+        self.timings.tid = self.tid
+        self.timings.details['maven_executor'] = self.suite.mvn_executor
+
+        # Maven / PME output goes to per-build logs, and its artifact transfer lines to per-build transfer records
+        self.transfers = mvnlog.TransferParser(updown.build_log(self.builds_dir, self.tid, 'transfers.jsonl'))
+        self.timings.transfers = self.transfers
+
+    def create_repos(self):
+        with self.timings.phase('create_repos'):
+            if self.suite.env.do_promote is True:
+                updown.create_missing_stores(self.tid, self.suite)
+
+    def write_settings(self):
+        with self.timings.phase('write_settings'):
+            updown.write_settings(self.builddir, self.tid, self.suite)
+
+    def run_maven(self):
+        """Run PME (if there is a DA URL) and then Maven, returning True if both succeeded"""
+
+        print(f"Running test with:\n\nDA URL: {self.suite.env.da_url}\nIndy URL: {self.suite.env.indy_url}")
+
+        success = True
+
+        # tagged now rather than in setup(), which a pipelined run does long before this build's Maven starts
+        if self.suite.cache is not None:
+            self.timings.details['cache'] = self.suite.cache.classify(self.build.name)
+
+        if self.suite.env.da_url is not None:
+            with self.timings.phase('do_pme'):
+                success = builds.do_pme(self.builddir, self.build, self.suite, updown.build_log(self.builds_dir, self.tid, 'pme.log'), self.transfers,
+                                        self.timings.usage('do_pme'))
+
+        if success is True:
+            with self.timings.phase('do_build'):
+                success = builds.do_build(self.builddir, self.build, self.suite, updown.build_log(self.builds_dir, self.tid, 'mvn.log'), self.transfers,
+                                          self.timings.usage('do_build'), self.builds_dir)
+
+        # whatever this build fetches through Indy is cached for its later iterations
+        if success is True and self.suite.cache is not None:
+            self.suite.cache.mark_warm(self.build.name)
+
+        return success
+
+    def post_process(self, success):
+        if self.suite.env.do_promote is True and success is True:
+            success = promote_build(self.tid, self.suite, self.timings)
+
+        return success
+
+    def teardown(self, cleaner):
+        if self.transfers is not None:
+            self.transfers.close()
+
+        # Teardown is handed to the background cleaner, so it stays off the critical path between builds.
+        # Finished builddirs are safe to remove: their git objects live in the shared mirror.
+        if self.tid is not None:
+            cleaner.remove_tree('clean_local_repo', updown.local_repo(self.tid))
+
+            if self.suite.env.do_promote is True:
+                cleaner.submit('cleanup_build_group', f"delete group:{self.tid}", updown.cleanup_build_group, self.tid, self.suite)
+
+        if self.builddir is not None and self.suite.keep_builddirs is False:
+            cleaner.remove_tree('cleanup_builddir', self.builddir)
+
+
+def run_build(build, builds_dir, suite, timings, cleaner):
+    """ Execute a single build iteration from start to end, returning True if it succeeded.
+
+        Teardown is queued on the given CleanupWorker, which times it separately.
+    """
+    iteration = BuildIteration(build, builds_dir, suite, timings)
+    try:
+        iteration.setup()
+        iteration.create_repos()
+        iteration.write_settings()
+
+        return iteration.post_process(iteration.run_maven())
+
+    except Exception as e:
+        print(f"Build: {build.name} had an error:\n\n{format_exc()}\n\n")
+        return False
+
+    finally:
+        iteration.teardown(cleaner)
+
+
+class BuildTally:
+    """Thread-safe map of build name -> [successes, failures]"""
+
+    def __init__(self):
+        self.results = {}
+        self._lock = Lock()
+
+    def add(self, name, success):
+        with self._lock:
+            result = self.results.setdefault(name, [0,0])
+            result[0 if success is True else 1] += 1
+
+
+def run_and_record(build, builds_dir, suite, results, cleaner, tally, **details):
+    """Run one build iteration, then hand its timings (plus any extra details) to the results and tally"""
+
+    timings = results.new_build(build.name)
+    timings.details.update(details)
+
+    success = run_build(build, builds_dir, suite, timings, cleaner)
+    timings.finish(success)
+
+    results.add_build(timings)
+    tally.add(build.name, success)
+
+
+def promote_build(tid, suite, timings):
+    """Seal and pull the build's folo record, then promote its dependencies and its output, returning True on success"""
+
+    with timings.phase('seal_folo_report'):
+        promote.seal_folo_report(tid, suite)
+
+    tracer = suite.client.tracer
+    content = folo.ContentPlan() if tracer is not None else None
+
+    with timings.phase('pull_folo_report'):
+        folo_summary = promote.pull_folo_report(tid, suite, [content] if content is not None else [])
+
+    if tracer is not None:
+        # the record doesn't say when Maven made each request, only that it was during PME / Maven
+        maven_phases = [timings.phases[name] for name in ('do_pme', 'do_build') if name in timings.phases]
+        if len(maven_phases) > 0:
+            start = timings.results.run_start + maven_phases[0]['start']
+            end = timings.results.run_start + maven_phases[-1]['start'] + maven_phases[-1]['duration']
+            tracer.build_content(content, updown.mirror_url(tid, suite), updown.deploy_url(tid, suite), start, end)
+
+    timings.details['folo'] = folo_summary.to_dict()
+
+    with timings.phase('promote_deps_by_path'):
+        success = promote.promote_deps_by_path(folo_summary, tid, suite)
+
+    if success is True:
+        if suite.promote_by_path is True:
+            with timings.phase('promote_output_by_path'):
+                success = promote.promote_output_by_path(tid, suite)
+        else:
+            with timings.phase('promote_output_by_group'):
+                success = promote.promote_output_by_group(tid, suite)
+
+    return success
+
+
+def run_builds(order, builds_dir, suite, results, cleaner, workers=1):
+    """ Run every build in the given order, using up to 'workers' concurrent builds.
+
+        Each worker thread pulls the next build from the shared order as soon as it finishes
+        (and pauses after) its previous one, so with workers=1 this is the classic serial run.
+
+        Timings for each iteration are handed to 'results' as soon as the iteration finishes.
+
+        Returns a map of build name -> [successes, failures].
+    """
+    builds_iter = order.iter()
+    builds_lock = Lock()
+    tally = BuildTally()
+
+    def next_build():
+        with builds_lock:
+            return next(builds_iter, None)
+
+    def worker():
+        build = next_build()
+        while build is not None:
+            try:
+                run_and_record(build, builds_dir, suite, results, cleaner, tally)
+            finally:
+                order.done(build)
+
+            print(f"Pausing {suite.pause} before next build")
+            sleep(suite.pause)
+
+            build = next_build()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='builder') as executor:
+        for future in as_completed([executor.submit(worker) for _ in range(workers)]):
+            future.result()
+
+    return tally.results
+
+
+def run_builds_on_schedule(order, builds_dir, suite, results, cleaner, profile):
+    """ Start builds from the given order on the open-loop timeline of the suite's load profile.
+
+        Builds start at their scheduled times whether or not earlier builds have finished, so a slower Indy
+        doesn't quietly reduce the offered load. At most profile.max_concurrent builds run at once; builds
+        scheduled beyond that wait for a free slot, and the wait is recorded as 'start_lag' in their results.
+
+        Scheduling stops when either the profile's stages or the build order run out.
+
+        A closed-loop profile (arrivals: closed) is handed to run_builds_to_target instead.
+
+        Returns a map of build name -> [successes, failures].
+    """
+    if profile.arrivals == schedule.ARRIVALS_CLOSED:
+        return run_builds_to_target(order, builds_dir, suite, results, cleaner, profile)
+
+    builds_iter = order.iter()
+    tally = BuildTally()
+
+    def scheduled_build(build, scheduled):
+        try:
+            run_and_record(build, builds_dir, suite, results, cleaner, tally, scheduled=scheduled, start_lag=results.offset() - scheduled)
+        finally:
+            order.done(build)
+
+    run_start = results.offset()
+    with ThreadPoolExecutor(max_workers=profile.max_concurrent, thread_name_prefix='builder') as executor:
+        futures = []
+        for offset in schedule.arrival_offsets(profile):
+            scheduled = run_start + offset
+            delay = scheduled - results.offset()
+            if delay > 0:
+                sleep(delay)
+
+            # pull the build only once it is due, so a work queue hands it out at the time it will run
+            build = next(builds_iter, None)
+            if build is None:
+                break
+
+            print(f"Starting scheduled build: {build.name} at +{offset:.1f}s")
+            futures.append(executor.submit(scheduled_build, build, scheduled))
+
+        for future in as_completed(futures):
+            future.result()
+
+    # (only a static build order can say how much was left; a work queue just leaves it for other builders)
+    ordered_build_names = getattr(order, 'ordered_build_names', None)
+    if ordered_build_names is not None and len(futures) < len(ordered_build_names):
+        print(f"Load profile ended with {len(ordered_build_names) - len(futures)} builds from the build order left unscheduled")
+
+    return tally.results
+
+
+def run_builds_to_target(order, builds_dir, suite, results, cleaner, profile):
+    """ Keep the closed-loop profile's target number of builds in flight (capped at profile.max_concurrent) until
+        its stages end: whenever fewer are running, the next build is taken from the order and started. Each
+        build's results record the target it was started under, as 'target_concurrent'.
+
+        Returns a map of build name -> [successes, failures].
+    """
+    builds_iter = order.iter()
+    tally = BuildTally()
+    in_flight = [0]
+    changed = Condition()
+
+    def targeted_build(build, target):
+        try:
+            run_and_record(build, builds_dir, suite, results, cleaner, tally, target_concurrent=target)
+        finally:
+            order.done(build)
+            with changed:
+                in_flight[0] -= 1
+                changed.notify_all()
+
+    run_start = results.offset()
+    with ThreadPoolExecutor(max_workers=profile.max_concurrent, thread_name_prefix='builder') as executor:
+        futures = []
+        while True:
+            target = schedule.target_concurrency(profile, results.offset() - run_start)
+            if target is None:
+                break
+
+            with changed:
+                if in_flight[0] >= min(target, profile.max_concurrent):
+                    changed.wait(TARGET_POLL_INTERVAL)
+                    continue
+                in_flight[0] += 1
+
+            # pulled only once there is room for it, so a work queue hands it out when it will run
+            build = next(builds_iter, None)
+            if build is None:
+                break
+
+            print(f"Starting build: {build.name} ({in_flight[0]} in flight, target: {target})")
+            futures.append(executor.submit(targeted_build, build, target))
+
+        for future in as_completed(futures):
+            future.result()
+
+    return tally.results
+
+
+def run_builds_pipelined(order, builds_dir, suite, results, cleaner, workers=1, prefetch=1):
+    """ Run every build in the given order as a pipeline, so each builder spends more of its time generating load.
+
+        A prefetch thread clones builddirs and creates the per-build Indy stores ahead of time, keeping at most
+        'prefetch' prepared builds waiting (builds are only taken from the order, or claimed from a work queue,
+        when there is room). Up to 'workers' threads take prepared builds, write settings.xml (with a fresh SSO
+        token) just before running PME and Maven, then hand the build to a post-processing pool for the folo
+        seal / pull and promotion, and move straight on to the next prepared build.
+
+        A build's duration runs from when a worker takes it, so it is comparable with serial runs. Its setup phases
+        are recorded under 'prepare', and the time it spent prepared but waiting for a worker as 'prepared_wait'.
+
+        Returns a map of build name -> [successes, failures].
+    """
+    ready = Queue()
+    slots = Semaphore(prefetch)
+    tally = BuildTally()
+
+    def prefetcher():
+        builds_iter = order.iter()
+        try:
+            while True:
+                slots.acquire()
+                build = next(builds_iter, None)
+                if build is None:
+                    return
+
+                iteration = BuildIteration(build, builds_dir, suite, results.new_build(build.name))
+                try:
+                    iteration.setup()
+                    iteration.create_repos()
+                    iteration.prepared = results.offset()
+                except Exception as e:
+                    print(f"Build: {build.name} failed to prepare:\n\n{format_exc()}\n\n")
+                    iteration.prepared = None
+
+                ready.put(iteration)
+        finally:
+            for _ in range(workers):
+                ready.put(None)
+
+    def finish(iteration, success):
+        try:
+            success = iteration.post_process(success)
+        except Exception as e:
+            print(f"Build: {iteration.build.name} had an error:\n\n{format_exc()}\n\n")
+            success = False
+        finally:
+            iteration.teardown(cleaner)
+
+        iteration.timings.finish(success)
+        results.add_build(iteration.timings)
+        tally.add(iteration.build.name, success)
+        order.done(iteration.build)
+
+    def worker(post):
+        finishing = []
+        while True:
+            iteration = ready.get()
+            if iteration is None:
+                return finishing
+
+            slots.release()
+
+            # the build's own clock starts now: preparing it and waiting for a worker are recorded apart
+            if iteration.prepared is not None:
+                iteration.timings.details['prepared_wait'] = results.offset() - iteration.prepared
+            iteration.timings.begin()
+
+            success = False
+            if iteration.prepared is not None:
+                try:
+                    iteration.write_settings()
+                    success = iteration.run_maven()
+                except Exception as e:
+                    print(f"Build: {iteration.build.name} had an error:\n\n{format_exc()}\n\n")
+
+            finishing.append(post.submit(finish, iteration, success))
+
+            print(f"Pausing {suite.pause} before next build")
+            sleep(suite.pause)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='post') as post:
+        with ThreadPoolExecutor(max_workers=workers + 1, thread_name_prefix='builder') as executor:
+            prefetch_future = executor.submit(prefetcher)
+            worker_futures = [executor.submit(worker, post) for _ in range(workers)]
+
+            for future in as_completed(worker_futures):
+                for finishing in future.result():
+                    finishing.result()
+
+            prefetch_future.result()
+
+    return tally.results
@@ -0,0 +1,123 @@
+import re
+from threading import (Event, Thread)
+from time import monotonic
+from indyperf.metrics import ERROR_STATUS
+
+PROMETHEUS_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*(?:\{.*\})?)\s+(\S+)')
+
+
+class ServerSampler:
+    """ Polls the suite's server-metrics endpoints every interval seconds in a background thread, writing each
+        response's numeric values to the run's results file as a server_sample record. Samples are stamped with
+        the results' run offset, the same monotonic timeline as the build phases, so indyperf-report can line
+        them up with the phases that were running when they were taken.
+
+        JSON responses are flattened to dotted keys (e.g. 'gauges.threads.value'); anything else is read as
+        Prometheus text exposition. Every sample also records whether the endpoint answered 2xx, and how long
+        it took to answer.
+    """
+
+    def __init__(self, suite, results):
+        self.suite = suite
+        self.results = results
+        self.server_metrics = suite.server_metrics
+        self.samples = 0
+        self.failures = 0
+
+        self._stop = Event()
+        self._thread = None
+
+    def start(self):
+        if self.server_metrics is None:
+            return self
+
+        self._thread = Thread(target=self._run, name='server-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        interval = self.server_metrics.interval
+        next_tick = monotonic()
+        while True:
+            for endpoint in self.server_metrics.endpoints:
+                self.sample(endpoint)
+
+            # stay on a fixed grid, skipping ticks we were too slow for rather than bunching samples up
+            next_tick += interval
+            now = monotonic()
+            if next_tick < now:
+                next_tick += ((now - next_tick) // interval + 1) * interval
+
+            if self._stop.wait(next_tick - now):
+                return
+
+    def sample(self, endpoint):
+        start = self.results.offset()
+        values = {}
+        try:
+            # straight to the pooled session: polls stay out of the tester's endpoint histograms and the trace
+            resp = self.suite.client.session.get(f"{self.suite.env.indy_url}{endpoint.path}", timeout=self.server_metrics.interval)
+            status = resp.status_code
+            if resp.status_code < 300:
+                values = parse_sample(resp)
+        except Exception as e:
+            print(f"Sampling {endpoint.name} failed: {e}")
+            status = ERROR_STATUS
+
+        if endpoint.metrics is not None:
+            values = {key: value for key,value in values.items() if any(key.startswith(prefix) for prefix in endpoint.metrics)}
+
+        self.samples += 1
+        if status == ERROR_STATUS or status >= 300:
+            self.failures += 1
+
+        self.results.add_server_sample(endpoint.name, start, self.results.offset() - start, status, values)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            print(f"Server metrics sampler: {self.samples} samples, {self.failures} failed")
+
+
+def parse_sample(resp):
+    """Numeric values in a JSON or Prometheus text response, as a flat dict"""
+
+    if 'json' in (resp.headers.get('content-type') or ''):
+        values = {}
+        flatten(resp.json(), '', values)
+        return values
+
+    return parse_prometheus(resp.text)
+
+
+def flatten(value, prefix, values):
+    if isinstance(value, dict):
+        for key,item in value.items():
+            flatten(item, f"{prefix}.{key}" if prefix != '' else str(key), values)
+    elif isinstance(value, bool):
+        values[prefix] = int(value)
+    elif isinstance(value, (int, float)):
+        values[prefix] = value
+    elif isinstance(value, str) and prefix != '':
+        # health checks report e.g. {"healthy": true} or {"status": "UP"}
+        if value.upper() in ('UP', 'OK', 'HEALTHY'):
+            values[prefix] = 1
+        elif value.upper() in ('DOWN', 'FAILED', 'UNHEALTHY'):
+            values[prefix] = 0
+
+
+def parse_prometheus(text):
+    values = {}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+
+        match = PROMETHEUS_SAMPLE.match(line.strip())
+        if match is not None:
+            try:
+                values[match.group(1)] = float(match.group(2))
+            except ValueError:
+                pass
+
+    return values
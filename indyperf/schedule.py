@@ -0,0 +1,112 @@
+import math
+import random
+from threading import Lock
+from time import (monotonic, sleep)
+
+ARRIVALS_CONSTANT = 'constant'
+ARRIVALS_POISSON = 'poisson'
+ARRIVALS_CLOSED = 'closed'
+
+ARRIVAL_MODES = [ARRIVALS_CONSTANT, ARRIVALS_POISSON, ARRIVALS_CLOSED]
+
+
+def arrival_offsets(profile):
+    """ Generate build start times (seconds from the start of the run) for a load profile.
+
+        Each stage ramps the arrival rate linearly from its start rate to its end rate. Arrivals are
+        placed by inverting the cumulative arrival count over the stages: every whole build for 'constant'
+        arrivals, or exponentially distributed gaps (a non-homogeneous Poisson process) for 'poisson'.
+    """
+    rng = random.Random(profile.seed)
+
+    def draw():
+        if profile.arrivals == ARRIVALS_POISSON:
+            return rng.expovariate(1.0)
+        return 1.0
+
+    # a stage with no duration has no room for arrivals (and no slope to ramp along)
+    stages = [stage for stage in profile.stages if stage.duration > 0]
+    if len(stages) < 1:
+        return
+
+    # Constant arrivals start the first build immediately, unless the profile starts at rate 0 (then the first
+    # build waits for a whole build's worth of arrivals); Poisson arrivals start with a random gap
+    initial_rate = stages[0].start_rate if stages[0].start_rate is not None else stages[0].rate
+    if profile.arrivals == ARRIVALS_POISSON:
+        pending = draw()
+    else:
+        pending = 0.0 if initial_rate > 0 else 1.0
+
+    stage_offset = 0.0
+    prev_rate = None
+    for stage in stages:
+        start_rate = stage.start_rate
+        if start_rate is None:
+            start_rate = prev_rate if prev_rate is not None else stage.rate
+
+        # rates are configured in builds per minute
+        r0 = start_rate / 60.0
+        r1 = stage.rate / 60.0
+        slope = (r1 - r0) / (2.0 * stage.duration)
+        capacity = stage.duration * (r0 + r1) / 2.0
+
+        consumed = 0.0
+        while consumed + pending <= capacity:
+            consumed += pending
+            yield stage_offset + _solve_stage_time(slope, r0, consumed)
+            pending = draw()
+
+        pending -= capacity - consumed
+        stage_offset += stage.duration
+        prev_rate = stage.rate
+
+
+def target_concurrency(profile, offset):
+    """ Builds a closed-loop profile wants in flight at the given offset (seconds from the start of the run): each
+        stage ramps linearly from its start-concurrent to its concurrent. None once the stages are over.
+    """
+    stage_offset = 0.0
+    prev_target = None
+    for stage in profile.stages:
+        start = stage.start_concurrent
+        if start is None:
+            start = prev_target if prev_target is not None else stage.concurrent
+
+        if stage.duration > 0 and offset < stage_offset + stage.duration:
+            return int(round(start + (stage.concurrent - start) * (offset - stage_offset) / stage.duration))
+
+        stage_offset += stage.duration
+        prev_target = stage.concurrent
+
+    return None
+
+
+def _solve_stage_time(slope, r0, count):
+    """ Solve slope*t^2 + r0*t = count for t >= 0 (the time at which 'count' arrivals have accumulated
+        within a linearly ramping stage), in the form that stays stable for zero and negative slopes.
+    """
+    if count <= 0:
+        return 0.0
+
+    return 2.0 * count / (r0 + math.sqrt(max(0.0, r0 * r0 + 4.0 * slope * count)))
+
+
+class RateLimiter:
+    """Spaces calls to wait() at least 1/rate seconds apart, across all threads (no limit if rate is None)"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = monotonic()
+        self._lock = Lock()
+
+    def wait(self):
+        if self.interval <= 0:
+            return
+
+        with self._lock:
+            slot = max(self.next_slot, monotonic())
+            self.next_slot = slot + self.interval
+
+        delay = slot - monotonic()
+        if delay > 0:
+            sleep(delay)
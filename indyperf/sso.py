@@ -1,13 +1,119 @@
-import requests
+from threading import (Event, Lock, Thread)
+from time import monotonic
+
+SSO_HEADERS = {'content-type': 'application/x-www-form-urlencoded', 'Authorization': None}
+
+# Logical endpoint name of token requests, in the tester's metrics
+SSO_ENDPOINT = 'sso_token'
+
+# After a failed background refresh, try again this often (seconds) while the current token is still valid
+RETRY_INTERVAL = 10
+
+def request_sso_token(suite):
+    """POST to the SSO token endpoint, returning (access token, expires_in seconds or None)"""
+
+    # Never send a (possibly stale) bearer token to the token endpoint itself
+    response = suite.client.post(suite.sso.url, data=suite.sso.form, headers=SSO_HEADERS, endpoint=SSO_ENDPOINT)
+    response.raise_for_status()
+
+    body = response.json()
+    return (body['access_token'], body.get('expires_in'))
 
 def get_sso_token(suite):
     if suite.sso.enabled is False:
         return None
 
-    response = requests.post(suite.sso.url, data=suite.sso.form, verify=suite.env.ssl_verify)
-    response.raise_for_status()
-
-    token = response.json()['access_token']
+    (token, _) = request_sso_token(suite)
     suite.set_sso_token(token)
 
     return token
+
+
+class TokenManager:
+    """ Keeps the suite's SSO token valid for the whole run, however long it lasts.
+
+        The token is refreshed in a background thread refresh_margin seconds before it expires (per the token
+        response's expires_in), and every worker reads the one shared token from the suite. Writing a build's
+        settings.xml calls ensure_fresh(), which refreshes first if the token is inside the margin, so Maven
+        never starts with a token that is about to expire. A 401 from Indy triggers one refresh (shared by all
+        requests that saw the same stale token) and a single retry.
+    """
+
+    def __init__(self, suite):
+        self.suite = suite
+        self.expires_at = None
+        self.margin = suite.sso.refresh_margin if suite.sso.enabled else 0
+        self.refreshes = 0
+
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    def start(self):
+        if self.suite.sso.enabled is False:
+            return self
+
+        with self._lock:
+            self._refresh()
+
+        self.suite.tokens = self
+        self.suite.client.on_unauthorized = self.refresh_if_current
+
+        if self.expires_at is not None:
+            self._thread = Thread(target=self._run, name='sso-token-refresh', daemon=True)
+            self._thread.start()
+
+        return self
+
+    def _refresh(self):
+        (token, expires_in) = request_sso_token(self.suite)
+        if expires_in:
+            self.expires_at = monotonic() + expires_in
+            # don't spend most of a short-lived token's life refreshing it
+            self.margin = min(self.suite.sso.refresh_margin, expires_in / 2.0)
+        else:
+            self.expires_at = None
+
+        self.refreshes += 1
+        self.suite.set_sso_token(token)
+
+    def remaining(self):
+        return self.expires_at - monotonic() if self.expires_at is not None else None
+
+    def ensure_fresh(self):
+        """Refresh now if the token is inside the refresh margin (e.g. the background thread is behind)"""
+
+        with self._lock:
+            remaining = self.remaining()
+            if remaining is not None and remaining < self.margin:
+                print(f"SSO token expires in {remaining:.0f}s; refreshing before use")
+                self._refresh()
+
+    def refresh_if_current(self, stale_token):
+        """Refresh after a 401, unless another caller already replaced the token that was rejected"""
+
+        with self._lock:
+            if self.suite.token == stale_token:
+                print("Indy rejected the SSO token; refreshing it")
+                self._refresh()
+
+    def _run(self):
+        while True:
+            remaining = self.remaining()
+            if remaining is None or self._stop.wait(max(remaining - self.margin, 0)):
+                return
+
+            try:
+                with self._lock:
+                    remaining = self.remaining()
+                    if remaining is not None and remaining - self.margin <= 0:
+                        self._refresh()
+            except Exception as e:
+                print(f"SSO token refresh failed: {e}")
+                if self._stop.wait(RETRY_INTERVAL):
+                    return
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,352 @@
+import click
+import json
+import random
+import re
+import zlib
+from http.server import (BaseHTTPRequestHandler, HTTPServer)
+from socketserver import ThreadingMixIn
+from threading import (Lock, Thread)
+from time import sleep
+from uuid import uuid4
+
+DEFAULT_PORT = 8080
+DEFAULT_FOLO_DOWNLOADS = 1000
+DEFAULT_FOLO_UPLOADS = 20
+DEFAULT_CONTENT_SIZE = 10240
+DEFAULT_TOKEN_EXPIRES = 300
+
+SYNTHETIC_REMOTES = ['maven:remote:central', 'maven:remote:mrrc-ga', 'maven:remote:jboss-public']
+
+STORE_PATH = re.compile(r'^/api/admin/stores/([^/]+)/([^/]+)(?:/([^/]+))?$')
+LEGACY_GROUP_PATH = re.compile(r'^/api/admin/group/([^/]+)$')
+FOLO_RECORD_PATH = re.compile(r'^/api/folo/admin/([^/]+)/record$')
+FOLO_CONTENT_PATH = re.compile(r'^/api/folo/track/([^/]+)/([^/]+)/([^/]+)/([^/]+)(/.+)$')
+CONTENT_PATH = re.compile(r'^/api/content/([^/]+)/([^/]+)/([^/]+)(/.+)$')
+TOKEN_PATH = re.compile(r'^/auth/realms/[^/]+/protocol/openid-connect/token$')
+# DA version lookups made by PME (-DrestURL), under any base path: reports/lookup/gavs (DA 1.x) or lookup/maven (DA 2.x)
+DA_LOOKUP_PATH = re.compile(r'^(?:/.*)?/(reports/lookup/gavs|lookup/maven)$')
+
+
+class StandinConfig:
+    """Behaviour knobs for the stand-in: latency, error injection and the size of synthetic content"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, folo_downloads=DEFAULT_FOLO_DOWNLOADS,
+                 folo_uploads=DEFAULT_FOLO_UPLOADS, content_size=DEFAULT_CONTENT_SIZE, token_expires=DEFAULT_TOKEN_EXPIRES):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.folo_downloads = folo_downloads
+        self.folo_uploads = folo_uploads
+        self.content_size = content_size
+        self.token_expires = token_expires
+
+
+class StandinState:
+    """In-memory stores, content listings and folo tracking records"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.stores = {}
+        self.content = {}
+        self.records = {}
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops connection bursts from async clients, costing them 1s+ SYN retries
+    request_queue_size = 256
+
+
+class StandinServer:
+    """ Local stand-in for the Indy, DA and SSO endpoints this tool calls, so the harness can be exercised
+        (and benchmarked) without a live environment. Run it from the command line with 'indyperf-standin',
+        or start it in-process with start() / stop().
+
+        DA is only a version lookup that never finds a better match, so PME leaves every version as it is.
+    """
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or StandinConfig()
+        self.state = StandinState()
+
+        server = self
+        class Handler(StandinHandler):
+            standin = server
+
+        self.httpd = _ThreadingHTTPServer((host, port), Handler)
+        self.thread = None
+
+    @property
+    def url(self):
+        (host, port) = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = Thread(target=self.httpd.serve_forever, name='standin', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def synthetic_record(self, id):
+        """A sealed-looking folo record with the configured number of downloads and uploads"""
+
+        rng = random.Random(id)
+        downloads = []
+        for idx in range(self.config.folo_downloads):
+            key = SYNTHETIC_REMOTES[idx % len(SYNTHETIC_REMOTES)] if idx % 10 != 0 else 'maven:hosted:shared-imports'
+            downloads.append(synthetic_entry(key, f"/org/example/lib{idx}/1.{idx % 7}/lib{idx}-1.{idx % 7}.jar", rng.randint(1000, 2000000)))
+
+        uploads = []
+        for idx in range(self.config.folo_uploads):
+            uploads.append(synthetic_entry(f"maven:hosted:{id}", f"/org/example/{id}/module{idx}/1.0/module{idx}-1.0.jar", rng.randint(1000, 500000)))
+
+        return {'key': {'id': id}, 'uploads': uploads, 'downloads': downloads}
+
+
+def synthetic_entry(key, path, size):
+    return {
+        'storeKey': key,
+        'accessChannel': 'MAVEN_REPO',
+        'path': path,
+        'originUrl': '',
+        'localUrl': f"/api/content/{key.replace(':', '/')}{path}",
+        'size': size,
+        'md5': '', 'sha1': '', 'sha256': ''
+    }
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes; don't let Nagle + delayed ACK add ~40ms to every response
+    disable_nagle_algorithm = True
+    standin = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_HEAD(self):
+        self.dispatch('HEAD')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method):
+        body = self.read_body()
+
+        config = self.standin.config
+        if config.latency > 0 or config.jitter > 0:
+            sleep(max(0.0, config.latency + random.uniform(-config.jitter, config.jitter)))
+
+        if config.error_rate > 0 and random.random() < config.error_rate:
+            return self.respond(500, {'error': 'Injected error'})
+
+        path = self.path.split('?')[0]
+        state = self.standin.state
+
+        match = TOKEN_PATH.match(path)
+        if match and method == 'POST':
+            return self.respond(200, {'access_token': uuid4().hex, 'expires_in': config.token_expires, 'token_type': 'bearer'})
+
+        match = DA_LOOKUP_PATH.match(path)
+        if match and method == 'POST':
+            req = json.loads(body or b'[]')
+            gavs = req if isinstance(req, list) else req.get('artifacts') or []
+            if match.group(1) == 'lookup/maven':
+                return self.respond(200, [{**gav, 'bestMatchVersion': None} for gav in gavs])
+            return self.respond(200, [{**gav, 'bestMatch': None, 'availableVersions': [], 'blacklisted': False, 'whitelisted': False} for gav in gavs])
+
+        match = STORE_PATH.match(path)
+        if match:
+            (package_type, store_type, name) = match.groups()
+            key = f"{package_type}:{store_type}:{name}"
+            with state.lock:
+                if name is None and method == 'GET':
+                    items = [store for store in state.stores.values() if store.get('type') == store_type and store.get('package_type', 'maven') == package_type]
+                    return self.respond(200, {'items': items})
+                elif name is None and method == 'POST':
+                    store = json.loads(body or b'{}')
+                    key = f"{package_type}:{store_type}:{store['name']}"
+                    store['key'] = key
+                    if key in state.stores:
+                        return self.respond(409, {'error': f"Store exists: {key}"})
+                    state.stores[key] = store
+                    return self.respond(201, store)
+                elif method in ('GET', 'HEAD'):
+                    if key in state.stores:
+                        return self.respond(200, state.stores[key])
+                    return self.respond(404)
+                elif method == 'PUT':
+                    store = json.loads(body or b'{}')
+                    store['key'] = key
+                    state.stores[key] = store
+                    return self.respond(200, store)
+                elif method == 'DELETE':
+                    state.stores.pop(key, None)
+                    state.content.pop(key, None)
+                    return self.respond(204)
+
+        match = LEGACY_GROUP_PATH.match(path)
+        if match and method == 'DELETE':
+            with state.lock:
+                state.stores.pop(f"maven:group:{match.group(1)}", None)
+            return self.respond(204)
+
+        match = FOLO_RECORD_PATH.match(path)
+        if match:
+            id = match.group(1)
+            if method == 'POST':
+                return self.respond(200, {'key': {'id': id}})
+            elif method == 'GET':
+                with state.lock:
+                    record = state.records.get(id)
+                    if record is not None:
+                        record = {'key': {'id': id}, 'uploads': list(record['uploads']), 'downloads': list(record['downloads'])}
+                if record is None:
+                    record = self.standin.synthetic_record(id)
+                return self.respond(200, record)
+
+        match = FOLO_CONTENT_PATH.match(path)
+        if match:
+            (id, package_type, store_type, name, content_path) = match.groups()
+            key = f"{package_type}:{store_type}:{name}"
+            (status, size) = self.content(method, key, content_path, body)
+            if status < 300 and method in ('GET', 'PUT'):
+                with state.lock:
+                    record = state.records.setdefault(id, {'uploads': [], 'downloads': []})
+                    if method == 'PUT':
+                        record['uploads'].append(synthetic_entry(key, content_path, size))
+                    else:
+                        record['downloads'].append(synthetic_entry(self.serving_store(key, content_path), content_path, size))
+            return self.respond_content(method, status, size)
+
+        match = CONTENT_PATH.match(path)
+        if match:
+            (package_type, store_type, name, content_path) = match.groups()
+            (status, size) = self.content(method, f"{package_type}:{store_type}:{name}", content_path, body)
+            return self.respond_content(method, status, size)
+
+        match = re.match(r'^/api/promotion/(paths|groups)/promote$', path)
+        if match and method == 'POST':
+            req = json.loads(body or b'{}')
+            if match.group(1) == 'paths':
+                with state.lock:
+                    source = state.content.get(req.get('source'), {})
+                    paths = req.get('paths') or list(source.keys())
+                    target = state.content.setdefault(req.get('target'), {})
+                    for content_path in paths:
+                        target[content_path] = source.get(content_path, config.content_size)
+                return self.respond(200, {'request': req, 'completedPaths': paths, 'pendingPaths': [], 'skippedPaths': [], 'error': None})
+            else:
+                with state.lock:
+                    group = state.stores.get(req.get('targetGroup'))
+                    if group is not None:
+                        group.setdefault('constituents', []).append(req.get('source'))
+                return self.respond(200, {'request': req, 'error': None})
+
+        self.respond(404, {'error': f"No stand-in for: {method} {path}"})
+
+    def serving_store(self, key, content_path):
+        """ The store a download through key is attributed to in folo records, as Indy records the member store
+            that served it: a hosted member of a group holding the path, or else one of the synthetic remotes
+            (chosen by path, so the same path always comes from the same remote). Call with the state lock held.
+        """
+        if ':group:' not in key:
+            return key
+
+        for member in self.standin.state.stores.get(key, {}).get('constituents') or []:
+            if ':hosted:' in member and content_path in self.standin.state.content.get(member, {}):
+                return member
+
+        return SYNTHETIC_REMOTES[zlib.crc32(content_path.encode('utf-8')) % len(SYNTHETIC_REMOTES)]
+
+    def content(self, method, key, content_path, body):
+        """Returns (status, size) for a content request; content is tracked by size only"""
+
+        state = self.standin.state
+        with state.lock:
+            if method == 'PUT':
+                state.content.setdefault(key, {})[content_path] = len(body)
+                return (201, len(body))
+
+            size = state.content.get(key, {}).get(content_path)
+
+        if size is None:
+            # remote repositories and groups "proxy" anything; hosted repos only serve what was uploaded
+            if ':hosted:' in key:
+                return (404, 0)
+            size = self.standin.config.content_size
+
+        return (200, size)
+
+    def respond_content(self, method, status, size):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(size if method in ('GET', 'HEAD') and status == 200 else 0))
+        self.end_headers()
+        if method == 'GET' and status == 200:
+            self.wfile.write(b'\0' * size)
+
+    def respond(self, status, payload=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(chunks)
+
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length > 0 else b''
+
+
+@click.command()
+@click.option('-H', '--host', default='127.0.0.1', show_default=True, help='Address to listen on')
+@click.option('-p', '--port', type=int, default=DEFAULT_PORT, show_default=True, help='Port to listen on')
+@click.option('-l', '--latency', type=float, default=0.0, show_default=True, help='Added latency per request, in seconds')
+@click.option('-j', '--jitter', type=float, default=0.0, show_default=True, help='Uniform +/- jitter on the added latency, in seconds')
+@click.option('-e', '--error-rate', type=float, default=0.0, show_default=True, help='Fraction of requests (0-1) answered with an injected HTTP 500')
+@click.option('-d', '--folo-downloads', type=int, default=DEFAULT_FOLO_DOWNLOADS, show_default=True, help='Downloads in synthetic folo records')
+@click.option('-u', '--folo-uploads', type=int, default=DEFAULT_FOLO_UPLOADS, show_default=True, help='Uploads in synthetic folo records')
+@click.option('-s', '--content-size', type=int, default=DEFAULT_CONTENT_SIZE, show_default=True, help='Size in bytes of content served from remote repositories and groups')
+@click.option('-t', '--token-expires', type=int, default=DEFAULT_TOKEN_EXPIRES, show_default=True, help='expires_in (seconds) of issued SSO tokens')
+def run(host, port, latency, jitter, error_rate, folo_downloads, folo_uploads, content_size, token_expires):
+    """ Serve a local stand-in for Indy, DA and SSO.
+
+        Implements the store admin, folo record, promotion, content and SSO token endpoints that
+        run-indyperf-test calls, plus the DA version lookups PME makes (which never find a better
+        version), with configurable latency and error injection. Folo records are built from the
+        content requests actually made through /api/folo/track/..., with downloads through a group
+        attributed to a synthetic remote repository so dependency promotion has work to do, or
+        synthesized at the configured size if a tracking ID saw no traffic.
+    """
+    config = StandinConfig(latency, jitter, error_rate, folo_downloads, folo_uploads, content_size, token_expires)
+    server = StandinServer(config, host, port)
+    print(f"Indy stand-in listening on: {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,197 @@
+import click
+import json
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+import indyperf.config as config
+import indyperf.sso as sso
+import indyperf.updown as updown
+from indyperf.bench import (parse_ints, quiet)
+from indyperf.client import HttpClient
+from indyperf.metrics import (EndpointMetrics, ERROR_STATUS, MICROS)
+from indyperf.schedule import RateLimiter
+
+CHURN_HEADERS = ['Parallel', 'Cycles', 'Cycles/s', 'Failures']
+OPERATION_HEADERS = ['Count', 'Errors', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'Max (ms)']
+
+
+class StoreChurn:
+    """ Runs store lifecycles against Indy's admin API, each shaped like a build's: create the build's hosted repo
+        and group (the same JSON as updown.build_store_specs) plus a second hosted repo, read the group back, add
+        the second repo to its membership and drop the first, then delete all three stores.
+
+        Each call is timed per store type and operation (hosted_create, group_update, ...) in self.metrics. Every
+        store that was created and not yet deleted is tracked, so cleanup() leaves nothing behind, even after
+        failed cycles.
+    """
+
+    def __init__(self, suite):
+        self.suite = suite
+        self.prefix = f"storebench-{uuid4().hex[:8]}"
+        self.metrics = EndpointMetrics()
+        self.live = set()
+
+        self._lock = Lock()
+
+    def call(self, method, store_type, operation, url, expected=(200, 201, 204), **kwargs):
+        start = monotonic()
+        try:
+            resp = self.suite.client.request(method, url, **kwargs)
+        except Exception:
+            self.metrics.record(f"{store_type}_{operation}", ERROR_STATUS, monotonic() - start)
+            raise
+
+        self.metrics.record(f"{store_type}_{operation}", resp.status_code, monotonic() - start)
+        if resp.status_code not in expected:
+            raise Exception(f"{method} {url} failed with HTTP {resp.status_code}")
+        return resp
+
+    def store_url(self, store):
+        return f"{self.suite.env.indy_url}/api/admin/stores/{store['package_type']}/{store['type']}"
+
+    def create(self, store):
+        self.call('POST', store['type'], 'create', self.store_url(store), json=store)
+        with self._lock:
+            self.live.add(store['key'])
+
+    def delete(self, key):
+        (package_type, store_type, name) = key.split(':')
+        self.call('DELETE', store_type, 'delete', f"{self.suite.env.indy_url}/api/admin/stores/{package_type}/{store_type}/{name}",
+                  expected=(200, 204, 404))
+        with self._lock:
+            self.live.discard(key)
+
+    def cycle(self):
+        """One store lifecycle, returning True if every call succeeded"""
+
+        tid = f"{self.prefix}-{uuid4().hex[:12]}"
+        (hosted, group) = updown.build_store_specs(tid, self.suite)
+        extra = updown.normalize_store({'type': 'hosted', 'name': f"{tid}-b", 'allow_releases': True})
+        keys = (group['key'], hosted['key'], extra['key'])
+
+        try:
+            self.create(hosted)
+            self.create(group)
+            self.create(extra)
+
+            group_url = f"{self.store_url(group)}/{group['name']}"
+            current = self.call('GET', 'group', 'get', group_url).json()
+
+            current['constituents'] = current.get('constituents', []) + [extra['key']]
+            self.call('PUT', 'group', 'update', group_url, json=current)
+
+            current['constituents'] = [key for key in current['constituents'] if key != hosted['key']]
+            self.call('PUT', 'group', 'update', group_url, json=current)
+
+            return True
+
+        except Exception as e:
+            print(f"Store cycle: {tid} failed: {e}")
+            return False
+
+        finally:
+            with self._lock:
+                created = [key for key in keys if key in self.live]
+
+            for key in created:
+                try:
+                    self.delete(key)
+                except Exception as e:
+                    print(f"Failed to delete: {key}: {e}")
+
+    def run_point(self, concurrency, cycles, rate=None):
+        """Run 'cycles' store lifecycles, 'concurrency' at a time, starting at most 'rate' per second"""
+
+        self.metrics = EndpointMetrics()
+        limiter = RateLimiter(rate)
+
+        def limited_cycle(_):
+            limiter.wait()
+            return self.cycle()
+
+        start = monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(limited_cycle, range(cycles)))
+        elapsed = monotonic() - start
+
+        operations = {}
+        for name,stats in sorted(self.metrics.snapshot().items()):
+            operations[name] = {'count': stats.latency.count, 'errors': stats.errors()}
+            for pct in (50, 90, 99, 100):
+                operations[name][f"p{pct}"] = stats.latency.percentile(pct) / MICROS
+
+        return {
+            'concurrency': concurrency,
+            'cycles': cycles,
+            'rate': rate,
+            'elapsed': elapsed,
+            'throughput': cycles / elapsed,
+            'failures': outcomes.count(False),
+            'operations': operations
+        }
+
+    def cleanup(self):
+        """Delete any stores left by failed cycles, groups before the repos they might still contain"""
+
+        with self._lock:
+            leftovers = sorted(self.live, key=lambda key: 0 if ':group:' in key else 1)
+
+        for key in leftovers:
+            try:
+                self.delete(key)
+            except Exception as e:
+                print(f"Failed to delete: {key}: {e}")
+
+        return leftovers
+
+
+@click.command()
+@click.argument('env_yml')
+@click.argument('suite_yml')
+@click.option('-c', '--concurrency', default='1,4,16', show_default=True, help='Comma-separated numbers of store lifecycles in flight to sweep')
+@click.option('-n', '--cycles', type=click.IntRange(min=1), default=200, show_default=True, help='Store lifecycles per sweep point')
+@click.option('-r', '--rate', type=float, help='Maximum store lifecycles started per second (default: as fast as the concurrency allows)')
+@click.option('-o', '--output', help='Write the benchmark results to this JSON file')
+@click.option('-v', '--verbose', is_flag=True, help="Show the harness's own console output during the benchmark")
+def storebench(env_yml, suite_yml, concurrency, cycles, rate, output, verbose):
+    """ Measure Indy's store admin API under store churn: create, read, membership updates and delete.
+
+        Each lifecycle creates a build-shaped hosted repo and group plus a second hosted repo, reads the group,
+        updates its membership twice, and deletes all three stores (unlike a real run, which leaves each build's
+        hosted repo behind). The sweep over concurrency, optionally capped at --rate lifecycles per second,
+        gives the latency curve of each operation separately from builds and promotion. Any stores left by
+        failed lifecycles are deleted at the end.
+    """
+    suite = config.read_config(suite_yml, env_yml)
+    concurrencies = parse_ints(concurrency)
+
+    suite.client = HttpClient(suite.env.ssl_verify, max(concurrencies + [suite.env.http_pool_size]), suite.env.http_retries)
+    tokens = sso.TokenManager(suite).start()
+
+    churn = StoreChurn(suite)
+    rows = []
+    try:
+        for parallel in concurrencies:
+            print(f"Benchmarking {cycles} store lifecycles, {parallel} at a time" + (f", at most {rate}/s" if rate else ''))
+            with quiet(verbose):
+                rows.append(churn.run_point(parallel, cycles, rate))
+    finally:
+        leftovers = churn.cleanup()
+        if len(leftovers) > 0:
+            print(f"Deleted {len(leftovers)} stores left by failed lifecycles")
+        tokens.stop()
+
+    row_format = "{:>12}" * len(CHURN_HEADERS)
+    op_format = "{:>20}" + "{:>12}" * len(OPERATION_HEADERS)
+    for row in rows:
+        print("\n" + row_format.format(*CHURN_HEADERS))
+        print(row_format.format(row['concurrency'], row['cycles'], f"{row['throughput']:.2f}", row['failures']))
+        print(op_format.format("", *OPERATION_HEADERS))
+        for name,stats in row['operations'].items():
+            latencies = [f"{stats[f'p{pct}'] * 1000:.1f}" for pct in (50, 90, 99, 100)]
+            print(op_format.format(name, stats['count'], stats['errors'], *latencies))
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(rows, f, indent=2)
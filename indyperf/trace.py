@@ -0,0 +1,338 @@
+import aiohttp
+import asyncio
+import click
+import gzip
+import json
+import os
+import re
+from datetime import datetime as dt
+from threading import Lock
+from time import monotonic
+import indyperf.config as config
+import indyperf.sso as sso
+import indyperf.updown as updown
+from indyperf.metrics import (EndpointMetrics, Histogram, ERROR_STATUS, MICROS)
+from indyperf.results import Results
+
+TRACE_VERSION = 1
+
+# Trace items, one compact JSON array per line of a gzip stream:
+#   ["s", id, text]                                   string table entry (methods, URL / body templates, endpoints)
+#   ["t", n, tid]                                     tracking ID recorded as {tid:n} in templates
+#   ["r", ms, method, url, endpoint, body, status, duration ms]   API call made by the tester
+#   ["c", ms, method, url, size]                      content request made by Maven, taken from the folo record
+STRING = 's'
+TID = 't'
+REQUEST = 'r'
+CONTENT = 'c'
+
+INDY_PLACEHOLDER = '{indy}'
+TID_REF = re.compile(r'\{tid:(\d+)\}')
+
+# Seconds between flushes of the compressed stream, so a killed run still leaves a readable trace
+FLUSH_INTERVAL = 5
+
+# Cap on replayed requests waiting to be sent, per allowed connection, when replaying at max speed
+MAX_PENDING_PER_CONNECTION = 4
+
+READ_CHUNK_SIZE = 65536
+
+
+class TraceRecorder:
+    """ Records every Indy interaction of a run to a compact, append-only trace file.
+
+        API calls (store setup, folo seal / pull, promotion, cleanup) are captured by HttpClient as they happen;
+        Maven's own content requests are added from each build's folo record, spread evenly over the build's
+        PME / Maven window (the record doesn't say when each request was made). SSO calls are never recorded.
+
+        Timestamps are milliseconds from the start of the trace. URLs and request bodies are stored as templates,
+        with the Indy URL and tracking IDs replaced by placeholders, and each distinct string is written only once,
+        so the repeated URLs of an hour-long run cost a few bytes each.
+    """
+
+    def __init__(self, path, indy_url):
+        self.path = path
+        self.indy_url = indy_url
+        self.start = monotonic()
+        self.strings = {}
+        self.tids = {}
+        self.events = 0
+
+        self._lock = Lock()
+        self._out = gzip.open(path, 'wt')
+        self._flushed = self.start
+        self._emit({'trace': TRACE_VERSION, 'started': dt.utcnow().isoformat(), 'indy_url': indy_url})
+
+    def _emit(self, item):
+        self._out.write(json.dumps(item, separators=(',', ':')) + '\n')
+
+        now = monotonic()
+        if now - self._flushed > FLUSH_INTERVAL:
+            self._out.flush()
+            self._flushed = now
+
+    def _string(self, text):
+        sid = self.strings.get(text)
+        if sid is None:
+            sid = len(self.strings)
+            self.strings[text] = sid
+            self._emit([STRING, sid, text])
+        return sid
+
+    def _tid_ref(self, match):
+        tid = match.group(0)
+        n = self.tids.get(tid)
+        if n is None:
+            n = len(self.tids)
+            self.tids[tid] = n
+            self._emit([TID, n, tid])
+        return '{tid:%d}' % n
+
+    def _template(self, text):
+        if text.startswith(self.indy_url):
+            text = INDY_PLACEHOLDER + text[len(self.indy_url):]
+        return updown.TID_PATTERN.sub(self._tid_ref, text)
+
+    def _ms(self, at):
+        return int(round((at - self.start) * 1000))
+
+    def request(self, method, url, endpoint, body, status, started, duration):
+        """Record an API call (started is on the monotonic clock); SSO calls, and calls to anything other than Indy, are skipped"""
+
+        # SSO may be served from the same base URL as Indy, so its calls are told apart by endpoint
+        if endpoint == sso.SSO_ENDPOINT or not url.startswith(self.indy_url):
+            return
+
+        with self._lock:
+            body = self._string(self._template(body)) if body is not None else None
+            self._emit([REQUEST, self._ms(started), self._string(method), self._string(self._template(url)),
+                        self._string(endpoint or ''), body, status, int(round(duration * 1000))])
+            self.events += 1
+
+    def build_content(self, plan, mirror_url, deploy_url, start, end):
+        """Record a build's content requests (a folo.ContentPlan) as spread evenly over [start, end]"""
+
+        requests = [('GET', mirror_url, path, size) for (path, size) in plan.downloads]
+        requests += [('PUT', deploy_url, path, size) for (path, size) in plan.uploads]
+        step = (end - start) / len(requests) if len(requests) > 0 else 0
+
+        with self._lock:
+            for (idx, (method, base_url, path, size)) in enumerate(requests):
+                self._emit([CONTENT, self._ms(start + idx * step), self._string(method), self._string(self._template(base_url + path)), size])
+            self.events += len(requests)
+
+    def close(self):
+        with self._lock:
+            self._out.close()
+
+
+class Trace:
+    """A trace file loaded for replay: its header, string table, tracking IDs, and events sorted by time"""
+
+    def __init__(self, path):
+        self.path = path
+        self.header = None
+        self.strings = {}
+        self.tids = {}
+        self.events = []
+
+        with gzip.open(path, 'rt') as f:
+            for line in f:
+                item = json.loads(line)
+                if isinstance(item, dict):
+                    self.header = item
+                elif item[0] == STRING:
+                    self.strings[item[1]] = item[2]
+                elif item[0] == TID:
+                    self.tids[item[1]] = item[2]
+                else:
+                    self.events.append(item)
+
+        if self.header is None or self.header.get('trace') != TRACE_VERSION:
+            raise Exception(f"Not a version {TRACE_VERSION} trace file: {path}")
+
+        # content requests are written after their build finishes, with earlier timestamps
+        self.events.sort(key=lambda event: event[1])
+
+    def duration(self):
+        return self.events[-1][1] / 1000.0 if len(self.events) > 0 else 0.0
+
+
+class TraceReplayer:
+    """ Replays a Trace against an Indy at a multiple of its recorded speed (speed 0 means as fast as possible).
+
+        Each event is sent at its scheduled time, with tracking IDs mapped to fresh ones so the replayed builds get
+        their own stores. Order within a build is preserved at any speed: an API call waits for everything earlier
+        in its build to finish, and content requests wait for the API call before them (so a build's downloads can
+        overlap each other, as Maven's do, but never run before its group exists or after it's sealed).
+
+        Per-endpoint latency goes to self.metrics; how late each event was sent, against its schedule, to self.lag.
+    """
+
+    def __init__(self, trace, suite, speed, connections, suffix):
+        self.trace = trace
+        self.suite = suite
+        self.speed = speed
+        self.connections = connections
+        self.tids = {n: f"{tid}-{suffix}" for n,tid in trace.tids.items()}
+        self.metrics = EndpointMetrics()
+        self.lag = Histogram()
+        self.mismatches = 0
+        self.failures = 0
+
+    def resolve(self, sid):
+        text = self.trace.strings[sid]
+        if text.startswith(INDY_PLACEHOLDER):
+            text = self.suite.env.indy_url + text[len(INDY_PLACEHOLDER):]
+        return TID_REF.sub(lambda match: self.tids[int(match.group(1))], text)
+
+    def lane(self, sid):
+        match = TID_REF.search(self.trace.strings[sid])
+        return int(match.group(1)) if match else None
+
+    async def send(self, session, event, deps, scheduled, loop):
+        if len(deps) > 0:
+            await asyncio.gather(*deps)
+
+        self.lag.record(max(loop.time() - scheduled, 0) * MICROS)
+
+        method = self.trace.strings[event[2]]
+        url = self.resolve(event[3])
+        headers = dict(self.suite.headers)
+        if event[0] == REQUEST:
+            endpoint = self.trace.strings[event[4]] or 'other'
+            data = self.resolve(event[5]).encode('utf-8') if event[5] is not None else b''
+            if method in ('POST', 'PUT'):
+                headers['content-type'] = 'application/json'
+        else:
+            endpoint = 'content_download' if method == 'GET' else 'content_upload'
+            data = bytes(event[4]) if method == 'PUT' else None
+
+        start = monotonic()
+        try:
+            async with session.request(method, url, data=data, headers=headers) as resp:
+                size = 0
+                async for chunk in resp.content.iter_chunked(READ_CHUNK_SIZE):
+                    size += len(chunk)
+        except Exception as e:
+            self.metrics.record(endpoint, ERROR_STATUS, monotonic() - start)
+            self.failures += 1
+            return
+
+        self.metrics.record(endpoint, resp.status, monotonic() - start, size)
+        if event[0] == REQUEST and resp.status != event[6]:
+            self.mismatches += 1
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        connector_args = {'limit': self.connections}
+        if self.suite.env.ssl_verify is False:
+            connector_args['ssl'] = False
+
+        pending = asyncio.Semaphore(self.connections * MAX_PENDING_PER_CONNECTION)
+        lanes = {}
+        tasks = set()
+
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=60, sock_read=300)
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(**connector_args), timeout=timeout) as session:
+            start = loop.time()
+            for event in self.trace.events:
+                scheduled = start + event[1] / 1000.0 / self.speed if self.speed > 0 else loop.time()
+                delay = scheduled - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                if self.speed <= 0:
+                    await pending.acquire()
+
+                # lane state per build: [last API call, content requests since]
+                lane = lanes.setdefault(self.lane(event[3]), [None, []])
+                if event[0] == REQUEST:
+                    deps = [task for task in [lane[0]] + lane[1] if task is not None]
+                else:
+                    deps = [lane[0]] if lane[0] is not None else []
+
+                task = loop.create_task(self.send(session, event, deps, scheduled, loop))
+                if event[0] == REQUEST:
+                    lanes[self.lane(event[3])] = [task, []]
+                else:
+                    lane[1].append(task)
+
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                if self.speed <= 0:
+                    task.add_done_callback(lambda _: pending.release())
+
+            while len(tasks) > 0:
+                await asyncio.gather(*list(tasks))
+
+
+@click.group()
+def trace():
+    """ Inspect and replay traces recorded with run-indyperf-test --trace. """
+
+
+@trace.command()
+@click.argument('trace_file')
+def info(trace_file):
+    """Summarize a trace file: duration, events by kind and endpoint, and size"""
+
+    loaded = Trace(trace_file)
+    kinds = {}
+    for event in loaded.events:
+        name = loaded.strings[event[4]] if event[0] == REQUEST else f"content {loaded.strings[event[2]]}"
+        kinds[name] = kinds.get(name, 0) + 1
+
+    size = os.path.getsize(trace_file)
+    print(f"Trace of: {loaded.header['indy_url']}, started: {loaded.header['started']}")
+    print(f"{len(loaded.events)} events from {len(loaded.tids)} builds over {loaded.duration():.1f}s; "
+          f"{size / 1000.0:.1f} kB ({size / max(len(loaded.events), 1):.1f} bytes per event)")
+    for name,count in sorted(kinds.items()):
+        print(f"{name:>28} {count:>10}")
+
+
+@trace.command()
+@click.argument('env_yml')
+@click.argument('suite_yml')
+@click.argument('trace_file')
+@click.option('-s', '--speed', type=float, default=1.0, show_default=True, help='Replay speed as a multiple of the recorded one; 0 replays as fast as possible')
+@click.option('-C', '--connections', type=click.IntRange(min=1), default=100, show_default=True, help='Maximum HTTP connections (requests in flight)')
+@click.option('-r', '--results-file', help='Append the replay\'s per-endpoint latency histograms to this JSON-lines results file (for indyperf-report)')
+def replay(env_yml, suite_yml, trace_file, speed, connections, results_file):
+    """ Replay a recorded trace against the Indy in ENV_YML, at 1x, Nx (--speed N) or max (--speed 0) speed.
+
+        The same calls in the same order at the same (scaled) times make for identical, deterministic load, to
+        compare Indy releases against each other. Shared stores from the suite are created first; each replayed
+        build's stores are created by the trace itself.
+    """
+    suite = config.read_config(suite_yml, env_yml)
+    tokens = sso.TokenManager(suite).start()
+
+    loaded = Trace(trace_file)
+    suffix = dt.now().strftime('r%H%M%S')
+    print(f"Replaying {len(loaded.events)} events ({loaded.duration():.1f}s recorded) at {'max' if speed <= 0 else f'{speed}x'} speed")
+
+    if suite.env.do_promote is True:
+        updown.StoreRegistry(suite).ensure(suite.stores)
+
+    replayer = TraceReplayer(loaded, suite, speed, connections, suffix)
+    start = monotonic()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(replayer.run())
+    finally:
+        loop.close()
+        tokens.stop()
+
+    elapsed = monotonic() - start
+    lags = [replayer.lag.percentile(pct) / MICROS for pct in (50, 90, 99, 100)]
+    print(f"\nReplayed {len(loaded.events)} events in {elapsed:.1f}s ({len(loaded.events) / elapsed:.0f} events/s); "
+          f"{replayer.failures} failed, {replayer.mismatches} API calls got a different status than recorded")
+    print(f"Send lag behind schedule p50: {lags[0]:.3f}s, p90: {lags[1]:.3f}s, p99: {lags[2]:.3f}s, max: {lags[3]:.3f}s")
+    replayer.metrics.print_summary()
+
+    if results_file is not None:
+        run_results = Results(results_file, 0)
+        run_results.add_endpoint_metrics(replayer.metrics)
+        run_results.close()
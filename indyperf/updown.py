@@ -1,13 +1,29 @@
-import requests
 import os
 import json
-from shutil import rmtree
+import re
+from hashlib import sha1
+from threading import Lock
+from uuid import uuid4
 from datetime import datetime as dt
 from urllib.parse import urlparse
-from indyperf.utils import (run_cmd, POST_HEADERS)
+from indyperf.utils import run_cmd
 
 LOCAL_REPO = "/tmp/local-repo-%(id)s"
 
+# Tracking IDs (and builddir names) made by setup_builddir: <tid base>-<start time>-<random suffix>, and the
+# throwaway group of a pre-warm: build_perftest-prewarm-<random suffix>
+TID_PATTERN = re.compile(r'build_perftest-(?:[^/?&"\s]+?-\d{8}T\d{6}-[0-9a-f]{6}|prewarm-[0-9a-f]{12})')
+
+MIRRORS_DIR = ".mirrors"
+LOGS_DIR = "logs"
+MVND_DIR = ".mvnd"
+
+# Mirrors already cloned or refreshed during this run, and a lock per mirror so concurrent builds
+# of the same project wait for a single fetch instead of racing each other
+_refreshed_mirrors = set()
+_mirror_locks = {}
+_mirror_locks_lock = Lock()
+
 PROXY_SETTINGS = """
   <proxies>
     <proxy>
@@ -28,7 +44,7 @@ DEPLOY_SETTINGS = """
     <profile>
       <id>deploy-settings</id>
       <properties>
-        <altDeploymentRepository>indy::default::%(url)s/api/folo/track/%(id)s/maven/hosted/%(id)s</altDeploymentRepository>
+        <altDeploymentRepository>indy::default::%(deploy_url)s</altDeploymentRepository>
       </properties>
     </profile>
   </profiles>
@@ -74,23 +90,59 @@ SETTINGS = """
 </settings>
 """
 
-def setup_builddir(builds_dir, build, tid_base):
-    """ Setup physical directory for executing the build, then checkout the sources there. """
+def setup_builddir(builds_dir, build, tid_base, timeout=None, usage=None):
+    """ Setup physical directory for executing the build, then checkout the sources there. 
+        
+        The directory name (which doubles as the tracking ID) carries a short random suffix, 
+        so concurrent builds of the same project started in the same second don't collide.
+
+        Git output goes to the build's git.log; timeout and usage are passed on to run_cmd.
+    """
+
+    os.makedirs(builds_dir, exist_ok=True)
 
-    if os.path.isdir(builds_dir) is False:
-        os.makedirs(builds_dir)
+    builddir="%s/%s-%s-%s" % (builds_dir, tid_base, dt.now().strftime("%Y%m%dT%H%M%S"), uuid4().hex[:6])
 
-    builddir="%s/%s-%s" % (builds_dir, tid_base, dt.now().strftime("%Y%m%dT%H%M%S"))
+    # Check out from the local mirror, sharing its object store rather than copying it
+    mirror = update_mirror(builds_dir, build.git_url, timeout)
 
-    run_cmd("git clone -l -b %s %s %s" % (build.git_branch, build.git_url, builddir))
+    tid = os.path.basename(builddir)
+    run_cmd("git clone -q --shared -b %s %s %s" % (build.git_branch, mirror, builddir),
+            log_file=build_log(builds_dir, tid, 'git.log'), timeout=timeout, usage=usage)
     
     builddir = os.path.join(os.getcwd(), builddir)
-    tid = os.path.basename(builddir)
 
     return (builddir, tid)
 
-def clean_local_repo(id):
-    rmtree(LOCAL_REPO % {'id': id})
+def update_mirror(builds_dir, git_url, timeout=None):
+    """ Return the path of a bare mirror of git_url under builds_dir, cloning it the first time it's 
+        used and fetching it (once per run) when a previous run already left a mirror there.
+    """
+
+    mirror = os.path.join(builds_dir, MIRRORS_DIR, sha1(git_url.encode('utf-8')).hexdigest()[:16] + '.git')
+    with _mirror_locks_lock:
+        lock = _mirror_locks.setdefault(mirror, Lock())
+
+    with lock:
+        if mirror not in _refreshed_mirrors:
+            log_file = build_log(builds_dir, f"mirror-{os.path.basename(mirror)}", 'git.log')
+            if os.path.isdir(mirror):
+                run_cmd("git remote update --prune", mirror, log_file=log_file, timeout=timeout)
+            else:
+                run_cmd("git clone -q --mirror %s %s" % (git_url, mirror), log_file=log_file, timeout=timeout)
+
+            _refreshed_mirrors.add(mirror)
+
+    return mirror
+
+def build_log(builds_dir, id, name):
+    """Path of a per-build log file (e.g. mvn.log) under <builds_dir>/logs, which outlives the builddir itself"""
+    logs_dir = os.path.join(builds_dir, LOGS_DIR)
+    os.makedirs(logs_dir, exist_ok=True)
+    return os.path.join(logs_dir, f"{id}-{name}")
+
+def local_repo(id):
+    return LOCAL_REPO % {'id': id}
 
 def cleanup_build_group(id, suite):
     """Remove the group created specifically to channel content into this build,
@@ -98,25 +150,22 @@ def cleanup_build_group(id, suite):
     """
 
     print(f"Deleting temporary group:{id} used for build time only")
-    resp = requests.delete(f"{suite.env.indy_url}/api/admin/group/{id}", headers=suite.headers, verify=suite.env.ssl_verify)
+    resp = suite.client.delete(f"{suite.env.indy_url}/api/admin/group/{id}", endpoint='group_delete')
     resp.raise_for_status()
 
 
-def create_repos_and_settings(builddir, id, suite):
-    """
-    Create the necessary hosted repos and groups, then generate a Maven settings.xml file 
-    to work with them.
-    """
+def write_settings(builddir, id, suite):
+    """Generate the Maven settings.xml for a build whose hosted repo and group already exist"""
 
-    if suite.env.do_promote is True:
-        create_missing_stores(id, suite)
+    if suite.tokens is not None:
+        suite.tokens.ensure_fresh()
 
     parsed = urlparse(suite.env.indy_url)
 
     params = {
         'url':suite.env.indy_url, 
         'id': id, 
-        'local_repo': LOCAL_REPO % {'id': id},
+        'local_repo': local_repo(id),
         'host': parsed.hostname, 
         'port': parsed.port, 
         'proxy_enabled': str(suite.env.proxy_enabled).lower(),
@@ -125,12 +174,9 @@ def create_repos_and_settings(builddir, id, suite):
         'headers': "\n".join([f"<property><name>{name}</name><value>{value}</value></property>" for name,value in suite.headers.items()])
     }
 
-    mirror_url = "%(url)s/api/folo/track/%(id)s/maven/group/%(id)s" % params
-    if suite.env.do_promote is False:
-        mirror_url = "%(url)s/api/content/%(target)s" % {'url': params['url'], 'target': suite.env.mirror_target.replace(':', '/')}
-
-    print(f"Mirror URL is: {mirror_url}")
-    params['mirror_url'] = mirror_url
+    params['mirror_url'] = mirror_url(id, suite)
+    params['deploy_url'] = deploy_url(id, suite)
+    print(f"Mirror URL is: {params['mirror_url']}")
 
 
     proxy_settings = ""
@@ -151,49 +197,144 @@ def create_repos_and_settings(builddir, id, suite):
         f.write(SETTINGS % params)
 
 
+def resolver_properties(suite):
+    """ Maven resolver tuning from the suite: parallel downloads per build (resolver-threads) and HTTP connections
+        per repository host (resolver-connections), under both the Maven 3.9+ resolver and legacy wagon names.
+
+        These only take effect as -D options: Maven 3.x reads maven.artifact.threads and the wagon connection
+        limits from system / user properties, never from settings.xml profile properties.
+    """
+    properties = {}
+    if suite.resolver_threads is not None:
+        properties['maven.artifact.threads'] = suite.resolver_threads
+        properties['aether.connector.basic.threads'] = suite.resolver_threads
+
+    if suite.resolver_connections is not None:
+        properties['maven.wagon.httpconnectionManager.maxPerRoute'] = suite.resolver_connections
+        properties['maven.wagon.httpconnectionManager.maxTotal'] = suite.resolver_connections
+
+    return properties
+
+
+def maven_daemon_dir(builds_dir, slot=None):
+    """ Registry of the warm Maven daemon (mvnd executor) of a daemon slot under builds_dir, or the parent directory
+        holding every slot's registry if slot is None
+    """
+    if slot is None:
+        return os.path.join(builds_dir, MVND_DIR)
+    return os.path.join(builds_dir, MVND_DIR, f"slot-{slot}")
+
+
+def mirror_url(id, suite):
+    """Where a build resolves all its content from: its folo-tracked group, or the mirror target when not promoting"""
+
+    if suite.env.do_promote is False:
+        return f"{suite.env.indy_url}/api/content/{suite.env.mirror_target.replace(':', '/')}"
+
+    return f"{suite.env.indy_url}/api/folo/track/{id}/maven/group/{id}"
+
+
+def deploy_url(id, suite):
+    """Where a build deploys its output: its own hosted repo, through folo tracking"""
+    return f"{suite.env.indy_url}/api/folo/track/{id}/maven/hosted/{id}"
+
+
+def build_store_specs(id, suite):
+    """The hosted repo and group created for a single build, as Indy store JSON"""
+
+    return [
+        normalize_store({
+            'type': 'hosted', 
+            'name': id, 
+            'allow_releases': True
+        }),
+        normalize_store({
+            'type': 'group', 
+            'name': id, 
+            'constituents': [
+                f"maven:hosted:{id}", 
+                suite.env.promotion_target,
+                'maven:group:brew_proxies',
+                'maven:hosted:shared-imports',
+                'maven:group:public'
+            ]
+        })
+    ]
+
+
+def normalize_store(store):
+    """Fill in the package type, key, doctype and disabled flag Indy expects on store JSON"""
+
+    store_type = store['type']
+    package_type = store.get('package_type')
+    if package_type is None:
+        package_type = 'maven'
+        store['package_type'] = package_type
+
+    store['key'] = f"{package_type}:{store_type}:{store['name']}"
+    store['doctype'] = store_type
+    store['disabled'] = False
+
+    return store
+
+
+def create_store(store, suite, exist_ok=False):
+    """POST the store definition to Indy. With exist_ok, a 409 Conflict (store already exists) is not an error."""
+
+    base_url = f"{suite.env.indy_url}/api/admin/stores/{store['package_type']}/{store['type']}"
+    print("POSTing: %s" % json.dumps(store, indent=2))
+
+    resp = suite.client.post(base_url, json=store, endpoint='store_create')
+    if exist_ok and resp.status_code == 409:
+        print(f"Store: {store['key']} already exists")
+        return
+
+    resp.raise_for_status()
+
+
+def delete_store(key, suite):
+    """DELETE a store by key (package_type:type:name). A store that is already gone is not an error."""
+
+    (package_type, store_type, name) = key.split(':')
+    resp = suite.client.delete(f"{suite.env.indy_url}/api/admin/stores/{package_type}/{store_type}/{name}", endpoint='store_delete')
+    if resp.status_code != 404:
+        resp.raise_for_status()
+
+
 def create_missing_stores(id, suite):
-    suite.stores.append({
-        'type': 'hosted', 
-        'key': f"maven:hosted:{id}", 
-        'disabled': False, 
-        'doctype': 'hosted', 
-        'name': id, 
-        'allow_releases': True
-    })
-
-    suite.stores.append({
-        'type': 'group', 
-        'name': id, 
-        'constituents': [
-            f"maven:hosted:{id}", 
-            suite.env.promotion_target,
-            'maven:group:brew_proxies',
-            'maven:hosted:shared-imports',
-            'maven:group:public'
-        ]
-    })
-
-    post_headers = {**POST_HEADERS, **suite.headers}
-    print(f"Using POST headers for repo creation:\n\n{post_headers}")
-
-    for store in suite.stores:
-        store_type = store['type']
-        package_type = store.get('package_type')
-        if package_type is None:
-            package_type = 'maven'
-            store['package_type'] = package_type
-
-        name = store['name']
-        store['key'] = f"{package_type}:{store_type}:{name}"
-        store['doctype'] = store_type
-        store['disabled'] = False
-
-        base_url = f"{suite.env.indy_url}/api/admin/stores/{package_type}/{store_type}"
-        resp = requests.head(f"{base_url}/{store['name']}", headers=suite.headers, verify=suite.env.ssl_verify)
-        if resp.status_code == 404:
-            print("POSTing: %s" % json.dumps(store, indent=2))
-
-            resp = requests.post(base_url, json=store, headers=post_headers, verify=suite.env.ssl_verify)
-            resp.raise_for_status()
+    """Create the per-build hosted repo and group. The shared stores are handled once per run, by StoreRegistry"""
+
+    for store in build_store_specs(id, suite):
+        create_store(store, suite)
+
+
+class StoreRegistry:
+    """ Tracks which of the suite's shared stores (builds, shared-imports, brew_proxies, ...) are known to exist
+        in Indy. Existence is checked in bulk, with one store-listing call per package type / store type, 
+        instead of a HEAD per store per build.
+    """
+
+    def __init__(self, suite):
+        self.suite = suite
+        self.known = set()
+
+    def refresh(self, package_type, store_type):
+        resp = self.suite.client.get(f"{self.suite.env.indy_url}/api/admin/stores/{package_type}/{store_type}", endpoint='store_list')
+        resp.raise_for_status()
+
+        for item in resp.json().get('items') or []:
+            self.known.add(item['key'])
+
+    def ensure(self, stores):
+        """Create any of the given stores that don't exist yet"""
+
+        stores = [normalize_store(store) for store in stores]
+        for listing in set([(store['package_type'], store['type']) for store in stores]):
+            self.refresh(*listing)
 
+        for store in stores:
+            if store['key'] not in self.known:
+                # other builders starting at the same time may have just created it
+                create_store(store, self.suite, exist_ok=True)
+                self.known.add(store['key'])
 
@@ -1,26 +1,110 @@
 import os
+import signal
+import subprocess
+from threading import Timer
+from time import monotonic
 
-POST_HEADERS = {'content-type': 'application/json', 'accept': 'application/json'}
+# Seconds between SIGTERM and SIGKILL for a command's process group once it has timed out
+KILL_GRACE = 10
 
-def run_cmd(cmd, work_dir=None, fail=True):
-    """Run the specified command. If fail == True, and a non-zero exit value 
-       is returned from the process, raise an exception
+def run_cmd(cmd, work_dir=None, fail=True, log_file=None, line_handler=None, timeout=None, usage=None, on_timeout=None):
+    """Run the specified command in work_dir (or the current directory). If fail == True,
+       and a non-zero exit value is returned from the process, raise an exception.
+
+       The working directory is handed to the child process rather than set via os.chdir(),
+       so concurrent builds can run commands from separate threads safely.
+
+       If log_file is given, the command's output is read through a pipe and appended to that
+       file instead of the console, passing each line to line_handler (if given) on the way.
+
+       The command runs in its own process group. If it is still running after timeout seconds,
+       the whole group (shell, JVM and anything they started) is sent SIGTERM, then SIGKILL. If on_timeout is
+       given, it is called first, for anything the command left running outside its own process group.
+
+       If usage is a dict, it is filled in with the command's wall-clock time and the resource
+       usage of the command and all its descendants (see command_usage).
     """
-    old_dir = os.getcwd()
-    if work_dir is not None:
-        os.chdir(work_dir)
+    print(cmd)
+    start = monotonic()
+    log = None
+    if log_file is not None:
+        print(f"Command output is in: {log_file}")
+        log = open(log_file, 'a')
 
     try:
-        print(cmd)
-        ret = os.system(cmd)
-        if ret != 0:
-            print("Error running command: %s (return value: %s)" % (cmd, ret))
-            if fail:
-                raise Exception("Failed to run: '%s' (return value: %s)" % (cmd, ret))
-
-        return ret
+        if log is None:
+            proc = subprocess.Popen(cmd, shell=True, cwd=work_dir, start_new_session=True)
+        else:
+            proc = subprocess.Popen(cmd, shell=True, cwd=work_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    universal_newlines=True, errors='replace', start_new_session=True)
+
+        timed_out = []
+        timers = []
+        if timeout is not None:
+            def expire():
+                print(f"Command timed out after {timeout}s, killing it: {cmd}")
+                timed_out.append(True)
+                if on_timeout is not None:
+                    on_timeout()
+                kill_group(proc.pid, signal.SIGTERM)
+
+                timers.append(Timer(KILL_GRACE, kill_group, (proc.pid, signal.SIGKILL)))
+                timers[-1].daemon = True
+                timers[-1].start()
+
+            timers.append(Timer(timeout, expire))
+            timers[0].daemon = True
+            timers[0].start()
+
+        try:
+            if log is not None:
+                for line in proc.stdout:
+                    log.write(line)
+                    if line_handler is not None:
+                        line_handler(line)
+
+            # wait4 rather than proc.wait(), for the rusage of the command and its reaped descendants
+            (_, status, rusage) = os.wait4(proc.pid, 0)
+            proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+            ret = proc.returncode
+        finally:
+            for timer in timers:
+                timer.cancel()
+
     finally:
-        if work_dir is not None:
-            os.chdir(old_dir)
+        if log is not None:
+            log.close()
+
+    if usage is not None:
+        usage.update(command_usage(rusage, monotonic() - start, len(timed_out) > 0))
+
+    if ret != 0:
+        print("Error running command: %s (return value: %s)" % (cmd, ret))
+        if fail:
+            raise Exception("Failed to run: '%s' (return value: %s)" % (cmd, ret))
 
+    return ret
 
+def kill_group(pgid, sig):
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        pass
+
+def command_usage(rusage, wall, timed_out=False):
+    """ The resource figures worth keeping from a command's rusage: CPU time (user / sys seconds) against the
+        wall clock, peak RSS of its largest process, block I/O, and context switches. A build whose CPU time
+        is well short of its wall-clock time, with many involuntary context switches, was starved of CPU on
+        the agent rather than waiting on Indy.
+    """
+    return {
+        'wall': wall,
+        'user': rusage.ru_utime,
+        'sys': rusage.ru_stime,
+        'max_rss_kb': rusage.ru_maxrss,
+        'in_blocks': rusage.ru_inblock,
+        'out_blocks': rusage.ru_oublock,
+        'voluntary_switches': rusage.ru_nvcsw,
+        'involuntary_switches': rusage.ru_nivcsw,
+        'timed_out': timed_out
+    }
@@ -0,0 +1,132 @@
+import os
+import socket
+import sqlite3
+from threading import Lock
+from time import time
+import indyperf.config as config
+
+STATE_PENDING = 'pending'
+STATE_CLAIMED = 'claimed'
+STATE_DONE = 'done'
+
+# Builders wait this long (seconds) for another builder's queue transaction to finish
+LOCK_TIMEOUT = 120
+
+# Added to a build's command timeouts for the default claim lease: time for stores, promotion, and waiting
+# prepared with --prefetch
+LEASE_MARGIN = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    seq INTEGER NOT NULL,
+    build TEXT NOT NULL,
+    iteration INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    builder TEXT,
+    claimed_at REAL,
+    PRIMARY KEY (build, iteration)
+)
+"""
+
+
+class WorkQueue:
+    """ Shared (build, iteration) work queue in an SQLite file, for builders on a shared volume to pull work from.
+
+        Every builder seeds the queue with the suite's full interleaved build order (seeding is idempotent, so
+        whichever builder gets there first wins), then claims items one at a time in order, and marks each done
+        when it finishes. Builders that finish quickly simply claim more, so the load stays balanced until the
+        suite is done.
+
+        A claim not marked done within 'lease' seconds (by default, the sum of the suite's command timeouts plus
+        LEASE_MARGIN) is taken to belong to a builder that died, and is handed out again. The lease must cover a
+        build's whole time from claim to finish, or a slow build may be run twice.
+
+        Use a fresh queue file for each test run: items finished in a previous run are not handed out again.
+    """
+
+    def __init__(self, path, suite, builder_id, lease=None):
+        self.path = path
+        self.builder_id = f"{builder_id}@{socket.gethostname()}:{os.getpid()}"
+        self.lease = lease if lease is not None else sum(suite.command_timeouts.values()) + LEASE_MARGIN
+        self._lock = Lock()
+
+        dirname = os.path.dirname(path)
+        if dirname != '':
+            os.makedirs(dirname, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=LOCK_TIMEOUT, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(SCHEMA)
+            self.seed(suite)
+
+    def seed(self, suite):
+        items = []
+        iterations = {}
+        for (seq, name) in enumerate(config.interleave_builds(suite, list(suite.builds.keys()))):
+            iterations[name] = iterations.get(name, -1) + 1
+            items.append((seq, name, iterations[name], STATE_PENDING))
+
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany("INSERT OR IGNORE INTO work_items (seq, build, iteration, state) VALUES (?, ?, ?, ?)", items)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def claim(self):
+        """ Claim the next pending (build name, iteration), or return None when the queue is drained. Expired
+            claims are returned to the queue first.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                expired = self._conn.execute("UPDATE work_items SET state = ?, builder = NULL, claimed_at = NULL WHERE state = ? AND claimed_at < ?",
+                                             (STATE_PENDING, STATE_CLAIMED, time() - self.lease)).rowcount
+                if expired > 0:
+                    print(f"Returned {expired} claims older than {self.lease}s to the work queue")
+
+                row = self._conn.execute("SELECT build, iteration FROM work_items WHERE state = ? ORDER BY seq LIMIT 1", (STATE_PENDING,)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE work_items SET state = ?, builder = ?, claimed_at = ? WHERE build = ? AND iteration = ?",
+                                       (STATE_CLAIMED, self.builder_id, time(), row[0], row[1]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return row
+
+    def complete(self, name):
+        """ Mark one of this builder's claims of the named build done (iterations of a build are interchangeable,
+            so it's the earliest one)
+        """
+        with self._lock:
+            self._conn.execute("""UPDATE work_items SET state = ? WHERE rowid = (
+                                      SELECT rowid FROM work_items WHERE build = ? AND builder = ? AND state = ? ORDER BY seq LIMIT 1)""",
+                               (STATE_DONE, name, self.builder_id, STATE_CLAIMED))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class QueueBuildOrder:
+    """BuildOrder drop-in whose iterator claims builds from a shared WorkQueue as they are needed"""
+
+    def __init__(self, builds, queue):
+        self.builds = builds
+        self.queue = queue
+
+    def iter(self):
+        while True:
+            item = self.queue.claim()
+            if item is None:
+                return
+
+            (name, iteration) = item
+            print(f"Claimed build: {name} (iteration {iteration}) from work queue: {self.queue.path}")
+            yield self.builds[name]
+
+    def done(self, build):
+        self.queue.complete(build.name)
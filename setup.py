@@ -26,11 +26,19 @@ setup(
     install_requires=[
       "requests",
       "ruamel.yaml",
-      "click"
+      "click",
+      "aiohttp"
     ],
     entry_points={
         'console_scripts': [
-            'run-indyperf-test = indyperf:run'
+            'run-indyperf-test = indyperf:run',
+            'indyperf-standin = indyperf.standin:run',
+            'indyperf-bench = indyperf.bench:bench',
+            'indyperf-report = indyperf.report:report',
+            'indyperf-replay = indyperf.replay:replay',
+            'indyperf-trace = indyperf.trace:trace',
+            'indyperf-promote-bench = indyperf.promobench:promobench',
+            'indyperf-store-bench = indyperf.storebench:storebench'
         ],
     }
 )
@@ -0,0 +1,23 @@
+import sys
+from indyperf.bench import (parse_ints, quiet)
+
+
+def test_quiet_swallows_output_and_closes_devnull(capsys):
+    with quiet(False):
+        print("hidden")
+        devnull = sys.stdout
+    print("shown")
+
+    assert capsys.readouterr().out == "shown\n"
+    assert devnull.closed
+
+
+def test_verbose_keeps_output(capsys):
+    with quiet(True):
+        print("shown")
+
+    assert capsys.readouterr().out == "shown\n"
+
+
+def test_parse_ints_skips_blanks():
+    assert parse_ints('1, 4,,16,') == [1, 4, 16]
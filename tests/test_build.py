@@ -0,0 +1,43 @@
+import os
+import threading
+from types import SimpleNamespace
+import indyperf.build as builds
+import indyperf.config as config
+import indyperf.updown as updown
+from indyperf.utils import run_cmd
+
+
+def test_daemon_slots_are_reused_lowest_first_across_threads(tmp_path):
+    with builds.daemon_slot() as first:
+        with builds.daemon_slot() as second:
+            assert (first, second) == (0, 1)
+        with builds.daemon_slot() as third:
+            assert third == 1
+
+    # a thread from a later runner's pool gets the daemon an earlier one warmed up
+    taken = []
+
+    def build():
+        with builds.daemon_slot() as slot:
+            taken.append(slot)
+
+    thread = threading.Thread(target=build)
+    thread.start()
+    thread.join()
+    assert taken == [0]
+
+    suite = SimpleNamespace(mvn_executor=config.MVN_EXECUTOR_MVND)
+    daemon_dir = updown.maven_daemon_dir(str(tmp_path), 2)
+    assert daemon_dir == os.path.join(str(tmp_path), updown.MVND_DIR, 'slot-2')
+    assert builds.maven_command(suite, daemon_dir) == f"mvnd -B -Dmvnd.daemonStorage={daemon_dir}"
+
+
+def test_timeout_calls_on_timeout_before_killing_the_command():
+    called = []
+    usage = {}
+    ret = run_cmd("sleep 30", fail=False, timeout=0.2, usage=usage, on_timeout=lambda: called.append(True))
+
+    assert called == [True]
+    assert ret != 0
+    assert usage['timed_out'] is True
+    assert usage['wall'] < 10
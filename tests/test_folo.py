@@ -0,0 +1,61 @@
+import gzip
+import json
+import os
+import pytest
+from indyperf.folo import (ContentPlan, iter_record_entries, summarize_record, DOWNLOADS, UPLOADS)
+
+RECORD = {
+    'key': {'id': 'build_perftest-a'},
+    'uploads': [
+        {'storeKey': 'maven:hosted:build_perftest-a', 'accessChannel': 'MAVEN_REPO', 'path': '/org/a/1.0/a-1.0.jar', 'size': 1234567}
+    ],
+    'downloads': [
+        {'storeKey': 'maven:remote:central', 'accessChannel': 'MAVEN_REPO', 'path': '/org/b/1.0/b-1.0.jar', 'size': 3000},
+        {'storeKey': 'maven:remote:central', 'accessChannel': 'MAVEN_REPO', 'path': '/org/b/1.0/b-1.0.jar', 'size': 3000},
+        {'storeKey': 'maven:hosted:shared-imports', 'accessChannel': 'MAVEN_REPO', 'path': '/org/c/1.0/c-1.0.pom', 'size': 1000},
+        {'storeKey': 'remote:npmjs', 'accessChannel': 'GENERIC_PROXY', 'path': '/ünïcode/d.tgz', 'size': 500}
+    ],
+    'trailer': {'nested': [1, 2, {'deep': 'value'}]}
+}
+
+
+def chunked(data, size):
+    return [data[idx:idx+size] for idx in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 4096])
+def test_entries_stream_across_any_chunk_boundary(chunk_size):
+    data = json.dumps(RECORD, indent=2, ensure_ascii=False).encode('utf-8')
+
+    entries = list(iter_record_entries(chunked(data, chunk_size)))
+
+    assert entries == [(UPLOADS, entry) for entry in RECORD['uploads']] + [(DOWNLOADS, entry) for entry in RECORD['downloads']]
+
+
+def test_summary_counts_and_promotable_paths():
+    data = json.dumps(RECORD).encode('utf-8')
+    plan = ContentPlan()
+
+    summary = summarize_record('a', chunked(data, 5), [plan])
+    result = summary.to_dict()
+
+    assert result[DOWNLOADS] == {'count': 4, 'bytes': 7500}
+    assert result[UPLOADS] == {'count': 1, 'bytes': 1234567}
+    assert result['store_types']['remote']['bytes'] == 6500
+    # the same remote path downloaded twice is promoted once; generic proxy content isn't promoted
+    assert summary.to_promote == {'maven:remote:central': {'/org/b/1.0/b-1.0.jar': True}}
+    assert len(plan.downloads) == 3 and plan.uploads == [('/org/a/1.0/a-1.0.jar', 1234567)]
+
+
+def test_plan_reads_gzipped_records(tmp_path):
+    path = os.path.join(tmp_path, 'build_perftest-a.json.gz')
+    with gzip.open(path, 'wt') as f:
+        json.dump(RECORD, f)
+
+    assert len(ContentPlan.from_file(path).downloads) == 3
+
+
+@pytest.mark.parametrize('text', [b'{"downloads": [{"path": "/a"}', b'[]'])
+def test_truncated_or_malformed_records_are_rejected(text):
+    with pytest.raises(ValueError):
+        list(iter_record_entries(chunked(text, 4)))
@@ -0,0 +1,46 @@
+import json
+import os
+from types import SimpleNamespace
+import indyperf.config as config
+from indyperf.makespan import (assign_builds, historical_durations)
+
+
+def suite_of(**times):
+    return SimpleNamespace(builds={name: config.Build(name, {config.BUILD_TIMES: count}) for name,count in times.items()})
+
+
+def test_longest_builds_are_spread_first():
+    suite = suite_of(big=2, medium=1, small=4)
+    durations = {'big': 600, 'medium': 400, 'small': 100}
+
+    (slots, loads) = assign_builds(suite, 2, durations)
+
+    assert slots == [['big', 'medium'], ['big', 'small', 'small', 'small', 'small']]
+    assert loads == [1000, 1000]
+    assert sorted([name for slot in slots for name in slot]) == sorted(['big'] * 2 + ['medium'] + ['small'] * 4)
+
+
+def test_builds_without_history_get_the_median_duration():
+    suite = suite_of(a=1, b=1, c=1, new=1)
+
+    (slots, loads) = assign_builds(suite, 2, {'a': 100, 'b': 300, 'c': 500})
+
+    assert sum(loads) == 100 + 300 + 500 + 300
+    assert max(loads) == 600
+
+
+def test_plan_is_the_same_for_every_builder():
+    suite = suite_of(a=3, b=3, c=3, d=1)
+    durations = {'a': 50, 'b': 50, 'c': 50, 'd': 50}
+
+    assert assign_builds(suite, 3, durations) == assign_builds(suite, 3, dict(reversed(list(durations.items()))))
+
+
+def test_history_uses_the_median_of_successful_builds(tmp_path):
+    path = os.path.join(tmp_path, 'indyperf-results-0.jsonl')
+    with open(path, 'w') as f:
+        for (duration, success) in [(10, True), (30, True), (20, True), (500, False)]:
+            f.write(json.dumps({'type': 'build', 'build': 'a', 'duration': duration, 'success': success}) + '\n')
+        f.write(json.dumps({'type': 'cleanup', 'phase': 'x', 'duration': 5}) + '\n')
+
+    assert historical_durations([path]) == {'a': 20}
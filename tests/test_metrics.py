@@ -0,0 +1,63 @@
+import random
+from indyperf.metrics import (bucket_high, bucket_index, EndpointMetrics, ERROR_STATUS, Histogram, MICROS, SUB_BUCKETS)
+
+
+def test_small_values_have_exact_buckets():
+    for value in range(2 * SUB_BUCKETS):
+        assert bucket_index(value) == value
+        assert bucket_high(bucket_index(value)) == value
+
+
+def test_bucket_bounds_are_contiguous_and_within_precision():
+    prev_high = bucket_high(2 * SUB_BUCKETS - 1)
+    for idx in range(2 * SUB_BUCKETS, 20 * SUB_BUCKETS):
+        high = bucket_high(idx)
+        low = prev_high + 1
+        assert bucket_index(low) == idx and bucket_index(high) == idx
+        assert (high - low) / low <= 1.0 / SUB_BUCKETS
+        prev_high = high
+
+
+def test_percentiles_stay_within_relative_error():
+    rng = random.Random(7)
+    values = [rng.randint(1, 10 * MICROS) for _ in range(5000)]
+    hist = Histogram()
+    for value in values:
+        hist.record(value)
+
+    ordered = sorted(values)
+    for pct in (50, 90, 99):
+        exact = ordered[int(pct / 100.0 * len(ordered)) - 1]
+        assert abs(hist.percentile(pct) - exact) <= exact / SUB_BUCKETS
+    assert hist.percentile(100) == max(values)
+
+
+def test_merge_and_round_trip_keep_every_count():
+    first = Histogram()
+    second = Histogram()
+    for value in range(0, 1000, 3):
+        first.record(value)
+    for value in range(5000, 6000, 7):
+        second.record(value)
+
+    merged = Histogram.from_dict(Histogram().merge(first).merge(second).to_dict())
+
+    assert merged.count == first.count + second.count
+    assert merged.total == first.total + second.total
+    assert (merged.min, merged.max) == (0, second.max)
+    # whole buckets only: everything up to the end of 999's bucket, and nothing from the second histogram
+    assert merged.count_at_or_below(bucket_high(bucket_index(999))) == first.count
+    assert merged.count_at_or_below(998) < first.count
+
+
+def test_endpoint_metrics_count_errors_by_status():
+    metrics = EndpointMetrics()
+    metrics.record('content_get', 200, 0.01, 100)
+    metrics.record('content_get', 404, 0.02)
+    metrics.record('content_get', 503, 0.5)
+    metrics.record('content_get', ERROR_STATUS, 1.0)
+
+    stats = metrics.snapshot()['content_get']
+    assert stats.latency.count == 4
+    assert stats.size.count == 1
+    assert stats.errors() == 3
@@ -0,0 +1,55 @@
+import json
+import os
+import pytest
+from indyperf.mvnlog import (MAX_PENDING, TransferParser, DOWNLOAD, UPLOAD)
+
+URL = 'http://indy/api/folo/track/build_perftest-a/maven/group/build_perftest-a/org/a/1.0/a-1.0.jar'
+
+
+def test_maven_3_5_lines_use_si_units(tmp_path):
+    path = os.path.join(tmp_path, 'transfers.jsonl')
+    parser = TransferParser(path)
+    parser.feed(f"[INFO] Downloading from indy: {URL}\n")
+    parser.feed(f"[INFO] Downloaded from indy: {URL} (3.2 kB at 10 kB/s)\n")
+    parser.close()
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+
+    assert len(records) == 1
+    assert records[0]['direction'] == DOWNLOAD and records[0]['url'] == URL
+    assert records[0]['size'] == pytest.approx(3200)
+    assert records[0]['throughput'] == pytest.approx(10000)
+    assert records[0]['duration'] is not None
+    assert parser.stats[DOWNLOAD].count == 1
+
+
+def test_maven_3_3_lines_use_binary_units_and_thousands_separators():
+    parser = TransferParser()
+    parser.feed(f"Downloaded: {URL} (1,024 KB at 512.0 KB/sec)")
+
+    stats = parser.stats[DOWNLOAD]
+    assert stats.bytes == pytest.approx(1024 * 1024)
+    # no start line was seen, so the duration comes from Maven's rate
+    assert stats.duration.max == pytest.approx(2 * 1000000, rel=0.05)
+
+
+def test_uploads_without_a_rate():
+    parser = TransferParser()
+    parser.feed(f"[INFO] Uploading to indy: {URL}")
+    parser.feed(f"[INFO] Uploaded to indy: {URL} (15 MB)")
+
+    assert parser.stats[UPLOAD].count == 1
+    assert parser.stats[UPLOAD].bytes == pytest.approx(15000000)
+    assert parser.stats[DOWNLOAD].count == 0
+
+
+def test_other_output_is_ignored_and_pending_transfers_are_bounded():
+    parser = TransferParser()
+    parser.feed("[INFO] BUILD SUCCESS")
+    parser.feed("[WARNING] Could not transfer metadata org.a:a/maven-metadata.xml")
+    for idx in range(MAX_PENDING + 10):
+        parser.feed(f"[INFO] Downloading from indy: {URL}.{idx}")
+
+    assert parser.stats[DOWNLOAD].count == 0
+    assert len(parser._pending) == MAX_PENDING
@@ -0,0 +1,53 @@
+import pytest
+from types import SimpleNamespace
+from indyperf.bench import bench_suite
+from indyperf.folo import (FoloSummary, DOWNLOADS)
+from indyperf.promote import promote_deps_by_path
+
+
+class HtmlResponse:
+    text = '<html><body>Bad gateway</body></html>'
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        raise ValueError("Expecting value: line 1 column 1 (char 0)")
+
+
+class JsonResponse:
+    text = '{}'
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {}
+
+
+def summary_of(paths):
+    summary = FoloSummary('a')
+    for path in paths:
+        summary.add(DOWNLOADS, {'storeKey': 'maven:remote:central', 'accessChannel': 'MAVEN_REPO', 'path': path})
+    return summary
+
+
+def test_non_json_promotion_response_fails_only_its_chunk():
+    responses = iter([JsonResponse(), HtmlResponse(), JsonResponse()])
+    calls = []
+
+    def post(url, json=None, endpoint=None):
+        calls.append(json['paths'])
+        return next(responses)
+
+    suite = SimpleNamespace(client=SimpleNamespace(post=post), env=SimpleNamespace(indy_url='http://indy'),
+                            promote_chunk_size=2, promote_concurrency=1)
+
+    assert promote_deps_by_path(summary_of([f"/a/{idx}.jar" for idx in range(6)]), 'a', suite) is False
+    assert len(calls) == 3
+
+
+@pytest.mark.parametrize('spec', [{'promote-chunk-size': 0}, {'promote-chunk-size': -5}, {'promote-concurrency': 0}])
+def test_promotion_sizes_below_one_are_rejected(spec):
+    with pytest.raises(Exception, match='promote-'):
+        bench_suite('http://indy', 1, spec)
@@ -0,0 +1,57 @@
+import asyncio
+import os
+from indyperf.bench import bench_suite
+from indyperf.folo import (ContentPlan, FoloSummary, DOWNLOADS)
+from indyperf.promote import dependency_chunks
+from indyperf.replay import ReplayEngine
+from indyperf.results import Results
+from indyperf.standin import (StandinConfig, StandinServer)
+
+
+def test_replay_streams_record_and_promotes_chunks_concurrently(tmp_path):
+    server = StandinServer(StandinConfig(folo_downloads=3000)).start()
+    try:
+        suite = bench_suite(server.url, 4, {'promote-chunk-size': 100, 'promote-concurrency': 3})
+        results = Results(os.path.join(tmp_path, 'results.jsonl'), 0)
+        # an empty plan makes no content requests, so the stand-in answers with a synthetic record of 3000 downloads
+        engine = ReplayEngine(suite, ContentPlan(), results, 'replay', concurrency=1, connections=4)
+
+        in_flight = [0, 0]
+        promotion = engine.promotion
+
+        async def tracked(session, kind, req):
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+            try:
+                await asyncio.sleep(0.01)
+                await promotion(session, kind, req)
+            finally:
+                in_flight[0] -= 1
+
+        engine.promotion = tracked
+        asyncio.run(engine.run(1))
+        results.close()
+    finally:
+        server.stop()
+
+    assert engine.tally == [1, 0]
+    pulls = engine.metrics.snapshot()['folo_pull']
+    assert pulls.latency.count == 1
+    # the whole record went through the streaming parser, several chunks' worth
+    assert pulls.size.max > 65536
+    assert results.builds[0].details['folo']['promotable_paths'] > 1000
+    # dependency chunks are promoted promote-concurrency at a time, not one by one
+    assert in_flight[1] == 3
+
+
+def test_dependency_chunks_split_each_remote_store():
+    summary = FoloSummary('a')
+    for idx in range(7):
+        summary.add(DOWNLOADS, {'storeKey': 'maven:remote:central', 'accessChannel': 'MAVEN_REPO', 'path': f"/a/{idx}.jar"})
+    summary.add(DOWNLOADS, {'storeKey': 'maven:remote:other', 'accessChannel': 'MAVEN_REPO', 'path': '/b/0.jar'})
+
+    chunks = dependency_chunks(summary, 3)
+
+    assert [(key, len(paths)) for (key, paths) in chunks] == [('maven:remote:central', 3), ('maven:remote:central', 3),
+                                                             ('maven:remote:central', 1), ('maven:remote:other', 1)]
+    assert [path for (_, paths) in chunks[:3] for path in paths] == [f"/a/{idx}.jar" for idx in range(7)]
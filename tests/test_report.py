@@ -0,0 +1,99 @@
+import json
+import os
+from click.testing import CliRunner
+from indyperf.report import (compare, load_thresholds, report, DEFAULT_THRESHOLDS)
+
+
+def summary(p50, p90):
+    return {'count': 10, 'p50': p50, 'p90': p90, 'p99': p90, 'max': p90}
+
+
+def run_report(do_build_p90, failure_rate=0.0, throughput=100.0):
+    return {
+        'phases': {'do_build': summary(60.0, do_build_p90), 'new_phase': summary(1.0, 1.0)},
+        'endpoints': {'content_get': {'p90': 0.2}},
+        'failure_rate': failure_rate,
+        'throughput': throughput
+    }
+
+
+def regressed(rows):
+    return [row[0] for row in rows if row[4]]
+
+
+def test_changes_within_thresholds_pass():
+    baseline = run_report(100.0)
+    del baseline['phases']['new_phase']
+    rows = compare(run_report(119.0, failure_rate=4.0, throughput=91.0), baseline, load_thresholds(None))
+
+    assert regressed(rows) == []
+    # a phase missing from the baseline has nothing to compare against
+    assert not any('new_phase' in row[0] for row in rows)
+
+
+def test_each_kind_of_regression_is_caught():
+    baseline = run_report(100.0)
+
+    assert regressed(compare(run_report(121.0), baseline, DEFAULT_THRESHOLDS)) == ['phases.do_build.p90']
+    assert regressed(compare(run_report(100.0, failure_rate=6.0), baseline, DEFAULT_THRESHOLDS)) == ['failure_rate']
+    assert regressed(compare(run_report(100.0, throughput=89.0), baseline, DEFAULT_THRESHOLDS)) == ['throughput']
+
+
+def test_millisecond_phases_need_an_absolute_increase_too():
+    baseline = {'phases': {'write_settings': summary(0.004, 0.006)}, 'endpoints': {}, 'failure_rate': 0.0}
+    jittery = {'phases': {'write_settings': summary(0.009, 0.015)}, 'endpoints': {}, 'failure_rate': 0.0}
+    stuck = {'phases': {'write_settings': summary(0.009, 1.5)}, 'endpoints': {}, 'failure_rate': 0.0}
+
+    assert regressed(compare(jittery, baseline, DEFAULT_THRESHOLDS)) == []
+    assert regressed(compare(stuck, baseline, DEFAULT_THRESHOLDS)) == ['phases.write_settings.p90']
+
+
+def test_thresholds_yaml_overrides_per_phase(tmp_path):
+    path = os.path.join(tmp_path, 'thresholds.yml')
+    with open(path, 'w') as f:
+        f.write("phases:\n  do_build: {p90: 5}\nthroughput: 50\n")
+
+    thresholds = load_thresholds(path)
+
+    assert thresholds['phases']['default'] == DEFAULT_THRESHOLDS['phases']['default']
+    assert regressed(compare(run_report(110.0, throughput=60.0), run_report(100.0), thresholds)) == ['phases.do_build.p90']
+
+
+def write_results(path, durations, success=True):
+    with open(path, 'w') as f:
+        for (idx, duration) in enumerate(durations):
+            f.write(json.dumps({'type': 'build', 'builder': 0, 'build': 'a', 'tid': f"t{idx}", 'started': '2026-01-01T00:00:00',
+                                'start': idx * 10.0, 'duration': duration, 'success': success,
+                                'phases': {'do_build': {'start': idx * 10.0, 'duration': duration}}}) + '\n')
+
+
+def test_report_exits_non_zero_on_a_regression(tmp_path):
+    base_results = os.path.join(tmp_path, 'base.jsonl')
+    slow_results = os.path.join(tmp_path, 'slow.jsonl')
+    baseline = os.path.join(tmp_path, 'baseline.json')
+    write_results(base_results, [10.0] * 5)
+    write_results(slow_results, [20.0] * 5)
+
+    runner = CliRunner()
+    assert runner.invoke(report, [base_results, '-o', baseline]).exit_code == 0
+    assert runner.invoke(report, [base_results, '-b', baseline]).exit_code == 0
+
+    result = runner.invoke(report, [slow_results, '-b', baseline])
+    assert result.exit_code == 1
+    assert 'REGRESSED' in result.output
+
+
+def test_failed_builds_do_not_count_towards_throughput(tmp_path):
+    base_results = os.path.join(tmp_path, 'base.jsonl')
+    failing_results = os.path.join(tmp_path, 'failing.jsonl')
+    baseline = os.path.join(tmp_path, 'baseline.json')
+    write_results(base_results, [10.0] * 5)
+    write_results(failing_results, [1.0] * 5, success=False)
+
+    runner = CliRunner()
+    assert runner.invoke(report, [base_results, '-o', baseline]).exit_code == 0
+
+    result = runner.invoke(report, [failing_results, '-b', baseline, '-o', os.path.join(tmp_path, 'failing.json')])
+    with open(os.path.join(tmp_path, 'failing.json')) as f:
+        assert json.load(f)['throughput'] == 0.0
+    assert result.exit_code == 1
@@ -0,0 +1,37 @@
+import json
+import os
+from indyperf.results import (percentile, Results, RECORD_TYPE_BUILD)
+
+
+def test_percentile_is_nearest_rank():
+    values = [5, 1, 4, 2, 3, 10, 9, 8, 7, 6]
+
+    assert percentile(values, 50) == 5
+    assert percentile(values, 90) == 9
+    assert percentile(values, 91) == 10
+    assert percentile(values, 100) == 10
+    assert percentile(values, 0) == 1
+
+
+def test_percentile_of_one_or_no_values():
+    assert percentile([3.5], 99) == 3.5
+    assert percentile([], 50) is None
+
+
+def test_build_record_has_phases_on_the_run_timeline(tmp_path):
+    path = os.path.join(tmp_path, 'results.jsonl')
+    results = Results(path, 0)
+    timings = results.new_build('a')
+    with timings.phase('setup_builddir'):
+        pass
+    timings.finish(True)
+    results.add_build(timings)
+    results.close()
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+
+    builds = [record for record in records if record['type'] == RECORD_TYPE_BUILD]
+    assert len(builds) == 1
+    assert builds[0]['build'] == 'a' and builds[0]['success'] is True
+    assert builds[0]['phases']['setup_builddir']['start'] >= builds[0]['start']
@@ -0,0 +1,140 @@
+import os
+import pytest
+from threading import Lock
+from time import sleep
+from types import SimpleNamespace
+import indyperf.config as config
+import indyperf.prewarm as prewarm
+import indyperf.runner as runner
+from indyperf.results import Results
+
+
+class FakeCleaner:
+    def remove_tree(self, *args):
+        pass
+
+    def submit(self, *args):
+        pass
+
+
+def test_pipelined_duration_excludes_prepare_and_wait(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner.BuildIteration, 'setup', lambda self: self.timings.phases.setdefault('setup_builddir', {'start': 0, 'duration': 0}))
+    monkeypatch.setattr(runner.BuildIteration, 'create_repos', lambda self: None)
+    monkeypatch.setattr(runner.BuildIteration, 'write_settings', lambda self: None)
+    monkeypatch.setattr(runner.BuildIteration, 'run_maven', lambda self: sleep(0.2) or True)
+    monkeypatch.setattr(runner.BuildIteration, 'post_process', lambda self, success: success)
+
+    builds = {'a': config.Build('a', {'times': 4})}
+    order = config.BuildOrder(builds, ['a'] * 4)
+    suite = SimpleNamespace(pause=0)
+    results = Results(os.path.join(tmp_path, 'results.jsonl'), 0)
+
+    tally = runner.run_builds_pipelined(order, str(tmp_path), suite, results, FakeCleaner(), workers=1, prefetch=2)
+    results.close()
+
+    assert tally == {'a': [4, 0]}
+    # each build waited behind up to two others while prepared, but only its own Maven run is its duration
+    assert all(timings.duration < 0.35 for timings in results.builds)
+    assert max(timings.details['prepared_wait'] for timings in results.builds) > 0.15
+    assert all('setup_builddir' in timings.to_record()['prepare'] for timings in results.builds)
+
+
+def test_serial_and_pipelined_runs_record_the_same_phases(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner.BuildIteration, 'setup', lambda self: setattr(self, 'tid', f"t-{id(self)}"))
+    monkeypatch.setattr(runner.updown, 'create_missing_stores', lambda *args: None)
+    monkeypatch.setattr(runner.updown, 'write_settings', lambda *args: None)
+    monkeypatch.setattr(runner.BuildIteration, 'run_maven', lambda self: True)
+    monkeypatch.setattr(runner.BuildIteration, 'post_process', lambda self, success: success)
+
+    builds = {'a': config.Build('a', {'times': 2})}
+    suite = SimpleNamespace(pause=0, keep_builddirs=True, env=SimpleNamespace(do_promote=True))
+
+    def recorded_phases(run, name):
+        results = Results(os.path.join(tmp_path, f"{name}.jsonl"), 0)
+        run(config.BuildOrder(builds, ['a'] * 2), str(tmp_path), suite, results, FakeCleaner())
+        results.close()
+        return [set(timings.phases) | set(timings.to_record().get('prepare') or {}) for timings in results.builds]
+
+    serial = recorded_phases(runner.run_builds, 'serial')
+    pipelined = recorded_phases(lambda *args: runner.run_builds_pipelined(*args, workers=1, prefetch=1), 'pipelined')
+
+    assert serial == pipelined == [{'create_repos', 'write_settings'}] * 2
+
+
+def test_scheduled_builds_are_pulled_when_due(tmp_path, monkeypatch):
+    results = Results(os.path.join(tmp_path, 'results.jsonl'), 0)
+    pulled = []
+
+    class TimedOrder:
+        def iter(self):
+            for name in ('a', 'b', 'c'):
+                pulled.append(results.offset())
+                yield config.Build(name, {})
+
+        def done(self, build):
+            pass
+
+    monkeypatch.setattr(runner, 'run_and_record', lambda *args, **kwargs: None)
+    profile = config.LoadProfile({config.PROFILE_STAGES: [{'duration': 1, 'rate': 180}]})
+
+    run_start = results.offset()
+    runner.run_builds_on_schedule(TimedOrder(), str(tmp_path), SimpleNamespace(), results, FakeCleaner(), profile)
+    results.close()
+
+    # 3 builds/s: each build is taken from the order at its arrival time, not one arrival early
+    assert [pull - run_start for pull in pulled] == pytest.approx([0, 1 / 3, 2 / 3], abs=0.1)
+
+
+def test_pipelined_iteration_is_tagged_warm_when_its_maven_starts(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner.BuildIteration, 'setup', lambda self: setattr(self, 'tid', f"t-{id(self)}"))
+    monkeypatch.setattr(runner.BuildIteration, 'create_repos', lambda self: None)
+    monkeypatch.setattr(runner.BuildIteration, 'write_settings', lambda self: None)
+    monkeypatch.setattr(runner.BuildIteration, 'post_process', lambda self, success: success)
+    monkeypatch.setattr(runner.builds, 'do_build', lambda *args: sleep(0.2) or True)
+
+    builds = {'a': config.Build('a', {'times': 2})}
+    order = config.BuildOrder(builds, ['a'] * 2)
+    suite = SimpleNamespace(pause=0, keep_builddirs=True, cache=prewarm.CacheState(), env=SimpleNamespace(da_url=None, indy_url='http://indy', do_promote=False))
+    results = Results(os.path.join(tmp_path, 'results.jsonl'), 0)
+
+    runner.run_builds_pipelined(order, str(tmp_path), suite, results, FakeCleaner(), workers=1, prefetch=2)
+    results.close()
+
+    # the second iteration was prepared while the first was in Maven, but its own Maven ran on a warm cache
+    assert [timings.details['cache'] for timings in results.builds] == [prewarm.CACHE_COLD, prewarm.CACHE_WARM]
+
+
+def test_closed_loop_profile_holds_the_target_in_flight(tmp_path, monkeypatch):
+    results = Results(os.path.join(tmp_path, 'results.jsonl'), 0)
+    running = [0, 0]
+    targets = []
+    lock = Lock()
+
+    def fake_build(build, builds_dir, suite, results, cleaner, tally, **details):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        targets.append(details['target_concurrent'])
+        sleep(0.1)
+        with lock:
+            running[0] -= 1
+
+    class EndlessOrder:
+        def iter(self):
+            while True:
+                yield config.Build('a', {})
+
+        def done(self, build):
+            pass
+
+    monkeypatch.setattr(runner, 'run_and_record', fake_build)
+    profile = config.LoadProfile({config.PROFILE_ARRIVALS: 'closed', config.PROFILE_MAX_CONCURRENT: 10,
+                                  config.PROFILE_STAGES: [{'duration': 1, 'concurrent': 3}]})
+
+    runner.run_builds_on_schedule(EndlessOrder(), str(tmp_path), SimpleNamespace(), results, FakeCleaner(), profile)
+    results.close()
+
+    # a new build starts as soon as one finishes, never more than the target at once
+    assert running[1] == 3
+    assert 20 <= len(targets) <= 33
+    assert set(targets) == {3}
@@ -0,0 +1,56 @@
+import pytest
+import indyperf.config as config
+from indyperf.schedule import (arrival_offsets, target_concurrency, ARRIVALS_CLOSED, ARRIVALS_POISSON)
+
+
+def profile(stages, **spec):
+    return config.LoadProfile({config.PROFILE_STAGES: stages, **spec})
+
+
+def test_constant_rate_spaces_builds_evenly():
+    offsets = list(arrival_offsets(profile([{'duration': 60, 'rate': 6}])))
+
+    assert offsets == pytest.approx([0, 10, 20, 30, 40, 50, 60])
+
+
+def test_ramp_follows_the_cumulative_arrival_count():
+    # 0 -> 12 builds/min over 60s: t^2 / 600 builds have arrived by t, so build n starts at sqrt(600 * n)
+    # (and none at t=0, where the rate is still 0)
+    offsets = list(arrival_offsets(profile([{'duration': 60, 'rate': 12, 'start-rate': 0}])))
+
+    assert offsets == pytest.approx([(600 * n) ** 0.5 for n in range(1, 7)])
+
+
+def test_no_builds_start_while_the_rate_is_zero():
+    offsets = list(arrival_offsets(profile([{'duration': 30, 'rate': 0}, {'duration': 30, 'rate': 6, 'start-rate': 6}])))
+
+    assert offsets == pytest.approx([40, 50, 60])
+
+
+def test_stages_continue_from_the_previous_rate():
+    offsets = list(arrival_offsets(profile([{'duration': 30, 'rate': 6}, {'duration': 30, 'rate': 6}])))
+
+    assert offsets == pytest.approx([0, 10, 20, 30, 40, 50, 60])
+
+
+def test_poisson_arrivals_are_reproducible_with_a_seed():
+    spec = {config.PROFILE_ARRIVALS: ARRIVALS_POISSON, config.PROFILE_SEED: 42}
+    first = list(arrival_offsets(profile([{'duration': 600, 'rate': 30}], **spec)))
+    second = list(arrival_offsets(profile([{'duration': 600, 'rate': 30}], **spec)))
+
+    assert first == second
+    assert first == sorted(first)
+    assert 200 < len(first) < 400
+
+
+def test_zero_duration_stage_is_rejected():
+    with pytest.raises(Exception, match='duration'):
+        profile([{'duration': 0, 'rate': 6}])
+
+
+def test_closed_loop_targets_ramp_between_stages():
+    closed = profile([{'duration': 10, 'concurrent': 4, 'start-concurrent': 0}, {'duration': 10, 'concurrent': 4}],
+                     **{config.PROFILE_ARRIVALS: ARRIVALS_CLOSED})
+
+    assert [target_concurrency(closed, offset) for offset in (0, 5, 9.9, 10, 19.9)] == [0, 2, 4, 4, 4]
+    assert target_concurrency(closed, 20) is None
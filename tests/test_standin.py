@@ -0,0 +1,38 @@
+import requests
+from indyperf.folo import summarize_record
+from indyperf.promote import dependency_chunks
+from indyperf.standin import (StandinServer, SYNTHETIC_REMOTES)
+
+
+def test_tracked_group_downloads_come_from_remote_repos():
+    server = StandinServer().start()
+    try:
+        url = server.url
+        requests.post(f"{url}/api/admin/stores/maven/hosted", json={'name': 'shared-imports', 'type': 'hosted'}).raise_for_status()
+        requests.put(f"{url}/api/content/maven/hosted/shared-imports/org/a/1.0/a-1.0.pom", data=b'<project/>').raise_for_status()
+        requests.post(f"{url}/api/admin/stores/maven/group", json={'name': 'b1', 'type': 'group', 'constituents': ['maven:hosted:shared-imports']}).raise_for_status()
+
+        for path in ('/org/a/1.0/a-1.0.pom', '/org/b/1.0/b-1.0.jar', '/org/c/1.0/c-1.0.jar'):
+            requests.get(f"{url}/api/folo/track/b1/maven/group/b1{path}").raise_for_status()
+
+        resp = requests.get(f"{url}/api/folo/admin/b1/record")
+        summary = summarize_record('b1', [resp.content])
+    finally:
+        server.stop()
+
+    assert set(summary.stores.keys()) - set(SYNTHETIC_REMOTES) == {'maven:hosted:shared-imports'}
+    promoted = [path for (_, paths) in dependency_chunks(summary, 10) for path in paths]
+    assert sorted(promoted) == ['/org/b/1.0/b-1.0.jar', '/org/c/1.0/c-1.0.jar']
+
+
+def test_da_lookups_find_no_better_version():
+    gav = {'groupId': 'org.a', 'artifactId': 'a', 'version': '1.0'}
+    server = StandinServer().start()
+    try:
+        legacy = requests.post(f"{server.url}/da/rest/v-1/reports/lookup/gavs", json=[gav]).json()
+        current = requests.post(f"{server.url}/da/rest/v-1/lookup/maven", json={'artifacts': [gav], 'mode': 'PERSISTENT'}).json()
+    finally:
+        server.stop()
+
+    assert legacy == [{**gav, 'bestMatch': None, 'availableVersions': [], 'blacklisted': False, 'whitelisted': False}]
+    assert current == [{**gav, 'bestMatchVersion': None}]
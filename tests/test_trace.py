@@ -0,0 +1,44 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+from time import monotonic
+from indyperf.trace import TraceRecorder
+
+INDY = 'http://indy.example.com'
+
+
+def test_sso_calls_on_the_indy_url_are_not_recorded(tmp_path):
+    path = os.path.join(tmp_path, 'run.trace.gz')
+    recorder = TraceRecorder(path, INDY)
+    recorder.request('POST', f"{INDY}/auth/realms/test/protocol/openid-connect/token", 'sso_token', None, 200, monotonic(), 0.01)
+    recorder.request('POST', f"{INDY}/api/admin/stores/maven/hosted", 'store_create', '{}', 201, monotonic(), 0.01)
+    recorder.request('GET', 'http://elsewhere.example.com/api/x', 'other', None, 200, monotonic(), 0.01)
+    recorder.close()
+
+    with gzip.open(path, 'rt') as f:
+        text = f.read()
+
+    assert recorder.events == 1
+    assert 'sso_token' not in text and 'openid-connect' not in text
+    assert 'store_create' in text
+
+
+def test_run_command_does_not_import_trace_module():
+    code = "import sys, indyperf.commands; print('indyperf.trace' in sys.modules)"
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert out.stdout.strip() == 'False'
+
+
+def test_prewarm_and_build_tids_become_placeholders(tmp_path):
+    path = os.path.join(tmp_path, 'run.trace.gz')
+    recorder = TraceRecorder(path, INDY)
+    for tid in ('build_perftest-prewarm-0123456789ab', 'build_perftest-a-20260101T000000-abcdef'):
+        recorder.request('PUT', f"{INDY}/api/admin/stores/maven/group/{tid}", 'group_create', f'{{"name": "{tid}"}}', 201, monotonic(), 0.01)
+    recorder.close()
+
+    assert list(recorder.tids.keys()) == ['build_perftest-prewarm-0123456789ab', 'build_perftest-a-20260101T000000-abcdef']
+    assert '{indy}/api/admin/stores/maven/group/{tid:0}' in recorder.strings
+    assert '{"name": "{tid:1}"}' in recorder.strings
@@ -0,0 +1,42 @@
+import os
+from time import sleep
+from types import SimpleNamespace
+import indyperf.config as config
+from indyperf.workqueue import (QueueBuildOrder, WorkQueue)
+
+
+def suite_of(**times):
+    return SimpleNamespace(builds={name: config.Build(name, {config.BUILD_TIMES: count}) for name,count in times.items()},
+                           command_timeouts={'git': 900, 'pme': 1800, 'mvn': 7200})
+
+
+def test_builders_share_the_suite_in_order(tmp_path):
+    path = os.path.join(tmp_path, 'queue.db')
+    suite = suite_of(a=2, b=1)
+    first = WorkQueue(path, suite, 0)
+    second = WorkQueue(path, suite, 1)
+
+    claims = [first.claim(), second.claim(), first.claim(), second.claim()]
+    first.close()
+    second.close()
+
+    assert claims == [('a', 0), ('b', 0), ('a', 1), None]
+    assert first.lease == 900 + 1800 + 7200 + 3600
+
+
+def test_expired_claims_go_back_to_the_queue_but_finished_ones_do_not(tmp_path):
+    path = os.path.join(tmp_path, 'queue.db')
+    suite = suite_of(a=1, b=1, c=1)
+    dead = WorkQueue(path, suite, 0, lease=0.2)
+    live = WorkQueue(path, suite, 1, lease=0.2)
+
+    order = QueueBuildOrder(suite.builds, dead)
+    builds = order.iter()
+    order.done(next(builds))
+    next(builds)
+    sleep(0.3)
+
+    # 'a' was finished; the dead builder's claim on 'b' expired, so it comes round again before 'c'
+    assert [live.claim(), live.claim(), live.claim()] == [('b', 0), ('c', 0), None]
+    dead.close()
+    live.close()